@@ -0,0 +1,129 @@
+"""
+Turn persistence benchmark: per-turn commits vs group commit
+
+Drives main._save_turn from concurrent simulated conversations against a
+throwaway SQLite database and reports turns/sec and per-turn save latency
+for each write mode. Gemini and the HTTP layer are left out so the numbers
+isolate the database write path.
+
+Usage (from backend/):
+    python benchmarks/bench_group_commit.py --turns 2000 --concurrency 32
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import common  # noqa: F401  (prepares the environment)
+from common import seed_qa_session, summarize
+
+import main
+from conversation_state import ConversationState
+from database import AsyncSessionLocal, async_engine
+from write_behind import WriteBehindQueue, DURABILITY_COMMIT, DURABILITY_ASYNC
+
+ANSWER = "lorem ipsum dolor sit amet " * 40
+
+
+async def _conversation(session_id: str, turns: int, latencies: list, errors: list):
+    for i in range(turns):
+        async with AsyncSessionLocal() as db:
+            turn = main.TurnContext(
+                session_id=session_id,
+                new_session=None,
+                conv_state=ConversationState({"stage": "general_qa", "product_type": "other"}),
+                lead_response=None,
+                quick_replies=[],
+                actions=[],
+                lead_submission=None,
+                chat_history=[],
+                search_task=None
+            )
+            start = time.perf_counter()
+            try:
+                await main._save_turn(db, turn, f"Question number {i}", ANSWER, [])
+            except Exception as e:
+                # e.g. "database is locked" once writers outlast the busy timeout
+                await db.rollback()
+                errors.append(type(e).__name__)
+                continue
+            latencies.append(time.perf_counter() - start)
+
+
+async def _run_mode(queue, turns: int, concurrency: int) -> dict:
+    main.write_queue = queue
+    session_ids = [seed_qa_session() for _ in range(concurrency)]
+    per_conversation = turns // concurrency
+    latencies = []
+    errors = []
+
+    if queue:
+        queue.start()
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        _conversation(session_id, per_conversation, latencies, errors)
+        for session_id in session_ids
+    ))
+    acknowledged = time.perf_counter() - start
+    if queue:
+        # Async durability acknowledges before writing; count the drain too
+        await queue.stop()
+    elapsed = time.perf_counter() - start
+
+    results = {
+        "turns": len(latencies),
+        "failed_turns": len(errors),
+        "turns_per_sec": round(len(latencies) / elapsed, 1),
+        "acknowledged_turns_per_sec": round(len(latencies) / acknowledged, 1),
+        "save_latency": summarize(latencies)
+    }
+    if queue:
+        results["writer"] = queue.stats()
+    return results
+
+
+async def _run(args) -> dict:
+    modes = {
+        "per_turn_commit": None,
+        "group_commit": WriteBehindQueue(
+            batch_size=args.batch_size,
+            flush_interval=args.flush_ms / 1000,
+            durability=DURABILITY_COMMIT
+        ),
+        "group_commit_async": WriteBehindQueue(
+            batch_size=args.batch_size,
+            flush_interval=args.flush_ms / 1000,
+            durability=DURABILITY_ASYNC
+        )
+    }
+
+    # Warm up the connection pool and schema
+    await _run_mode(None, 10, 2)
+
+    results = {}
+    for label, queue in modes.items():
+        results[label] = await _run_mode(queue, args.turns, args.concurrency)
+    main.write_queue = None
+    await async_engine.dispose()
+    return results
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--turns", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--flush-ms", type=float, default=10)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    results = asyncio.run(_run(args))
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,133 @@
+"""
+HubSpot lead upsert benchmark: per-lead calls vs batch upserts
+
+Runs HubSpotClient against the local HubSpot stand-in (standins/hubspot.py)
+with a fixed per-request latency, and reports HTTP round trips, TCP
+connections and wall time for the same set of leads, some of which already
+exist by email or by phone:
+
+    per_lead_separate_searches  the original flow: email search, phone search,
+                                then create or update, for each lead, with a
+                                new connection per request
+    per_lead                    upsert_lead per lead (one combined search)
+    batch                       batch_upsert_leads for all leads at once
+    batch_repeat                the same leads again, contact ids now cached
+
+Usage (from backend/):
+    python benchmarks/bench_hubspot_batch.py --leads 100 --latency-ms 50
+"""
+import argparse
+import json
+import time
+
+import common  # noqa: F401  (prepares the environment)
+from common import serve
+
+from hubspot_integration import HubSpotClient
+from standins.faults import FaultProfile
+from standins.hubspot import create_app
+
+
+def _leads(count: int, invalid: int):
+    leads = []
+    for i in range(count):
+        leads.append({
+            "name": f"Lead {i}",
+            "email": f"lead{i}@example.com" if i >= invalid else f"lead{i}-at-example.com",
+            "phone": f"+9190000{i:05d}",
+            "project_goal": "A fitness tracking app for runners",
+            "product_type": "mobile_app"
+        })
+    return leads
+
+
+def _seed(leads, existing: float, phone_matches: float):
+    """Contacts already in the CRM: some share a lead's email, some only its phone"""
+    by_email = int(len(leads) * existing)
+    by_phone = int(len(leads) * phone_matches)
+    contacts = []
+    # Taken from the end so they never overlap the invalid leads at the start
+    for i, lead in enumerate(reversed(leads)):
+        if i < by_email:
+            contacts.append({"email": lead["email"], "phone": lead["phone"], "firstname": "Old"})
+        elif i < by_email + by_phone:
+            contacts.append({"email": f"other{i}@example.com", "phone": lead["phone"], "firstname": "Old"})
+    return contacts
+
+
+def _separate_searches(client: HubSpotClient, lead):
+    """The pre-batch upsert_lead: up to three sequential requests"""
+    properties = HubSpotClient._lead_properties(**lead)
+    existing = client.search_contact_by_email(lead["email"]) or client.search_contact_by_phone(lead["phone"])
+    if existing:
+        success, contact_id, error = client.update_contact(existing["id"], properties)
+        return success, contact_id or existing["id"], error
+    return client.create_contact(properties)
+
+
+def _run_mode(label: str, client: HubSpotClient, store, leads, seed):
+    if label == "batch_repeat":
+        # Contacts stay as the previous mode left them
+        store.requests.clear()
+        store.connections.clear()
+    else:
+        store.reset(seed)
+        client.contact_ids.clear()
+    start = time.perf_counter()
+    if label in ("batch", "batch_repeat"):
+        outcomes = client.batch_upsert_leads(leads)
+    elif label == "per_lead":
+        outcomes = [client.upsert_lead(**lead) for lead in leads]
+    else:
+        outcomes = [_separate_searches(client, lead) for lead in leads]
+    elapsed = time.perf_counter() - start
+
+    return {
+        "leads": len(leads),
+        "succeeded": sum(1 for success, _, _ in outcomes if success),
+        "failed": sum(1 for success, _, _ in outcomes if not success),
+        "round_trips": sum(store.requests.values()),
+        "requests": dict(store.requests),
+        "connections": len(store.connections),
+        "wall_ms": round(elapsed * 1000, 1),
+        "ms_per_lead": round(elapsed * 1000 / len(leads), 2),
+        "contacts_after": len(store.contacts)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--leads", type=int, default=100)
+    parser.add_argument("--existing", type=float, default=0.3, help="Share of leads already in the CRM by email")
+    parser.add_argument("--phone-matches", type=float, default=0.1, help="Share matching an existing contact by phone only")
+    parser.add_argument("--invalid", type=int, default=0, help="Leads with an email HubSpot rejects")
+    parser.add_argument("--latency-ms", type=float, default=50, help="Stand-in latency per request")
+    parser.add_argument("--faults", help="Stand-in fault spec (standins/faults.py); replaces --latency-ms")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    faults = FaultProfile.parse(args.faults) if args.faults else None
+    app = create_app(latency=args.latency_ms / 1000, faults=faults)
+    store = app.state.store
+    leads = _leads(args.leads, args.invalid)
+    seed = _seed(leads, args.existing, args.phone_matches)
+
+    results = {"config": vars(args)}
+    with serve(app) as url:
+        client = HubSpotClient(api_key="bench-not-a-real-key", base_url=url)
+        # Before pooling every call went through requests.post: no keep-alive
+        original = HubSpotClient(api_key="bench-not-a-real-key", base_url=url)
+        original.session.headers["Connection"] = "close"
+        results["per_lead_separate_searches"] = _run_mode("per_lead_separate_searches", original, store, leads, seed)
+        for label in ("per_lead", "batch", "batch_repeat"):
+            results[label] = _run_mode(label, client, store, leads, seed)
+        results["contact_cache"] = client.stats()
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Intent routing microbenchmark: keyword substring scans vs intent_router
+
+Checks both against the labelled messages in intent_fixtures.jsonl
+(search needed, product id, off-topic) and times one classification of
+every fixture message. The router is timed without its memo, as on the
+first lookup of a message, and with it, as on the repeat lookups of a turn.
+
+Usage (from backend/):
+    python benchmarks/bench_intent_router.py --iterations 2000 --show-errors
+    python benchmarks/bench_intent_router.py --check   # exit 1 on any router mistake
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+import common  # noqa: F401  (prepares the environment)
+
+from conversation_state import ConversationState
+from intent_router import route_message
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "intent_fixtures.jsonl")
+FIELDS = ("search", "product", "off_topic")
+
+
+def legacy_should_search(message: str) -> bool:
+    """llm.should_search before intent_router"""
+    search_keywords = [
+        "latest", "recent", "news", "update", "current",
+        "2024", "2025", "today", "now",
+        "price", "cost", "compare", "vs", "versus",
+        "best", "top", "trending"
+    ]
+    message_lower = message.lower()
+    return any(keyword in message_lower for keyword in search_keywords)
+
+
+def legacy_product(message: str) -> Optional[str]:
+    """LeadCollector._extract_product_selection before intent_router"""
+    message_lower = message.lower()
+    for product in ConversationState.PRODUCTS:
+        if product["id"] in message_lower or product["label"].lower() in message_lower:
+            return product["id"]
+    if any(word in message_lower for word in ["mobile", "android", "ios", "app"]):
+        return "mobile_app"
+    if any(word in message_lower for word in ["web", "website", "webapp"]):
+        return "web_app"
+    if "mvp" in message_lower or "minimum viable" in message_lower:
+        return "mvp"
+    if "ecommerce" in message_lower or "e-commerce" in message_lower or "shop" in message_lower:
+        return "ecommerce"
+    if "ai" in message_lower or "artificial intelligence" in message_lower:
+        return "ai_integration"
+    return None
+
+
+def legacy_route(message: str) -> Dict:
+    # No off-topic detection existed; every message went to Gemini
+    return {"search": legacy_should_search(message), "product": legacy_product(message), "off_topic": False}
+
+
+def router_route(message: str) -> Dict:
+    route = route_message.__wrapped__(message)
+    return {"search": route.search, "product": route.product, "off_topic": route.off_topic}
+
+
+def _load_fixtures() -> List[Dict]:
+    with open(FIXTURES, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _accuracy(route, fixtures: List[Dict]) -> Tuple[Dict, List[Dict]]:
+    correct = {field: 0 for field in FIELDS}
+    errors = []
+    for fixture in fixtures:
+        got = route(fixture["message"])
+        wrong = [field for field in FIELDS if got[field] != fixture[field]]
+        for field in FIELDS:
+            correct[field] += field not in wrong
+        if wrong:
+            errors.append({
+                "message": fixture["message"],
+                **{field: {"expected": fixture[field], "got": got[field]} for field in wrong}
+            })
+    accuracy = {field: round(correct[field] / len(fixtures), 3) for field in FIELDS}
+    accuracy["all_fields"] = round((len(fixtures) - len(errors)) / len(fixtures), 3)
+    return accuracy, errors
+
+
+def _per_message_us(route, messages: List[str], iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for message in messages:
+            route(message)
+    return round((time.perf_counter() - start) / (iterations * len(messages)) * 1e6, 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--show-errors", action="store_true", help="List misrouted fixtures")
+    parser.add_argument("--check", action="store_true", help="Exit with status 1 if the router misroutes a fixture")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    fixtures = _load_fixtures()
+    messages = [fixture["message"] for fixture in fixtures]
+    results = {"fixtures": len(fixtures)}
+    errors = {}
+    for name, route in (("legacy", legacy_route), ("router", router_route)):
+        accuracy, errors[name] = _accuracy(route, fixtures)
+        results[name] = {
+            "accuracy": accuracy,
+            "misrouted": len(errors[name]),
+            "per_message_us": _per_message_us(route, messages, args.iterations)
+        }
+    route_message.cache_clear()
+    results["router"]["cached_per_message_us"] = _per_message_us(route_message, messages, args.iterations)
+    if args.show_errors:
+        results["errors"] = errors
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.check and errors["router"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Conversation state microbenchmark: JSON text vs the binary state format
+
+Reports encode/decode time, stored size and per-object memory of live
+ConversationState objects, compared with the previous dict-backed layout
+(a raw ``data`` dict plus an instance ``__dict__`` copy of every field).
+
+Usage (from backend/):
+    python benchmarks/bench_state_codec.py --iterations 200000
+"""
+import argparse
+import json
+import timeit
+import tracemalloc
+
+import common  # noqa: F401  (prepares the environment)
+
+from conversation_state import ConversationState, ConversationStage
+
+# A session midway through lead capture: most fields set, one retry recorded
+SAMPLE = {
+    "stage": ConversationStage.COLLECTING_EMAIL.value,
+    "product_type": "mobile_app",
+    "name": "Jane Doe",
+    "whatsapp_number": "+919876543210",
+    "email": None,
+    "project_goal": "A fitness tracking app for runners",
+    "attempts": {"whatsapp_number": 1},
+    "hubspot_contact_id": None
+}
+
+
+class DictBackedState:
+    """The pre-slots ConversationState layout, kept for comparison"""
+
+    def __init__(self, session_data=None):
+        self.data = session_data or {}
+        self.stage = self.data.get("stage", ConversationStage.INITIAL)
+        self.product_type = self.data.get("product_type")
+        self.name = self.data.get("name")
+        self.whatsapp_number = self.data.get("whatsapp_number")
+        self.email = self.data.get("email")
+        self.project_goal = self.data.get("project_goal")
+        self.attempts = self.data.get("attempts", {})
+        self.hubspot_contact_id = self.data.get("hubspot_contact_id")
+
+
+def _per_call_us(fn, iterations: int) -> float:
+    # Best of 5 to keep scheduler noise out of the comparison
+    return round(min(timeit.repeat(fn, number=iterations, repeat=5)) / iterations * 1e6, 3)
+
+
+def _bytes_per_object(factory, count: int) -> float:
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    objects = [factory() for _ in range(count)]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    allocated = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    # The list holding the objects is not part of their footprint
+    allocated -= objects.__sizeof__()
+    return round(allocated / count, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--iterations", type=int, default=200000)
+    parser.add_argument("--objects", type=int, default=100000)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    state = ConversationState(dict(SAMPLE))
+    text = json.dumps(state.to_dict())
+    blob = state.to_bytes()
+    assert ConversationState.from_bytes(blob).to_dict() == state.to_dict()
+
+    results = {
+        "encode_us": {
+            "json": _per_call_us(lambda: json.dumps(state.to_dict()), args.iterations),
+            "binary": _per_call_us(state.to_bytes, args.iterations)
+        },
+        "decode_us": {
+            "json": _per_call_us(lambda: ConversationState(json.loads(text)), args.iterations),
+            "binary": _per_call_us(lambda: ConversationState.from_bytes(blob), args.iterations)
+        },
+        "stored_bytes": {
+            "json": len(text.encode("utf-8")),
+            "binary": len(blob)
+        },
+        # Live objects as decoded from storage, the way the state cache holds them
+        "object_bytes": {
+            "dict_backed": _bytes_per_object(lambda: DictBackedState(json.loads(text)), args.objects),
+            "slotted_from_json": _bytes_per_object(lambda: ConversationState(json.loads(text)), args.objects),
+            "slotted_from_binary": _bytes_per_object(lambda: ConversationState.from_bytes(blob), args.objects)
+        }
+    }
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Time-to-first-byte benchmark: /api/chat vs /api/chat/stream
+
+Runs the real app under uvicorn with an in-process fake Gemini model and
+reports p50/p99 time to first byte, time to first answer token and total
+latency for both paths. With --standin, Gemini is called over gRPC through
+the local stand-in (standins/gemini.py) instead, like the real SDK path.
+
+Usage (from backend/):
+    python benchmarks/bench_ttfb.py --requests 50 --concurrency 4
+"""
+import argparse
+import asyncio
+import json
+import time
+from contextlib import ExitStack
+
+import common  # noqa: F401  (prepares the environment)
+from common import FakeGeminiModel, seed_qa_session, serve, summarize
+
+import httpx
+
+import llm
+from main import app
+from standins import gemini
+from standins.faults import FaultProfile
+
+
+async def _one_request(client: httpx.AsyncClient, path: str, payload: dict):
+    """
+    Return (ttfb, ttft, total) in seconds for a single chat request
+    
+    TTFB is the first body byte; TTFT is the first byte of answer text,
+    which for the non-streaming path is the whole JSON body.
+    """
+    start = time.perf_counter()
+    ttfb = ttft = None
+    async with client.stream("POST", path, json=payload) as response:
+        response.raise_for_status()
+        async for chunk in response.aiter_bytes():
+            now = time.perf_counter() - start
+            if ttfb is None and chunk:
+                ttfb = now
+            if ttft is None and (b"event: token" in chunk or not path.endswith("/stream")):
+                ttft = now
+    total = time.perf_counter() - start
+    return ttfb or total, ttft or total, total
+
+
+async def _run_path(base_url: str, path: str, requests: int, concurrency: int, message: str):
+    ttfbs, ttfts, totals = [], [], []
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+        async def worker():
+            async with semaphore:
+                payload = {"session_id": seed_qa_session(), "message": message}
+                ttfb, ttft, total = await _one_request(client, path, payload)
+                ttfbs.append(ttfb)
+                ttfts.append(ttft)
+                totals.append(total)
+        
+        await asyncio.gather(*(worker() for _ in range(requests)))
+    
+    return {"ttfb": summarize(ttfbs), "ttft": summarize(ttfts), "total": summarize(totals)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--first-token-ms", type=float, default=350)
+    parser.add_argument("--chunk-ms", type=float, default=40)
+    parser.add_argument("--chunks", type=int, default=40)
+    parser.add_argument("--standin", action="store_true", help="Call Gemini through the gRPC stand-in")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+    
+    message = "Tell me about your engineering process"
+    
+    results = {}
+    with ExitStack() as stack:
+        if args.standin:
+            standin = gemini.GeminiStandin(
+                FaultProfile(latency=f"fixed:{args.first_token_ms:g}"),
+                chunks=args.chunks,
+                chunk_delay=args.chunk_ms / 1000
+            )
+            llm.GEMINI_API_ENDPOINT = stack.enter_context(gemini.serve(standin))
+        else:
+            llm.model = FakeGeminiModel(
+                first_token_delay=args.first_token_ms / 1000,
+                chunk_delay=args.chunk_ms / 1000,
+                num_chunks=args.chunks
+            )
+        base_url = stack.enter_context(serve(app))
+        # Warm up connections, imports and the database
+        asyncio.run(_run_path(base_url, "/api/chat", 2, 1, message))
+        for label, path in (("non_streaming", "/api/chat"), ("streaming", "/api/chat/stream")):
+            results[label] = asyncio.run(
+                _run_path(base_url, path, args.requests, args.concurrency, message)
+            )
+    
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""
+Shared helpers for the backend benchmarks
+
+Benchmarks run the real FastAPI app against a throwaway SQLite database and
+never call paid external APIs. Import this module before any backend module
+so the environment is prepared before config.py is loaded.
+"""
+import asyncio
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+WORK_DIR = tempfile.mkdtemp(prefix="aal-bench-")
+
+# Benchmarks must never pick up production keys or databases
+os.environ["GOOGLE_API_KEY"] = os.environ.get("BENCH_GOOGLE_API_KEY", "bench-not-a-real-key")
+os.environ["GOOGLE_CSE_ID"] = ""
+os.environ["HUBSPOT_API_KEY"] = ""
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(WORK_DIR, 'bench.db')}"
+os.environ["RATE_LIMIT_PER_MINUTE"] = "1000000"
+# Repeated benchmark questions would otherwise be answered from the cache
+os.environ.setdefault("RESPONSE_CACHE_SIZE", "0")
+
+
+class _FakeChunk:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class _FakeStream:
+    """Async iterator mimicking AsyncGenerateContentResponse with stream=True"""
+    
+    def __init__(self, model: "FakeGeminiModel"):
+        self.model = model
+    
+    async def __aiter__(self):
+        await asyncio.sleep(self.model.first_token_delay)
+        for i in range(self.model.num_chunks):
+            if i:
+                await asyncio.sleep(self.model.chunk_delay)
+            yield _FakeChunk(self.model.chunk_text)
+
+
+class _FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class _FakeChat:
+    def __init__(self, model: "FakeGeminiModel"):
+        self.model = model
+    
+    def send_message(self, message, stream: bool = False):
+        return self.model.generate_content(message)
+    
+    async def send_message_async(self, message, stream: bool = False):
+        return await self.model.generate_content_async(message, stream=stream)
+
+
+class FakeGeminiModel:
+    """
+    In-process stand-in for genai.GenerativeModel
+    
+    Produces ``num_chunks`` chunks; the first arrives after
+    ``first_token_delay`` seconds and each following one after
+    ``chunk_delay`` seconds, roughly matching Gemini's streaming cadence.
+    """
+    
+    def __init__(
+        self,
+        first_token_delay: float = 0.35,
+        chunk_delay: float = 0.04,
+        num_chunks: int = 40,
+        chunk_text: str = "lorem ipsum dolor sit amet "
+    ):
+        self.first_token_delay = first_token_delay
+        self.chunk_delay = chunk_delay
+        self.num_chunks = num_chunks
+        self.chunk_text = chunk_text
+    
+    @property
+    def full_latency(self) -> float:
+        return self.first_token_delay + self.chunk_delay * (self.num_chunks - 1)
+    
+    def start_chat(self, history=None):
+        return _FakeChat(self)
+    
+    def generate_content(self, contents, stream: bool = False):
+        time.sleep(self.full_latency)
+        return _FakeResponse(self.chunk_text * self.num_chunks)
+    
+    async def generate_content_async(self, contents, stream: bool = False):
+        if stream:
+            return _FakeStream(self)
+        await asyncio.sleep(self.full_latency)
+        return _FakeResponse(self.chunk_text * self.num_chunks)
+
+
+def seed_qa_session() -> str:
+    """
+    Create a session that already finished lead capture
+    
+    Fresh sessions are answered by the lead collector; seeded sessions send
+    every message to Gemini, which is the path the benchmarks measure.
+    """
+    import json
+    import uuid
+    from conversation_state import ConversationStage
+    from database import SessionLocal, ChatSession, init_db
+    
+    init_db()
+    session_id = str(uuid.uuid4())
+    db = SessionLocal()
+    try:
+        db.add(ChatSession(
+            id=session_id,
+            conversation_state=json.dumps({
+                "stage": ConversationStage.GENERAL_QA.value,
+                "product_type": "other"
+            })
+        ))
+        db.commit()
+    finally:
+        db.close()
+    return session_id
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@contextmanager
+def serve(app, host: str = "127.0.0.1"):
+    """Run an ASGI app with uvicorn in a background thread, yielding its base URL"""
+    import uvicorn
+    
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    
+    deadline = time.monotonic() + 10
+    while not server.started:
+        if time.monotonic() > deadline:
+            raise RuntimeError("Benchmark server failed to start")
+        time.sleep(0.01)
+    
+    try:
+        yield f"http://{host}:{port}"
+    finally:
+        server.should_exit = True
+        thread.join(timeout=10)
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of ``values`` (pct in 0-100)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, int(round(pct / 100 * len(ordered) + 0.5)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    """p50/p95/p99/mean summary in milliseconds"""
+    ms = [v * 1000 for v in values]
+    return {
+        "count": len(ms),
+        "mean_ms": round(sum(ms) / len(ms), 2) if ms else 0.0,
+        "p50_ms": round(percentile(ms, 50), 2),
+        "p95_ms": round(percentile(ms, 95), 2),
+        "p99_ms": round(percentile(ms, 99), 2),
+    }
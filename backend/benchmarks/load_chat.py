@@ -0,0 +1,322 @@
+"""
+End-to-end load test: simulated widget users against /api/chat
+
+Each simulated user walks the real flows over HTTP: the welcome message, a
+product bubble, the LeadCollector goal/name/phone/email sequence (some users
+give a goal too short to keep and are asked for it again at the end), then
+free-form questions answered by Gemini, with and without keywords that
+trigger a web search. Gemini, Custom Search and HubSpot are the local
+stand-ins (standins/), with configurable latency and faults.
+
+Reports throughput, p50/p95/p99 latency and errors per turn type, database
+growth and lead delivery, and writes everything as JSON so runs from two
+commits can be compared (--baseline prints the differences).
+
+Usage (from backend/):
+    python benchmarks/load_chat.py --users 200 --concurrency 50
+    python benchmarks/load_chat.py --output new.json --baseline old.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import subprocess
+import time
+from collections import defaultdict
+from contextlib import ExitStack
+
+import common
+from common import serve, summarize
+
+import httpx
+
+from standins import cse, gemini, hubspot
+from standins.faults import FaultProfile
+
+GOALS = [
+    "A fitness tracking app for runners with GPS routes",
+    "An internal dashboard for our logistics fleet",
+    "A marketplace connecting local tutors and students",
+    "Predictive maintenance for our battery packs",
+    "A customer support chatbot trained on our manuals"
+]
+SHORT_GOALS = ["an app", "not sure", "website"]
+PLAIN_QUESTIONS = [
+    "How does your development process work?",
+    "Do you sign NDAs before starting a project?",
+    "Can you take over an existing codebase?",
+    "What does a typical team for a project look like?",
+    "How do you handle testing and QA?",
+    "Where is your office located?"
+]
+# Each contains a should_search keyword
+SEARCH_QUESTIONS = [
+    "What are the latest trends in {topic}?",
+    "How much does {topic} cost these days?",
+    "Compare Flutter vs React Native for {topic}",
+    "What is the best cloud setup for {topic} today?"
+]
+TOPICS = ["mobile apps", "fintech apps", "AI chatbots", "e-commerce sites", "GIS platforms", "IoT dashboards"]
+
+
+class Recorder:
+    """Latencies and outcomes per turn type"""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(lambda: defaultdict(int))
+        self.degraded = defaultdict(int)
+        self.users_completed = 0
+
+    def report(self, wall: float) -> dict:
+        per_type = {}
+        for turn_type in sorted(set(self.latencies) | set(self.errors)):
+            values = self.latencies[turn_type]
+            per_type[turn_type] = {
+                **summarize(values),
+                "throughput_per_s": round(len(values) / wall, 2),
+                "errors": dict(self.errors[turn_type]),
+                "degraded": self.degraded[turn_type]
+            }
+        turns = sum(len(values) for values in self.latencies.values())
+        return {
+            "wall_s": round(wall, 2),
+            "turns": turns,
+            "turns_per_s": round(turns / wall, 2),
+            "users_completed": self.users_completed,
+            "errors": sum(sum(e.values()) for e in self.errors.values()),
+            "per_turn_type": per_type
+        }
+
+
+async def _turn(client: httpx.AsyncClient, recorder: Recorder, turn_type: str, session_id, message: str, error_text: str):
+    """Send one message; returns the response body, or None on failure"""
+    start = time.perf_counter()
+    try:
+        response = await client.post("/api/chat", json={"session_id": session_id, "message": message})
+    except httpx.HTTPError as e:
+        recorder.errors[turn_type][type(e).__name__] += 1
+        return None
+    elapsed = time.perf_counter() - start
+    if response.status_code != 200:
+        recorder.errors[turn_type][f"HTTP {response.status_code}"] += 1
+        return None
+    body = response.json()
+    recorder.latencies[turn_type].append(elapsed)
+    if body.get("text") == error_text:
+        recorder.degraded[turn_type] += 1
+    return body
+
+
+async def _user(n: int, client: httpx.AsyncClient, recorder: Recorder, args, rng: random.Random, error_text: str):
+    """One widget visitor: welcome, bubble, lead capture, then questions"""
+    async def think():
+        if args.think_ms:
+            await asyncio.sleep(rng.uniform(0, args.think_ms) / 1000)
+
+    body = await _turn(client, recorder, "welcome", None, "hi", error_text)
+    if body is None:
+        return
+    session_id = body["session_id"]
+    bubbles = body.get("quick_replies") or [{"label": "Mobile App Development"}]
+
+    short_goal = rng.random() < args.short_goal_share
+    steps = [
+        ("bubble", rng.choice(bubbles)["label"]),
+        ("goal", rng.choice(SHORT_GOALS) if short_goal else rng.choice(GOALS)),
+        ("name", f"Load Tester {n}"),
+        ("phone", f"+91 9{n:09d}"),
+        ("email", f"loadtest{n}@example.com")
+    ]
+    if short_goal:
+        steps.append(("goal_followup", rng.choice(GOALS)))
+    for _ in range(args.questions):
+        if rng.random() < args.search_share:
+            question = rng.choice(SEARCH_QUESTIONS).format(topic=rng.choice(TOPICS))
+            steps.append(("qa_search", question))
+        else:
+            steps.append(("qa_plain", rng.choice(PLAIN_QUESTIONS)))
+
+    for turn_type, message in steps:
+        await think()
+        if await _turn(client, recorder, turn_type, session_id, message, error_text) is None:
+            return
+    recorder.users_completed += 1
+
+
+async def _drive(base_url: str, args, error_text: str) -> dict:
+    recorder = Recorder()
+    rng = random.Random(args.seed)
+    semaphore = asyncio.Semaphore(args.concurrency)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+        async def run_user(n: int):
+            async with semaphore:
+                await _user(n, client, recorder, args, random.Random(rng.random()), error_text)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(run_user(n) for n in range(args.users)))
+        wall = time.perf_counter() - start
+        health = (await client.get("/health")).json()
+
+    results = recorder.report(wall)
+    results["health"] = {
+        key: health.get(key)
+        for key in ("llm_pool", "search", "circuit_breakers", "lead_outbox", "write_behind", "state_cache")
+    }
+    return results
+
+
+def _db_path() -> str:
+    return os.environ["DATABASE_URL"].replace("sqlite:///", "", 1)
+
+
+def _db_snapshot(path: str) -> dict:
+    """File sizes and row counts of the SQLite database"""
+    sizes = {suffix or "db": os.path.getsize(path + suffix) for suffix in ("", "-wal") if os.path.exists(path + suffix)}
+    rows = {}
+    if os.path.exists(path):
+        conn = sqlite3.connect(path)
+        try:
+            for table in ("chat_sessions", "chat_messages", "lead_outbox"):
+                try:
+                    rows[table] = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                except sqlite3.OperationalError:
+                    rows[table] = 0
+            leads = dict(conn.execute("SELECT status, COUNT(*) FROM lead_outbox GROUP BY status").fetchall())
+        except sqlite3.OperationalError:
+            leads = {}
+        finally:
+            conn.close()
+    else:
+        leads = {}
+    return {"bytes": sizes, "rows": rows, "leads": leads}
+
+
+def _db_growth(before: dict, after: dict, turns: int) -> dict:
+    grown = sum(after["bytes"].values()) - sum(before["bytes"].values())
+    return {
+        "before": before,
+        "after": after,
+        "bytes_added": grown,
+        "bytes_per_turn": round(grown / turns, 1) if turns else 0.0,
+        "rows_added": {table: count - before["rows"].get(table, 0) for table, count in after["rows"].items()}
+    }
+
+
+def _checkpoint(path: str):
+    """Fold the WAL into the database file so its size is comparable between runs"""
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    finally:
+        conn.close()
+
+
+def _wait_for_leads(path: str, seconds: float):
+    """Give the outbox worker time to deliver the leads the run queued"""
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        if not _db_snapshot(path)["leads"].get("queued"):
+            return
+        time.sleep(0.25)
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=common.BACKEND_DIR
+        ).stdout.strip()
+    except OSError:
+        return ""
+
+
+def _compare(results: dict, baseline: dict):
+    """Print throughput and per-type p50/p95 changes against an earlier run"""
+    def change(new, old):
+        return f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+
+    print(f"\nAgainst {baseline.get('commit') or 'baseline'}:")
+    print(f"  turns/s  {baseline['turns_per_s']:>9} -> {results['turns_per_s']:<9} {change(results['turns_per_s'], baseline['turns_per_s'])}")
+    for turn_type, new in results["per_turn_type"].items():
+        old = baseline["per_turn_type"].get(turn_type)
+        if not old:
+            continue
+        print(
+            f"  {turn_type:<14} p50 {old['p50_ms']:>8} -> {new['p50_ms']:<8} {change(new['p50_ms'], old['p50_ms']):>8}"
+            f"   p95 {old['p95_ms']:>8} -> {new['p95_ms']:<8} {change(new['p95_ms'], old['p95_ms']):>8}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=25, help="Users active at once")
+    parser.add_argument("--questions", type=int, default=3, help="Q&A turns per user after lead capture")
+    parser.add_argument("--search-share", type=float, default=0.4, help="Share of questions with a search keyword")
+    parser.add_argument("--short-goal-share", type=float, default=0.2, help="Users asked for their goal again")
+    parser.add_argument("--think-ms", type=float, default=0, help="Max random pause between a user's turns")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--gemini", default="latency=lognormal:350:1200", help="Gemini stand-in fault spec (first chunk)")
+    parser.add_argument("--gemini-chunks", type=int, default=20)
+    parser.add_argument("--gemini-chunk-ms", type=float, default=20)
+    parser.add_argument("--cse", default="latency=lognormal:250:800", help="Custom Search stand-in fault spec")
+    parser.add_argument("--hubspot", default="latency=lognormal:120:500", help="HubSpot stand-in fault spec")
+    parser.add_argument("--lead-drain-s", type=float, default=10, help="Wait this long for queued leads after the run")
+    parser.add_argument("--url", help="Drive an already running backend instead (no stand-ins or DB stats)")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--baseline", help="Earlier results JSON to compare against")
+    args = parser.parse_args()
+
+    results = {"commit": _git_commit(), "config": vars(args)}
+    with ExitStack() as stack:
+        if args.url:
+            from llm import ERROR_RESPONSE
+            results.update(asyncio.run(_drive(args.url, args, ERROR_RESPONSE)))
+        else:
+            standin = gemini.GeminiStandin(
+                FaultProfile.parse(args.gemini), chunks=args.gemini_chunks, chunk_delay=args.gemini_chunk_ms / 1000
+            )
+            cse_app = cse.create_app(FaultProfile.parse(args.cse))
+            hubspot_app = hubspot.create_app(faults=FaultProfile.parse(args.hubspot))
+            search_url = stack.enter_context(serve(cse_app))
+            os.environ.update(
+                GEMINI_API_ENDPOINT=stack.enter_context(gemini.serve(standin)),
+                GOOGLE_SEARCH_URL=search_url + cse.SEARCH_PATH,
+                GOOGLE_CSE_ID="load-test",
+                HUBSPOT_BASE_URL=stack.enter_context(serve(hubspot_app)),
+                HUBSPOT_API_KEY="load-test-not-a-real-key"
+            )
+
+            # config.py reads the stand-in settings on import
+            from llm import ERROR_RESPONSE
+            from main import app
+
+            path = _db_path()
+            base_url = stack.enter_context(serve(app))
+            before = _db_snapshot(path)
+            results.update(asyncio.run(_drive(base_url, args, ERROR_RESPONSE)))
+            _wait_for_leads(path, args.lead_drain_s)
+            _checkpoint(path)
+            results["database"] = _db_growth(before, _db_snapshot(path), results["turns"])
+            results["standins"] = {
+                "gemini": {"requests": dict(standin.requests), "faults": dict(standin.faults.counts)},
+                "cse": {"requests": sum(cse_app.state.requests.values()), "faults": dict(cse_app.state.faults.counts)},
+                "hubspot": {"requests": dict(hubspot_app.state.store.requests), "faults": dict(hubspot_app.state.faults.counts)}
+            }
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            _compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+"""
+Offline indexing pipeline for the local knowledge base
+Chunks the site HTML, embeds the chunks on CPU and writes the index
+read by knowledge_base.py
+
+Usage (from backend/):
+    python build_index.py [--output rag_index] [--model hashing]
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+from datetime import datetime
+from html.parser import HTMLParser
+from typing import Dict, Iterator, List
+
+import numpy as np
+
+from config import RAG_INDEX_DIR, RAG_EMBED_MODEL
+from knowledge_base import VECTORS_FILE, IDF_FILE, CHUNKS_FILE, META_FILE, get_embedder
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SOURCE_DIRS = [
+    os.path.join(REPO_DIR, "frontend"),
+    os.path.join(REPO_DIR, "scraped", "original"),
+]
+
+# Widget test pages and WordPress assets are not site content
+SKIP_DIRS = {"wp-content", "wp-includes", "components"}
+SKIP_FILE_PATTERN = re.compile(r"^(test-|debug-|verification|clear-cache)")
+
+CHUNK_WORDS = 60
+CHUNK_OVERLAP = 15
+
+BLOCK_TAGS = {
+    "p", "div", "section", "article", "li", "ul", "ol", "br", "tr", "td",
+    "h1", "h2", "h3", "h4", "h5", "h6", "header", "footer", "nav", "a", "span", "button"
+}
+HEADING_TAGS = {"h1", "h2", "h3", "h4"}
+SKIP_TAGS = {"script", "style", "noscript", "svg", "template"}
+
+
+class SiteTextExtractor(HTMLParser):
+    """Split visible page text into (heading, block text) pairs and collect JSON-LD"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.blocks: List[Dict[str, str]] = []
+        self.json_ld: List[str] = []
+        self._skip_depth = 0
+        self._in_json_ld = False
+        self._in_heading = False
+        self._heading = ""
+        self._buffer: List[str] = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "script" and dict(attrs).get("type") == "application/ld+json":
+            self._in_json_ld = True
+            return
+        if tag in SKIP_TAGS:
+            self._skip_depth += 1
+            return
+        if tag in BLOCK_TAGS:
+            self._flush()
+        if tag in HEADING_TAGS:
+            self._in_heading = True
+
+    def handle_endtag(self, tag):
+        if self._in_json_ld and tag == "script":
+            self._in_json_ld = False
+            return
+        if tag in SKIP_TAGS:
+            self._skip_depth = max(self._skip_depth - 1, 0)
+            return
+        if tag in HEADING_TAGS:
+            self._in_heading = False
+            heading = " ".join("".join(self._buffer).split())
+            # Counters like "3X" or "95%" are styled as headings too
+            if re.search(r"[A-Za-z]{3,}", heading):
+                self._heading = heading
+        if tag in BLOCK_TAGS:
+            self._flush()
+
+    def handle_data(self, data):
+        if self._in_json_ld:
+            self.json_ld.append(data)
+        elif not self._skip_depth:
+            self._buffer.append(data)
+
+    def _flush(self):
+        text = " ".join("".join(self._buffer).split())
+        self._buffer = []
+        if text and not self._in_heading:
+            self.blocks.append({"title": self._heading, "text": text})
+
+
+def _json_ld_passages(raw: str) -> Iterator[Dict[str, str]]:
+    """Turn schema.org JSON-LD (FAQ, organization, services) into passages"""
+    try:
+        data = json.loads(raw)
+    except ValueError:
+        return
+
+    nodes = data.get("@graph", [data]) if isinstance(data, dict) else data
+    for node in nodes:
+        kind = node.get("@type")
+        if kind == "FAQPage":
+            for question in node.get("mainEntity", []):
+                answer = question.get("acceptedAnswer", {}).get("text", "")
+                yield {"title": question.get("name", "FAQ"), "text": f"{question.get('name', '')} {answer}"}
+        elif kind == "Organization":
+            address = node.get("address", {})
+            contact = node.get("contactPoint", {})
+            parts = [
+                node.get("description", ""),
+                f"Founded in {node['foundingDate']}." if node.get("foundingDate") else "",
+                "Address: " + " ".join(
+                    str(address.get(key, "")) for key in
+                    ("streetAddress", "addressLocality", "addressRegion", "postalCode", "addressCountry")
+                ) if address else "",
+                f"Phone: {contact['telephone']}." if contact.get("telephone") else "",
+                "Expertise: " + ", ".join(node.get("knowsAbout", [])) if node.get("knowsAbout") else "",
+            ]
+            yield {"title": node.get("name", "About"), "text": " ".join(p for p in parts if p)}
+        elif kind == "Service":
+            yield {"title": node.get("serviceType", "Service"),
+                   "text": f"{node.get('serviceType', '')}: {node.get('description', '')}"}
+        elif node.get("description"):
+            yield {"title": node.get("name", kind or "Site"), "text": node["description"]}
+
+
+def _window(blocks: List[Dict[str, str]]) -> Iterator[Dict[str, str]]:
+    """Group consecutive blocks into overlapping ~CHUNK_WORDS word chunks"""
+    words: List[str] = []
+    title = ""
+    for block in blocks:
+        if not words:
+            title = block["title"]
+        words.extend(block["text"].split())
+        while len(words) >= CHUNK_WORDS:
+            yield {"title": title, "text": " ".join(words[:CHUNK_WORDS])}
+            words = words[CHUNK_WORDS - CHUNK_OVERLAP:]
+            title = block["title"]
+    if len(words) > CHUNK_OVERLAP:
+        yield {"title": title, "text": " ".join(words)}
+
+
+def iter_html_files() -> Iterator[str]:
+    for source_dir in SOURCE_DIRS:
+        for root, dirs, files in os.walk(source_dir):
+            dirs[:] = [d for d in dirs if d not in SKIP_DIRS]
+            for name in sorted(files):
+                if name.endswith(".html") and not SKIP_FILE_PATTERN.match(name):
+                    yield os.path.join(root, name)
+
+
+def extract_chunks() -> List[Dict[str, str]]:
+    """Chunk every site page, dropping duplicates (the mirror repeats pages)"""
+    chunks = []
+    seen = set()
+    for path in iter_html_files():
+        extractor = SiteTextExtractor()
+        with open(path, encoding="utf-8", errors="ignore") as f:
+            extractor.feed(f.read())
+
+        source = os.path.relpath(path, REPO_DIR)
+        passages = [p for raw in extractor.json_ld for p in _json_ld_passages(raw)]
+        passages += list(_window(extractor.blocks))
+
+        for passage in passages:
+            digest = hashlib.sha1(passage["text"].lower().encode("utf-8")).hexdigest()
+            if digest in seen:
+                continue
+            seen.add(digest)
+            chunks.append({**passage, "source": source})
+    return chunks
+
+
+def build_index(output_dir: str, model_name: str):
+    chunks = extract_chunks()
+    if not chunks:
+        raise SystemExit("No site content found to index")
+
+    embedder = get_embedder(model_name)
+    texts = [f"{chunk['title']}. {chunk['text']}" for chunk in chunks]
+    embedder.fit(texts)
+    vectors = embedder.embed(texts).astype(np.float32)
+
+    os.makedirs(output_dir, exist_ok=True)
+    np.save(os.path.join(output_dir, VECTORS_FILE), vectors)
+    if getattr(embedder, "idf", None) is not None:
+        np.save(os.path.join(output_dir, IDF_FILE), embedder.idf)
+    with open(os.path.join(output_dir, CHUNKS_FILE), "w") as f:
+        json.dump(chunks, f, ensure_ascii=False, indent=1)
+    with open(os.path.join(output_dir, META_FILE), "w") as f:
+        json.dump({
+            "embedder": embedder.name,
+            "dim": int(vectors.shape[1]),
+            "count": len(chunks),
+            "built_at": datetime.utcnow().isoformat()
+        }, f, indent=2)
+
+    print(f"✓ Indexed {len(chunks)} chunks ({embedder.name}, dim={vectors.shape[1]}) into {output_dir}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the local knowledge base index")
+    parser.add_argument("--output", default=RAG_INDEX_DIR, help="Index directory")
+    parser.add_argument("--model", default=RAG_EMBED_MODEL,
+                        help='"hashing" or a sentence-transformers model name')
+    args = parser.parse_args()
+    build_index(args.output, args.model)
@@ -0,0 +1,273 @@
+"""
+Circuit breakers for outbound dependencies (Gemini, Google CSE, HubSpot)
+A dependency that keeps failing or answering slowly is skipped for a while,
+so turns fall back to their degraded responses at once instead of waiting
+for timeouts
+"""
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Optional
+
+from config import (
+    CIRCUIT_BREAKER_ENABLED, CIRCUIT_BREAKER_WINDOW_SECONDS, CIRCUIT_BREAKER_MIN_CALLS,
+    CIRCUIT_BREAKER_ERROR_RATE, CIRCUIT_BREAKER_SLOW_RATE, CIRCUIT_BREAKER_OPEN_SECONDS,
+    CIRCUIT_BREAKER_HALF_OPEN_CALLS
+)
+from metrics import Gauge, dependency_seconds, registry
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Every breaker created, by name, for /health
+_breakers: Dict[str, "CircuitBreaker"] = {}
+
+
+class CircuitOpenError(Exception):
+    """A call was rejected without being attempted because the breaker is open"""
+
+    def __init__(self, name: str):
+        super().__init__(f"{name} circuit is open")
+        self.name = name
+
+
+class CallOutcome:
+    """Handle yielded by ``CircuitBreaker.guard``; mark failures that did not raise"""
+
+    __slots__ = ("failed", "error")
+
+    def __init__(self):
+        self.failed = False
+        self.error: Optional[str] = None
+
+    def fail(self, error: str):
+        """Count this call as failed, e.g. an HTTP 5xx handled by the caller"""
+        self.failed = True
+        self.error = error
+
+
+class CircuitBreaker:
+    """
+    Closed / open / half-open breaker over a rolling window of recent calls
+
+    While closed, every call is let through and its outcome and duration are
+    recorded. Once the window holds at least ``min_calls`` calls and the share
+    of failures reaches ``error_rate`` (or the share of calls slower than
+    ``slow_call_seconds`` reaches ``slow_rate``), the breaker opens and rejects
+    calls for ``open_seconds``. It then lets ``half_open_calls`` probe calls
+    through: a healthy probe closes it again, a failed or slow one reopens it.
+
+    Thread-safe, so blocking clients running in worker threads can share it
+    with the event loop. A disabled breaker records metrics but never opens.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        slow_call_seconds: float,
+        window: float = 30,
+        min_calls: int = 10,
+        error_rate: float = 0.5,
+        slow_rate: float = 0.8,
+        open_seconds: float = 30,
+        half_open_calls: int = 1,
+        enabled: bool = True
+    ):
+        self.name = name
+        self.slow_call_seconds = slow_call_seconds
+        self.window = window
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_rate = slow_rate
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes = 0
+        # (finished at, failed, slow) per call in the window
+        self._calls: deque = deque()
+
+        # Metrics
+        self.total_calls = 0
+        self.total_failures = 0
+        self.total_slow = 0
+        self.rejected = 0
+        self.times_opened = 0
+        self.last_opened_at: Optional[datetime] = None
+        self.last_failure: Optional[str] = None
+        _breakers[name] = self
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state(time.monotonic())
+
+    def _current_state(self, now: float) -> str:
+        if self._state == OPEN and now - self._opened_at >= self.open_seconds:
+            self._state = HALF_OPEN
+            self._probes = 0
+        return self._state
+
+    def rejects(self) -> bool:
+        """
+        Whether a call would be rejected right now
+
+        Lets callers skip work that only matters if the call happens (e.g.
+        building a prompt); does not take a half-open probe slot.
+        """
+        with self._lock:
+            state = self._current_state(time.monotonic())
+            return state == OPEN or (state == HALF_OPEN and self._probes >= self.half_open_calls)
+
+    def _admit(self) -> Optional[bool]:
+        """False for a normal call, True for a half-open probe, None if rejected"""
+        with self._lock:
+            state = self._current_state(time.monotonic())
+            if state == CLOSED:
+                return False
+            if state == HALF_OPEN and self._probes < self.half_open_calls:
+                self._probes += 1
+                return True
+            self.rejected += 1
+            return None
+
+    def _record(self, probe: bool, failed: bool, seconds: float, error: Optional[str]):
+        now = time.monotonic()
+        slow = seconds >= self.slow_call_seconds
+        dependency_seconds.observe(seconds, dependency=self.name, outcome="error" if failed else "ok")
+        with self._lock:
+            self.total_calls += 1
+            self.total_failures += failed
+            self.total_slow += slow
+            if failed:
+                self.last_failure = error
+            state = self._current_state(now)
+
+            if probe:
+                self._probes = max(self._probes - 1, 0)
+                if state != HALF_OPEN:
+                    # Another probe already decided
+                    return
+                if failed or slow:
+                    self._trip(now, f"probe {'failed' if failed else 'slow'}")
+                else:
+                    self._state = CLOSED
+                    self._calls.clear()
+                    print(f"✓ {self.name} circuit closed")
+                return
+            if state != CLOSED:
+                # Started before the breaker opened
+                return
+
+            self._calls.append((now, failed, slow))
+            while self._calls and now - self._calls[0][0] > self.window:
+                self._calls.popleft()
+            calls = len(self._calls)
+            if self.enabled and calls >= self.min_calls:
+                failures = sum(1 for _, f, _ in self._calls if f)
+                slow_calls = sum(1 for _, _, s in self._calls if s)
+                if failures / calls >= self.error_rate:
+                    self._trip(now, f"{failures}/{calls} calls failed")
+                elif slow_calls / calls >= self.slow_rate:
+                    self._trip(now, f"{slow_calls}/{calls} calls slower than {self.slow_call_seconds:g}s")
+
+    def _trip(self, now: float, reason: str):
+        self._state = OPEN
+        self._opened_at = now
+        self._calls.clear()
+        self.times_opened += 1
+        self.last_opened_at = datetime.utcnow()
+        print(f"⚠️  {self.name} circuit opened for {self.open_seconds:g}s: {reason} (last error: {self.last_failure})")
+
+    def _release(self):
+        """Give back the probe slot of a call that was cancelled"""
+        with self._lock:
+            self._probes = max(self._probes - 1, 0)
+
+    @contextmanager
+    def guard(self):
+        """
+        Run one call under the breaker
+
+        Raises CircuitOpenError on entry while the breaker is open. An
+        exception raised inside the block counts as a failure, as does a
+        call marked with ``outcome.fail()``; cancellation is not counted.
+
+        Yields:
+            CallOutcome for the call
+        """
+        probe = self._admit()
+        if probe is None:
+            raise CircuitOpenError(self.name)
+        outcome = CallOutcome()
+        start = time.monotonic()
+        try:
+            yield outcome
+        except Exception as e:
+            self._record(probe, True, time.monotonic() - start, f"{type(e).__name__}: {e}")
+            raise
+        except BaseException:
+            if probe:
+                self._release()
+            raise
+        else:
+            error = outcome.error if outcome.failed else None
+            self._record(probe, outcome.failed, time.monotonic() - start, error)
+
+    def stats(self) -> Dict:
+        """Snapshot of breaker metrics"""
+        with self._lock:
+            state = self._current_state(time.monotonic())
+            calls = len(self._calls)
+            failures = sum(1 for _, f, _ in self._calls if f)
+            slow_calls = sum(1 for _, _, s in self._calls if s)
+            return {
+                "state": state,
+                "enabled": self.enabled,
+                "window_calls": calls,
+                "window_error_rate": round(failures / calls, 3) if calls else 0.0,
+                "window_slow_rate": round(slow_calls / calls, 3) if calls else 0.0,
+                "calls": self.total_calls,
+                "failures": self.total_failures,
+                "slow_calls": self.total_slow,
+                "rejected": self.rejected,
+                "times_opened": self.times_opened,
+                "last_opened_at": self.last_opened_at.isoformat() if self.last_opened_at else None,
+                "last_failure": self.last_failure
+            }
+
+
+def create_breaker(name: str, slow_call_seconds: float) -> CircuitBreaker:
+    """Breaker for one dependency with the configured thresholds"""
+    return CircuitBreaker(
+        name,
+        slow_call_seconds=slow_call_seconds,
+        window=CIRCUIT_BREAKER_WINDOW_SECONDS,
+        min_calls=CIRCUIT_BREAKER_MIN_CALLS,
+        error_rate=CIRCUIT_BREAKER_ERROR_RATE,
+        slow_rate=CIRCUIT_BREAKER_SLOW_RATE,
+        open_seconds=CIRCUIT_BREAKER_OPEN_SECONDS,
+        half_open_calls=CIRCUIT_BREAKER_HALF_OPEN_CALLS,
+        enabled=CIRCUIT_BREAKER_ENABLED
+    )
+
+
+def get_breaker_stats() -> Dict:
+    """Metrics of every breaker, by dependency name"""
+    return {name: breaker.stats() for name, breaker in _breakers.items()}
+
+
+# 0 closed, 1 half open, 2 open
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+registry.register(Gauge(
+    "circuit_breaker_state",
+    "Breaker state per dependency (0 closed, 1 half open, 2 open)",
+    ["dependency"],
+    callback=lambda: [({"dependency": name}, _STATE_VALUES[b.state]) for name, b in _breakers.items()]
+))
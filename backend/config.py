@@ -20,11 +20,153 @@ print(f"✓ Loaded GOOGLE_API_KEY: {GOOGLE_API_KEY[:10]}...")
 API_HOST = os.getenv("API_HOST", "0.0.0.0")
 API_PORT = int(os.getenv("API_PORT", "8000"))
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./chat_sessions.db")
+# Async connection pool (per worker) and SQLite lock wait in seconds
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "20"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_BUSY_TIMEOUT = float(os.getenv("DB_BUSY_TIMEOUT", "5"))
+
+# Group-commit turn writes on a background writer (single-process deployments only)
+# WRITE_BEHIND_DURABILITY: "commit" answers after the batch is committed,
+# "async" answers once the writes are queued (a crash loses the unflushed batch)
+WRITE_BEHIND_ENABLED = os.getenv("WRITE_BEHIND_ENABLED", "false").lower() == "true"
+WRITE_BEHIND_BATCH_SIZE = int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "64"))
+WRITE_BEHIND_FLUSH_MS = float(os.getenv("WRITE_BEHIND_FLUSH_MS", "10"))
+WRITE_BEHIND_MAX_PENDING = int(os.getenv("WRITE_BEHIND_MAX_PENDING", "10000"))
+WRITE_BEHIND_DURABILITY = os.getenv("WRITE_BEHIND_DURABILITY", "commit")
 GOOGLE_CSE_ID = os.getenv("GOOGLE_CSE_ID", "")
 HUBSPOT_API_KEY = os.getenv("HUBSPOT_API_KEY", "")
+HUBSPOT_BASE_URL = os.getenv("HUBSPOT_BASE_URL", "https://api.hubapi.com")
+HUBSPOT_POOL_SIZE = int(os.getenv("HUBSPOT_POOL_SIZE", "10"))
+HUBSPOT_CONNECT_TIMEOUT = float(os.getenv("HUBSPOT_CONNECT_TIMEOUT", "3"))
+HUBSPOT_TIMEOUT = float(os.getenv("HUBSPOT_TIMEOUT", "10"))
+HUBSPOT_CONTACT_CACHE_SIZE = int(os.getenv("HUBSPOT_CONTACT_CACHE_SIZE", "10000"))
+HUBSPOT_CONTACT_CACHE_TTL = int(os.getenv("HUBSPOT_CONTACT_CACHE_TTL", "86400"))  # 24 hours
+
+# Lead outbox: completed leads are stored with the turn and sent to HubSpot by
+# a background worker, up to BATCH_SIZE (HubSpot allows 100) per batch upsert.
+# Failed sends are retried with exponential backoff (RETRY_BASE * 2^n seconds,
+# capped at RETRY_MAX) up to MAX_ATTEMPTS times; a send in progress is hidden
+# from other workers for LEASE_SECONDS
+LEAD_OUTBOX_POLL_INTERVAL = float(os.getenv("LEAD_OUTBOX_POLL_INTERVAL", "5"))
+LEAD_OUTBOX_BATCH_SIZE = int(os.getenv("LEAD_OUTBOX_BATCH_SIZE", "100"))
+LEAD_OUTBOX_MAX_ATTEMPTS = int(os.getenv("LEAD_OUTBOX_MAX_ATTEMPTS", "8"))
+LEAD_OUTBOX_RETRY_BASE_SECONDS = float(os.getenv("LEAD_OUTBOX_RETRY_BASE_SECONDS", "30"))
+LEAD_OUTBOX_RETRY_MAX_SECONDS = float(os.getenv("LEAD_OUTBOX_RETRY_MAX_SECONDS", "3600"))
+LEAD_OUTBOX_LEASE_SECONDS = float(os.getenv("LEAD_OUTBOX_LEASE_SECONDS", "300"))
 SESSION_TIMEOUT = int(os.getenv("SESSION_TIMEOUT", "3600"))
 MAX_HISTORY_LENGTH = int(os.getenv("MAX_HISTORY_LENGTH", "6"))
+
+# Answer messages intent_router marks off-topic with a canned redirect instead
+# of Gemini, and hold questions asked in place of a name until the lead is done
+OFF_TOPIC_REDIRECT_ENABLED = os.getenv("OFF_TOPIC_REDIRECT_ENABLED", "false").lower() == "true"
+
+# Input-token budget of a Gemini prompt (system instruction, history, website
+# and search context, question; 0 = unlimited). Context and older history are
+# trimmed to fit. User messages longer than PROMPT_MAX_MESSAGE_TOKENS are cut.
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "6000"))
+PROMPT_MAX_MESSAGE_TOKENS = int(os.getenv("PROMPT_MAX_MESSAGE_TOKENS", "1000"))
+
+# Rolling summary of messages that fell out of the MAX_HISTORY_LENGTH window,
+# updated by background workers once SUMMARY_MIN_MESSAGES have accumulated
+# (at most SUMMARY_MAX_FOLD_MESSAGES per Gemini call) and sent with each prompt
+SUMMARY_ENABLED = os.getenv("SUMMARY_ENABLED", "false").lower() == "true"
+SUMMARY_MIN_MESSAGES = int(os.getenv("SUMMARY_MIN_MESSAGES", "4"))
+SUMMARY_MAX_FOLD_MESSAGES = int(os.getenv("SUMMARY_MAX_FOLD_MESSAGES", "20"))
+SUMMARY_MAX_TOKENS = int(os.getenv("SUMMARY_MAX_TOKENS", "300"))
+SUMMARY_WORKERS = int(os.getenv("SUMMARY_WORKERS", "4"))
+SUMMARY_MAX_PENDING = int(os.getenv("SUMMARY_MAX_PENDING", "1000"))
+
+# Background deletion of sessions idle for longer than SESSION_TIMEOUT seconds
+# SESSION_SWEEP_VACUUM: "none", "incremental" (PRAGMA incremental_vacuum of up
+# to SESSION_SWEEP_VACUUM_PAGES pages, 0 = all) or "full" (VACUUM, blocks writers)
+SESSION_SWEEP_ENABLED = os.getenv("SESSION_SWEEP_ENABLED", "false").lower() == "true"
+SESSION_SWEEP_INTERVAL = float(os.getenv("SESSION_SWEEP_INTERVAL", "300"))
+SESSION_SWEEP_BATCH_SIZE = int(os.getenv("SESSION_SWEEP_BATCH_SIZE", "200"))
+SESSION_SWEEP_BATCH_PAUSE_MS = float(os.getenv("SESSION_SWEEP_BATCH_PAUSE_MS", "50"))
+SESSION_SWEEP_VACUUM = os.getenv("SESSION_SWEEP_VACUUM", "none")
+SESSION_SWEEP_VACUUM_PAGES = int(os.getenv("SESSION_SWEEP_VACUUM_PAGES", "1000"))
+
+# Move finished (lead_complete / general_qa) sessions idle for ARCHIVE_IDLE_SECONDS
+# into compressed NDJSON segment files. ARCHIVE_COMPRESSION: "gzip" or "zstd"
+# (needs the zstandard package)
+ARCHIVE_ENABLED = os.getenv("ARCHIVE_ENABLED", "false").lower() == "true"
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", os.path.join(os.path.dirname(__file__), "archive"))
+ARCHIVE_IDLE_SECONDS = int(os.getenv("ARCHIVE_IDLE_SECONDS", "1800"))
+ARCHIVE_INTERVAL = float(os.getenv("ARCHIVE_INTERVAL", "300"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "100"))
+ARCHIVE_COMPRESSION = os.getenv("ARCHIVE_COMPRESSION", "gzip")
+ARCHIVE_SEGMENT_MAX_MB = int(os.getenv("ARCHIVE_SEGMENT_MAX_MB", "64"))
+
+# Optional in-memory ring buffer of recent turns (single-process deployments
+# only; turned off with SHARED_STATE_BACKEND=redis)
+HISTORY_CACHE_ENABLED = os.getenv("HISTORY_CACHE_ENABLED", "false").lower() == "true"
+HISTORY_CACHE_SESSIONS = int(os.getenv("HISTORY_CACHE_SESSIONS", "1000"))
+
+# Optional cache of live conversation states: an in-memory LRU, or entries
+# expiring after SESSION_TIMEOUT with SHARED_STATE_BACKEND=redis
+STATE_CACHE_ENABLED = os.getenv("STATE_CACHE_ENABLED", "false").lower() == "true"
+STATE_CACHE_SESSIONS = int(os.getenv("STATE_CACHE_SESSIONS", "1000"))
 RATE_LIMIT_PER_MINUTE = int(os.getenv("RATE_LIMIT_PER_MINUTE", "10"))
+# slowapi storage (empty = memory://, or SHARED_STATE_URL with the redis backend)
+RATE_LIMIT_STORAGE_URI = os.getenv("RATE_LIMIT_STORAGE_URI", "")
+
+# Where state that several worker processes or nodes must agree on lives:
+# "memory" keeps rate limit counters, the search cache and the state cache in
+# each process; "redis" keeps them on the server at SHARED_STATE_URL
+SHARED_STATE_BACKEND = os.getenv("SHARED_STATE_BACKEND", "memory").lower()
+if SHARED_STATE_BACKEND not in ("memory", "redis"):
+    raise ValueError(f"SHARED_STATE_BACKEND must be memory or redis, not {SHARED_STATE_BACKEND}")
+SHARED_STATE_URL = os.getenv("SHARED_STATE_URL", "redis://localhost:6379/0")
+SHARED_STATE_PREFIX = os.getenv("SHARED_STATE_PREFIX", "aal:")
+SHARED_STATE_TIMEOUT = float(os.getenv("SHARED_STATE_TIMEOUT", "0.5"))
+SHARED_STATE_POOL_SIZE = int(os.getenv("SHARED_STATE_POOL_SIZE", "50"))
+
+# Print per-stage turn timings (they are always sent in the Server-Timing header)
+LOG_STAGE_TIMINGS = os.getenv("LOG_STAGE_TIMINGS", "false").lower() == "true"
+
+# Gemini call pool - max concurrent calls per worker and per-call deadline (seconds)
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "256"))
+GEMINI_TIMEOUT = float(os.getenv("GEMINI_TIMEOUT", "30"))
+# host:port of a plaintext gRPC Gemini endpoint, e.g. the local stand-in (empty = Google)
+GEMINI_API_ENDPOINT = os.getenv("GEMINI_API_ENDPOINT", "")
+
+# Answer cache for repeated questions (RESPONSE_CACHE_SIZE=0 disables it)
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "512"))
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+RESPONSE_CACHE_MAX_CHARS = int(os.getenv("RESPONSE_CACHE_MAX_CHARS", "8000"))
+
+# Google Custom Search client
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "1000"))
+SEARCH_CACHE_TTL = int(os.getenv("SEARCH_CACHE_TTL", "1800"))
+SEARCH_NEGATIVE_CACHE_TTL = int(os.getenv("SEARCH_NEGATIVE_CACHE_TTL", "60"))
+SEARCH_TIMEOUT = float(os.getenv("SEARCH_TIMEOUT", "5"))
+SEARCH_MAX_CONNECTIONS = int(os.getenv("SEARCH_MAX_CONNECTIONS", "20"))
+GOOGLE_SEARCH_URL = os.getenv("GOOGLE_SEARCH_URL", "https://www.googleapis.com/customsearch/v1")
+
+# Circuit breakers around Gemini, Google CSE and HubSpot: open when the calls in
+# the last WINDOW seconds (at least MIN_CALLS) fail at ERROR_RATE or are slow at
+# SLOW_RATE, reject calls for OPEN_SECONDS, then let HALF_OPEN_CALLS probes through
+CIRCUIT_BREAKER_ENABLED = os.getenv("CIRCUIT_BREAKER_ENABLED", "true").lower() == "true"
+CIRCUIT_BREAKER_WINDOW_SECONDS = float(os.getenv("CIRCUIT_BREAKER_WINDOW_SECONDS", "30"))
+CIRCUIT_BREAKER_MIN_CALLS = int(os.getenv("CIRCUIT_BREAKER_MIN_CALLS", "10"))
+CIRCUIT_BREAKER_ERROR_RATE = float(os.getenv("CIRCUIT_BREAKER_ERROR_RATE", "0.5"))
+CIRCUIT_BREAKER_SLOW_RATE = float(os.getenv("CIRCUIT_BREAKER_SLOW_RATE", "0.8"))
+CIRCUIT_BREAKER_OPEN_SECONDS = float(os.getenv("CIRCUIT_BREAKER_OPEN_SECONDS", "30"))
+CIRCUIT_BREAKER_HALF_OPEN_CALLS = int(os.getenv("CIRCUIT_BREAKER_HALF_OPEN_CALLS", "1"))
+# A call at least this long (seconds) counts as slow
+GEMINI_SLOW_CALL_SECONDS = float(os.getenv("GEMINI_SLOW_CALL_SECONDS", "15"))
+SEARCH_SLOW_CALL_SECONDS = float(os.getenv("SEARCH_SLOW_CALL_SECONDS", "3"))
+HUBSPOT_SLOW_CALL_SECONDS = float(os.getenv("HUBSPOT_SLOW_CALL_SECONDS", "5"))
+SHARED_STATE_SLOW_CALL_SECONDS = float(os.getenv("SHARED_STATE_SLOW_CALL_SECONDS", "0.1"))
+
+# Local knowledge base built by build_index.py
+RAG_INDEX_DIR = os.getenv("RAG_INDEX_DIR", os.path.join(os.path.dirname(__file__), "rag_index"))
+RAG_EMBED_MODEL = os.getenv("RAG_EMBED_MODEL", "hashing")
+RAG_TOP_K = int(os.getenv("RAG_TOP_K", "3"))
+RAG_MIN_SCORE = float(os.getenv("RAG_MIN_SCORE", "0.1"))
+# Skip Google search when the best local passage scores at least this much
+RAG_SKIP_SEARCH_SCORE = float(os.getenv("RAG_SKIP_SEARCH_SCORE", "0.2"))
 
 # CORS Origins - default includes localhost and allows * for development
 # For production, set CORS_ORIGINS environment variable with specific domains
@@ -4,7 +4,9 @@ Tracks product selection, lead capture progress, and conversation stage
 """
 from typing import Dict, Optional, List
 from enum import Enum
+import json
 import re
+import struct
 
 
 class ConversationStage(str, Enum):
@@ -19,9 +21,29 @@ class ConversationStage(str, Enum):
     GENERAL_QA = "general_qa"  # Normal Q&A mode
 
 
+# Binary state layout, version 2 (little endian):
+#   header  B version | B stage index | B attempt count | 7 x I string lengths
+#           | Q id of the last message folded into the summary
+#   strings UTF-8 bytes of _STRING_FIELDS in order (length 0xFFFFFFFF = None)
+#   attempts per entry: B key length | key bytes | H count
+# Version 1 had no summary: 6 string lengths and no message id.
+STATE_FORMAT_VERSION = 2
+_STAGES = tuple(ConversationStage)
+# Keyed by members and plain values: states decoded from JSON hold strings
+_STAGE_INDEX = {key: index for index, stage in enumerate(_STAGES) for key in (stage, stage.value)}
+_STRING_FIELDS = ("product_type", "name", "whatsapp_number", "email", "project_goal", "hubspot_contact_id", "summary")
+_HEADER_V1 = struct.Struct("<BBB6I")
+_HEADER_V2 = struct.Struct("<BBB7IQ")
+_ATTEMPT_COUNT = struct.Struct("<H")
+_NO_STRING = 0xFFFFFFFF
+
+
 class ConversationState:
     """Manages conversation state and lead collection progress"""
     
+    # Fixed attribute layout: no per-instance __dict__
+    __slots__ = ("stage", "attempts", "summarized_through") + _STRING_FIELDS
+    
     # Product/Service options
     PRODUCTS = [
         {"id": "mobile_app", "label": "Mobile App Development"},
@@ -34,19 +56,24 @@ class ConversationState:
     
     def __init__(self, session_data: Dict = None):
         """Initialize conversation state from session data"""
-        self.data = session_data or {}
+        data = session_data or {}
         
         # Core state fields
-        self.stage = self.data.get("stage", ConversationStage.INITIAL)
-        self.product_type = self.data.get("product_type")
-        self.name = self.data.get("name")
-        self.whatsapp_number = self.data.get("whatsapp_number")
-        self.email = self.data.get("email")
-        self.project_goal = self.data.get("project_goal")
+        self.stage = data.get("stage", ConversationStage.INITIAL)
+        self.product_type = data.get("product_type")
+        self.name = data.get("name")
+        self.whatsapp_number = data.get("whatsapp_number")
+        self.email = data.get("email")
+        self.project_goal = data.get("project_goal")
         
         # Metadata
-        self.attempts = self.data.get("attempts", {})  # Track validation attempts
-        self.hubspot_contact_id = self.data.get("hubspot_contact_id")
+        self.attempts = data.get("attempts", {})  # Track validation attempts
+        self.hubspot_contact_id = data.get("hubspot_contact_id")
+        
+        # Rolling summary of the messages older than the history window,
+        # up to and including message id summarized_through
+        self.summary = data.get("summary")
+        self.summarized_through = data.get("summarized_through", 0)
     
     def to_dict(self) -> Dict:
         """Convert state to dictionary for storage"""
@@ -58,9 +85,68 @@ class ConversationState:
             "email": self.email,
             "project_goal": self.project_goal,
             "attempts": self.attempts,
-            "hubspot_contact_id": self.hubspot_contact_id
+            "hubspot_contact_id": self.hubspot_contact_id,
+            "summary": self.summary,
+            "summarized_through": self.summarized_through
         }
     
+    def to_slots(self) -> Dict:
+        """State returned to the widget: to_dict() without the internal summary"""
+        slots = self.to_dict()
+        del slots["summary"], slots["summarized_through"]
+        return slots
+    
+    def to_bytes(self) -> bytes:
+        """Encode state in the current binary format for storage"""
+        contact_id = self.hubspot_contact_id
+        encoded = [
+            None if value is None else value.encode("utf-8")
+            for value in (
+                self.product_type, self.name, self.whatsapp_number, self.email, self.project_goal,
+                None if contact_id is None else str(contact_id), self.summary
+            )
+        ]
+        parts = [_HEADER_V2.pack(
+            STATE_FORMAT_VERSION,
+            _STAGE_INDEX[self.stage],
+            len(self.attempts),
+            *[_NO_STRING if value is None else len(value) for value in encoded],
+            self.summarized_through
+        )]
+        parts.extend([value for value in encoded if value])
+        
+        for field, count in self.attempts.items():
+            key = field.encode("utf-8")
+            parts.append(bytes((len(key),)))
+            parts.append(key)
+            parts.append(_ATTEMPT_COUNT.pack(min(count, 0xFFFF)))
+        
+        return b"".join(parts)
+    
+    @classmethod
+    def from_bytes(cls, blob: bytes) -> "ConversationState":
+        """Decode state written by to_bytes (any supported format version)"""
+        decoder = _DECODERS.get(blob[0]) if blob else None
+        if decoder is None:
+            raise ValueError(f"Unsupported conversation state format: {blob[:1]!r}")
+        return decoder(cls, blob)
+    
+    @classmethod
+    def from_stored(cls, blob: Optional[bytes], text: Optional[str]) -> "ConversationState":
+        """
+        Load state from a chat_sessions row
+        
+        Args:
+            blob: conversation_state_bin column (binary format)
+            text: conversation_state column (legacy JSON)
+        
+        Returns:
+            ConversationState (empty for a new session)
+        """
+        if blob:
+            return cls.from_bytes(blob)
+        return cls(json.loads(text or "{}"))
+    
     def update(self, **kwargs):
         """Update state fields"""
         for key, value in kwargs.items():
@@ -158,3 +244,50 @@ class ConversationState:
             ConversationStage.COLLECTING_EMAIL,
             ConversationStage.COLLECTING_PROJECT_GOAL
         ]
+
+
+def _read_body(blob: bytes, offset: int, lengths, attempt_count: int):
+    """Decode the strings and attempts that follow a header"""
+    values = []
+    for length in lengths:
+        if length == _NO_STRING:
+            values.append(None)
+        else:
+            values.append(blob[offset:offset + length].decode("utf-8"))
+            offset += length
+    
+    attempts = {}
+    for _ in range(attempt_count):
+        key_length = blob[offset]
+        key = blob[offset + 1:offset + 1 + key_length].decode("utf-8")
+        offset += 1 + key_length
+        attempts[key] = _ATTEMPT_COUNT.unpack_from(blob, offset)[0]
+        offset += _ATTEMPT_COUNT.size
+    return values, attempts
+
+
+def _decode_v1(cls, blob: bytes) -> ConversationState:
+    _, stage, attempt_count, *lengths = _HEADER_V1.unpack_from(blob)
+    state = cls.__new__(cls)
+    state.stage = _STAGES[stage]
+    values, state.attempts = _read_body(blob, _HEADER_V1.size, lengths, attempt_count)
+    (state.product_type, state.name, state.whatsapp_number, state.email,
+     state.project_goal, state.hubspot_contact_id) = values
+    state.summary = None
+    state.summarized_through = 0
+    return state
+
+
+def _decode_v2(cls, blob: bytes) -> ConversationState:
+    _, stage, attempt_count, *lengths, summarized_through = _HEADER_V2.unpack_from(blob)
+    state = cls.__new__(cls)
+    state.stage = _STAGES[stage]
+    values, state.attempts = _read_body(blob, _HEADER_V2.size, lengths, attempt_count)
+    (state.product_type, state.name, state.whatsapp_number, state.email,
+     state.project_goal, state.hubspot_contact_id, state.summary) = values
+    state.summarized_through = summarized_through
+    return state
+
+
+# Binary format version -> decoder
+_DECODERS = {1: _decode_v1, 2: _decode_v2}
@@ -1,40 +1,149 @@
 """
 Database models for chat sessions
 """
-from sqlalchemy import Column, Integer, String, Text, DateTime, create_engine
+from sqlalchemy import Column, Integer, String, Text, DateTime, LargeBinary, Index, create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from datetime import datetime
-from config import DATABASE_URL
+from config import DATABASE_URL, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_BUSY_TIMEOUT
+from migrations import run_migrations
 
 Base = declarative_base()
 
 class ChatSession(Base):
     __tablename__ = "chat_sessions"
     
-    id = Column(String, primary_key=True, index=True)
+    id = Column(String, primary_key=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     ip_address = Column(String, nullable=True)
-    conversation_state = Column(Text, nullable=True)  # JSON string of conversation state
+    conversation_state = Column(Text, nullable=True)  # Legacy JSON state, read only when the binary state is empty
+    conversation_state_bin = Column(LargeBinary, nullable=True)  # ConversationState.to_bytes()
+    # Maintained in the same transaction as the messages they count
+    message_count = Column(Integer, nullable=False, default=0, server_default="0")
+    last_message_at = Column(DateTime, nullable=True)
+    # Gemini token usage of the session, as reported by the API
+    prompt_tokens = Column(Integer, nullable=False, default=0, server_default="0")
+    output_tokens = Column(Integer, nullable=False, default=0, server_default="0")
+    
+    __table_args__ = (
+        # Lets the session sweeper find expired sessions without a table scan
+        Index("ix_chat_sessions_updated_at", "updated_at"),
+    )
 
 class ChatMessage(Base):
     __tablename__ = "chat_messages"
     
-    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
-    session_id = Column(String, index=True, nullable=False)
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    session_id = Column(String, nullable=False)
     role = Column(String, nullable=False)  # 'user' or 'assistant'
     content = Column(Text, nullable=False)
     sources = Column(Text, nullable=True)  # JSON string of sources
     timestamp = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        # Serves the per-turn "last N messages of a session" query (already
+        # ordered: SQLite appends the rowid id to every index entry) and any
+        # other lookup by session_id
+        Index("ix_chat_messages_session_timestamp", "session_id", "timestamp"),
+    )
+
+class ArchivedSession(Base):
+    """Where an archived session's record lives in the segment files"""
+    __tablename__ = "archived_sessions"
+    
+    session_id = Column(String, primary_key=True)
+    segment = Column(String, nullable=False)  # Segment file name
+    offset = Column(Integer, nullable=False)  # Byte offset of the compressed member
+    length = Column(Integer, nullable=False)  # Compressed member length in bytes
+    created_at = Column(DateTime, nullable=True)
+    last_message_at = Column(DateTime, nullable=True)
+    message_count = Column(Integer, nullable=False, default=0)
+    archived_at = Column(DateTime, default=datetime.utcnow)
+
+class LeadOutbox(Base):
+    """HubSpot submissions, written with the turn and delivered by the outbox worker"""
+    __tablename__ = "lead_outbox"
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    session_id = Column(String, nullable=False)
+    payload = Column(Text, nullable=False)  # JSON keyword arguments of upsert_lead
+    status = Column(String, nullable=False, default="queued")  # 'queued', 'success' or 'failed'
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow)
+    contact_id = Column(String, nullable=True)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        # The worker's "due submissions" scan
+        Index("ix_lead_outbox_status_next_attempt", "status", "next_attempt_at"),
+        # Lead status polling
+        Index("ix_lead_outbox_session_id", "session_id"),
+    )
 
 # Create engine and tables
 engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+def _async_url(url: str) -> str:
+    """Swap the sync driver for its asyncio counterpart (sqlite -> aiosqlite)"""
+    parsed = make_url(url)
+    if parsed.get_backend_name() == "sqlite":
+        return str(parsed.set(drivername="sqlite+aiosqlite"))
+    return url
+
+ASYNC_DATABASE_URL = _async_url(DATABASE_URL)
+_is_sqlite = make_url(DATABASE_URL).get_backend_name() == "sqlite"
+_is_memory = _is_sqlite and make_url(DATABASE_URL).database in (None, "", ":memory:")
+# File-backed SQLite: WAL and VACUUM apply
+SQLITE_FILE_DB = _is_sqlite and not _is_memory
+
+# Async engine used by the API endpoints. aiosqlite defaults to NullPool
+# (a new connection per checkout), so the queue pool is chosen explicitly;
+# in-memory SQLite needs its single shared connection and keeps the default.
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    connect_args={"timeout": DB_BUSY_TIMEOUT} if _is_sqlite else {},
+    **({} if _is_memory else {
+        "poolclass": AsyncAdaptedQueuePool,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+    })
+)
+AsyncSessionLocal = async_sessionmaker(
+    async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    # Rows stay readable after commit without an (implicit, blocking) refresh
+    expire_on_commit=False
+)
+
+if SQLITE_FILE_DB:
+    @event.listens_for(async_engine.sync_engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        """WAL lets readers proceed while a turn is committing"""
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.close()
+
 def init_db():
     """Initialize database tables"""
     Base.metadata.create_all(bind=engine)
+    
+    # create_all skips tables that already exist, so add indexes introduced
+    # after the table was first created
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+    
+    run_migrations(engine)
 
 def get_db():
     """Get database session"""
@@ -43,3 +152,8 @@ def get_db():
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    """Get async database session"""
+    async with AsyncSessionLocal() as db:
+        yield db
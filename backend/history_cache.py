@@ -0,0 +1,71 @@
+"""
+In-memory ring buffer of recent chat turns per session
+Lets a turn build its Gemini history without touching the database
+"""
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Optional
+from config import HISTORY_CACHE_ENABLED, HISTORY_CACHE_SESSIONS, MAX_HISTORY_LENGTH
+from shared_state import SHARED
+
+
+class HistoryCache:
+    """
+    Keeps the last ``window`` messages of up to ``max_sessions`` sessions
+    
+    Entries are filled from the database on a miss and appended to after
+    every committed turn, so they always mirror the tail of chat_messages.
+    Only valid while a single process writes a session's messages.
+    """
+    
+    def __init__(self, window: int, max_sessions: int):
+        self.window = window
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[str, Deque[Dict[str, str]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, session_id: str) -> Optional[List[Dict[str, str]]]:
+        """Return the cached window (oldest first) or None on a miss"""
+        buffer = self._sessions.get(session_id)
+        if buffer is None:
+            self.misses += 1
+            return None
+        self._sessions.move_to_end(session_id)
+        self.hits += 1
+        return list(buffer)
+    
+    def fill(self, session_id: str, messages: List[Dict[str, str]]):
+        """Seed a session's buffer from a database read"""
+        self._sessions[session_id] = deque(messages, maxlen=self.window)
+        self._sessions.move_to_end(session_id)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+    
+    def append(self, session_id: str, role: str, content: str):
+        """Record a committed message; sessions not in the cache are ignored"""
+        buffer = self._sessions.get(session_id)
+        if buffer is not None:
+            buffer.append({"role": role, "content": content})
+    
+    def invalidate(self, session_id: str):
+        """Drop a session, e.g. after it was deleted"""
+        self._sessions.pop(session_id, None)
+    
+    def stats(self) -> Dict:
+        """Snapshot of cache metrics"""
+        return {
+            "sessions": len(self._sessions),
+            "max_sessions": self.max_sessions,
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+
+# Global cache instance (None when disabled). Workers sharing state each see
+# only their own turns, so there the window is always read from the database.
+if HISTORY_CACHE_ENABLED and SHARED:
+    print("⚠️  HISTORY_CACHE_ENABLED is ignored with a shared state backend")
+history_cache = (
+    HistoryCache(MAX_HISTORY_LENGTH, HISTORY_CACHE_SESSIONS)
+    if HISTORY_CACHE_ENABLED and not SHARED else None
+)
@@ -1,33 +1,147 @@
 """
 HubSpot CRM Integration
 Handles contact search, create, and update operations with retry logic
+Leads are upserted in batches: one combined search, then batch create/update
 """
 import os
+import re
+import threading
 import time
 import requests
-from typing import Dict, Optional, Tuple
-from config import HUBSPOT_API_KEY
+from cachetools import TTLCache
+from requests.adapters import HTTPAdapter
+from typing import Dict, Iterable, List, Optional, Tuple
+from config import (
+    HUBSPOT_API_KEY, HUBSPOT_BASE_URL, HUBSPOT_POOL_SIZE, HUBSPOT_CONNECT_TIMEOUT,
+    HUBSPOT_TIMEOUT, HUBSPOT_CONTACT_CACHE_SIZE, HUBSPOT_CONTACT_CACHE_TTL, HUBSPOT_SLOW_CALL_SECONDS
+)
+from circuit_breaker import CircuitOpenError, create_breaker
 
 
 class HubSpotClient:
     """Client for HubSpot CRM API operations"""
     
-    BASE_URL = "https://api.hubapi.com"
+    # Most inputs a batch endpoint (and values an IN filter) accepts
+    BATCH_LIMIT = 100
+    # Batch rejections caused by the inputs themselves; only these are worth
+    # resending one contact at a time
+    SPLIT_STATUSES = (400, 409)
     
-    def __init__(self, api_key: str = None):
+    def __init__(
+        self,
+        api_key: str = None,
+        base_url: str = None,
+        pool_size: int = None,
+        connect_timeout: float = None,
+        timeout: float = None,
+        contact_cache_size: int = None,
+        contact_cache_ttl: int = None
+    ):
         """Initialize HubSpot client"""
         self.api_key = api_key or HUBSPOT_API_KEY
         if not self.api_key:
             raise ValueError("HubSpot API key is required")
         
+        self.base_url = (base_url or HUBSPOT_BASE_URL).rstrip("/")
         self.headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
         }
+        
+        # Keep-alive connections, reused across calls instead of a new
+        # TCP+TLS handshake per request
+        self.pool_size = pool_size or HUBSPOT_POOL_SIZE
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.timeout = (connect_timeout or HUBSPOT_CONNECT_TIMEOUT, timeout or HUBSPOT_TIMEOUT)
+        # Fails requests at once while HubSpot keeps erroring or timing out
+        self.breaker = create_breaker("hubspot", HUBSPOT_SLOW_CALL_SECONDS)
+        
+        # Normalized email/phone -> contact id, so known contacts skip the search
+        self.contact_ids = TTLCache(
+            maxsize=contact_cache_size or HUBSPOT_CONTACT_CACHE_SIZE,
+            ttl=contact_cache_ttl or HUBSPOT_CONTACT_CACHE_TTL
+        )
+        # The outbox worker calls from a thread, turns from the event loop
+        self._cache_lock = threading.Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
+    
+    def close(self):
+        """Close pooled connections (called on application shutdown)"""
+        self.session.close()
+    
+    def _request(self, method: str, url: str, payload: Dict) -> requests.Response:
+        """
+        Send one request under the circuit breaker
+        
+        Connection errors, timeouts, 429 and 5xx responses count against
+        HubSpot; other 4xx are the request's own fault.
+        
+        Raises:
+            CircuitOpenError: the breaker is open, nothing was sent
+            requests.exceptions.RequestException: the request failed
+        """
+        with self.breaker.guard() as call:
+            response = self.session.request(method, url, json=payload, timeout=self.timeout)
+            if response.status_code == 429 or response.status_code >= 500:
+                call.fail(f"HTTP {response.status_code}")
+            return response
+    
+    @staticmethod
+    def _contact_keys(email: Optional[str], phone: Optional[str]) -> List[str]:
+        """Cache keys of a contact, email first"""
+        keys = []
+        if email and email.strip():
+            keys.append(f"email:{email.strip().lower()}")
+        digits = re.sub(r"\D", "", phone or "")
+        if digits:
+            keys.append(f"phone:{digits}")
+        return keys
+    
+    def remember_contact(self, contact_id: str, email: Optional[str] = None, phone: Optional[str] = None):
+        """Record the contact id of an email and/or phone number"""
+        if not contact_id:
+            return
+        with self._cache_lock:
+            for key in self._contact_keys(email, phone):
+                self.contact_ids[key] = str(contact_id)
+    
+    def cached_contact_id(self, email: Optional[str] = None, phone: Optional[str] = None) -> Optional[str]:
+        """Known contact id of an email (preferred) or phone number"""
+        with self._cache_lock:
+            for key in self._contact_keys(email, phone):
+                contact_id = self.contact_ids.get(key)
+                if contact_id:
+                    self.cache_hits += 1
+                    return contact_id
+            self.cache_misses += 1
+            return None
+    
+    def forget_contact(self, email: Optional[str] = None, phone: Optional[str] = None):
+        """Drop cached ids of an email and phone number (e.g. contact deleted)"""
+        with self._cache_lock:
+            for key in self._contact_keys(email, phone):
+                self.contact_ids.pop(key, None)
+    
+    def stats(self) -> Dict:
+        """Snapshot of contact cache metrics"""
+        lookups = self.cache_hits + self.cache_misses
+        return {
+            "contact_cache_size": len(self.contact_ids),
+            "contact_cache_hits": self.cache_hits,
+            "contact_cache_misses": self.cache_misses,
+            "contact_cache_hit_ratio": round(self.cache_hits / lookups, 3) if lookups else 0.0,
+            "pool_size": self.pool_size,
+            "breaker": self.breaker.state
+        }
     
     def search_contact_by_email(self, email: str) -> Optional[Dict]:
         """Search for contact by email"""
-        url = f"{self.BASE_URL}/crm/v3/objects/contacts/search"
+        url = f"{self.base_url}/crm/v3/objects/contacts/search"
         
         payload = {
             "filterGroups": [{
@@ -40,7 +154,7 @@ class HubSpotClient:
         }
         
         try:
-            response = requests.post(url, json=payload, headers=self.headers, timeout=10)
+            response = self._request("POST", url, payload)
             response.raise_for_status()
             data = response.json()
             
@@ -48,13 +162,13 @@ class HubSpotClient:
                 return data["results"][0]
             return None
         
-        except requests.exceptions.RequestException as e:
+        except (requests.exceptions.RequestException, CircuitOpenError) as e:
             print(f"Error searching contact by email: {e}")
             return None
     
     def search_contact_by_phone(self, phone: str) -> Optional[Dict]:
         """Search for contact by phone number"""
-        url = f"{self.BASE_URL}/crm/v3/objects/contacts/search"
+        url = f"{self.base_url}/crm/v3/objects/contacts/search"
         
         payload = {
             "filterGroups": [{
@@ -67,7 +181,7 @@ class HubSpotClient:
         }
         
         try:
-            response = requests.post(url, json=payload, headers=self.headers, timeout=10)
+            response = self._request("POST", url, payload)
             response.raise_for_status()
             data = response.json()
             
@@ -75,10 +189,53 @@ class HubSpotClient:
                 return data["results"][0]
             return None
         
-        except requests.exceptions.RequestException as e:
+        except (requests.exceptions.RequestException, CircuitOpenError) as e:
             print(f"Error searching contact by phone: {e}")
             return None
     
+    def search_contacts(
+        self,
+        emails: Iterable[str] = (),
+        phones: Iterable[str] = ()
+    ) -> Tuple[Optional[List[Dict]], Optional[str]]:
+        """
+        Find every contact matching any of the emails or phone numbers
+        
+        Filter groups are OR'd and each uses the IN operator, so a whole
+        batch of leads is resolved by one search (plus one request per
+        further page of results).
+        
+        Returns:
+            Tuple of (contacts, error_message)
+        """
+        filter_groups = []
+        emails = sorted({email for email in emails if email})
+        phones = sorted({phone for phone in phones if phone})
+        if emails:
+            filter_groups.append({"filters": [{"propertyName": "email", "operator": "IN", "values": emails}]})
+        if phones:
+            filter_groups.append({"filters": [{"propertyName": "phone", "operator": "IN", "values": phones}]})
+        if not filter_groups:
+            return [], None
+        
+        url = f"{self.base_url}/crm/v3/objects/contacts/search"
+        payload = {
+            "filterGroups": filter_groups,
+            "properties": ["email", "phone"],
+            "limit": self.BATCH_LIMIT
+        }
+        
+        contacts = []
+        while True:
+            data, error, _ = self._send_with_retry("POST", url, payload)
+            if error:
+                return None, error
+            contacts.extend(data.get("results", []))
+            after = data.get("paging", {}).get("next", {}).get("after")
+            if not after:
+                return contacts, None
+            payload = {**payload, "after": after}
+    
     def create_contact(self, contact_data: Dict) -> Tuple[bool, Optional[str], Optional[str]]:
         """
         Create a new contact in HubSpot
@@ -86,7 +243,7 @@ class HubSpotClient:
         Returns:
             Tuple of (success, contact_id, error_message)
         """
-        url = f"{self.BASE_URL}/crm/v3/objects/contacts"
+        url = f"{self.base_url}/crm/v3/objects/contacts"
         
         payload = {
             "properties": contact_data
@@ -101,7 +258,7 @@ class HubSpotClient:
         Returns:
             Tuple of (success, contact_id, error_message)
         """
-        url = f"{self.BASE_URL}/crm/v3/objects/contacts/{contact_id}"
+        url = f"{self.base_url}/crm/v3/objects/contacts/{contact_id}"
         
         payload = {
             "properties": contact_data
@@ -109,63 +266,147 @@ class HubSpotClient:
         
         return self._make_request_with_retry("PATCH", url, payload)
     
-    def _make_request_with_retry(
-        self, 
-        method: str, 
-        url: str, 
+    def batch_create_contacts(self, contacts: List[Dict]) -> Tuple[List[Dict], List[Dict], Optional[str], Optional[int]]:
+        """
+        Create up to BATCH_LIMIT contacts in one request
+        
+        Returns:
+            Tuple of (created contacts, per-item errors, error_message,
+            HTTP status of a failed request or None)
+        """
+        url = f"{self.base_url}/crm/v3/objects/contacts/batch/create"
+        payload = {"inputs": [{"properties": properties} for properties in contacts]}
+        
+        data, error, status = self._send_with_retry("POST", url, payload)
+        if error:
+            return [], [], error, status
+        return data.get("results", []), data.get("errors", []), None, None
+    
+    def batch_update_contacts(self, updates: Dict[str, Dict]) -> Tuple[List[Dict], List[Dict], Optional[str], Optional[int]]:
+        """
+        Update up to BATCH_LIMIT contacts (contact id -> properties) in one request
+        
+        Returns:
+            Tuple of (updated contacts, per-item errors, error_message,
+            HTTP status of a failed request or None)
+        """
+        url = f"{self.base_url}/crm/v3/objects/contacts/batch/update"
+        payload = {"inputs": [{"id": contact_id, "properties": properties} for contact_id, properties in updates.items()]}
+        
+        data, error, status = self._send_with_retry("POST", url, payload)
+        if error:
+            return [], [], error, status
+        return data.get("results", []), data.get("errors", []), None, None
+    
+    def _send_with_retry(
+        self,
+        method: str,
+        url: str,
         payload: Dict,
         max_retries: int = 3
-    ) -> Tuple[bool, Optional[str], Optional[str]]:
+    ) -> Tuple[Optional[Dict], Optional[str], Optional[int]]:
         """
         Make API request with exponential backoff retry logic
         
+        Batch endpoints answer 207 when only some inputs failed; that body
+        is returned like any other success. While the circuit breaker is
+        open, fails at once without sending or sleeping.
+        
         Returns:
-            Tuple of (success, contact_id, error_message)
+            Tuple of (response_json, error_message, HTTP status of a failed
+            request, None when it got no response)
         """
+        if method not in ("POST", "PATCH"):
+            return None, f"Unsupported method: {method}", None
         retry_delay = 1  # Start with 1 second
         
         for attempt in range(max_retries):
             try:
-                if method == "POST":
-                    response = requests.post(url, json=payload, headers=self.headers, timeout=10)
-                elif method == "PATCH":
-                    response = requests.patch(url, json=payload, headers=self.headers, timeout=10)
-                else:
-                    return False, None, f"Unsupported method: {method}"
+                response = self._request(method, url, payload)
                 
                 # Handle rate limiting (429)
                 if response.status_code == 429:
-                    if attempt < max_retries - 1:
+                    if attempt < max_retries - 1 and not self.breaker.rejects():
                         print(f"Rate limited. Retrying in {retry_delay}s...")
                         time.sleep(retry_delay)
                         retry_delay *= 2  # Exponential backoff
                         continue
                     else:
-                        return False, None, "Rate limit exceeded after retries"
+                        return None, "Rate limit exceeded after retries", 429
                 
                 response.raise_for_status()
-                data = response.json()
-                contact_id = data.get("id")
-                
-                return True, contact_id, None
+                return response.json(), None, None
             
             except requests.exceptions.HTTPError as e:
                 error_msg = f"HTTP error: {e}"
-                if attempt < max_retries - 1 and response.status_code >= 500:
+                if attempt < max_retries - 1 and response.status_code >= 500 and not self.breaker.rejects():
                     # Retry on server errors
                     print(f"Server error. Retrying in {retry_delay}s...")
                     time.sleep(retry_delay)
                     retry_delay *= 2
                     continue
-                return False, None, error_msg
+                return None, error_msg, response.status_code
             
             except requests.exceptions.RequestException as e:
-                return False, None, f"Request error: {e}"
+                return None, f"Request error: {e}", None
+            
+            except CircuitOpenError as e:
+                return None, f"HubSpot unavailable: {e}", None
+        
+        return None, "Max retries exceeded", None
+    
+    def _make_request_with_retry(
+        self,
+        method: str,
+        url: str,
+        payload: Dict,
+        max_retries: int = 3
+    ) -> Tuple[bool, Optional[str], Optional[str]]:
+        """
+        Make a single-contact API request with retries
+        
+        Returns:
+            Tuple of (success, contact_id, error_message)
+        """
+        data, error, _ = self._send_with_retry(method, url, payload, max_retries)
+        if error:
+            return False, None, error
+        return True, data.get("id"), None
+    
+    @staticmethod
+    def _lead_properties(
+        name: str,
+        email: str,
+        phone: str,
+        project_goal: str,
+        product_type: str = None
+    ) -> Dict:
+        """HubSpot contact properties of a lead"""
+        properties = {
+            "firstname": name,
+            "email": email,
+            "phone": phone,
+            "project_goal": project_goal,
+            "lifecyclestage": "lead"
+        }
+        
+        if product_type:
+            properties["product_interest"] = product_type
         
-        return False, None, "Max retries exceeded"
+        return properties
+    
+    @staticmethod
+    def _item_error(errors: List[Dict], keys: Iterable[str]) -> Optional[str]:
+        """Message of the per-item error whose context names one of ``keys``"""
+        keys = {key for key in keys if key}
+        for error in errors:
+            for values in (error.get("context") or {}).values():
+                if keys.intersection(values if isinstance(values, list) else [values]):
+                    return error.get("message") or error.get("category")
+        return None
     
     def upsert_lead(
-        self, 
+        self,
         name: str,
         email: str,
         phone: str,
@@ -175,44 +416,138 @@ class HubSpotClient:
         """
         Create or update a lead contact in HubSpot
         
-        Search by email first, then phone. Update if found, create if not.
+        Match by email first, then phone. Update if found, create if not.
         
         Returns:
             Tuple of (success, contact_id, error_message)
         """
-        # Prepare contact properties
-        properties = {
-            "firstname": name,
+        return self.batch_upsert_leads([{
+            "name": name,
             "email": email,
             "phone": phone,
             "project_goal": project_goal,
-            "lifecyclestage": "lead"
-        }
+            "product_type": product_type
+        }])[0]
+    
+    def batch_upsert_leads(self, leads: List[Dict]) -> List[Tuple[bool, Optional[str], Optional[str]]]:
+        """
+        Create or update many leads (upsert_lead keyword arguments each)
         
-        if product_type:
-            properties["product_interest"] = product_type
+        Every BATCH_LIMIT leads cost one combined email/phone search, one
+        batch update and one batch create, instead of up to three requests
+        per lead. Leads whose contact id is already cached are left out of
+        the search. A lead that fails does not fail the others.
+        
+        Returns:
+            One (success, contact_id, error_message) tuple per lead, in order
+        """
+        outcomes = []
+        for start in range(0, len(leads), self.BATCH_LIMIT):
+            outcomes.extend(self._upsert_chunk(leads[start:start + self.BATCH_LIMIT]))
+        return outcomes
+    
+    def _upsert_chunk(
+        self,
+        leads: List[Dict],
+        use_cache: bool = True
+    ) -> List[Tuple[bool, Optional[str], Optional[str]]]:
+        properties = [self._lead_properties(**lead) for lead in leads]
         
-        # Search by email first
-        existing_contact = self.search_contact_by_email(email)
+        # Contacts seen before (searches, earlier upserts, session state) skip the search
+        known = [self.cached_contact_id(p["email"], p["phone"]) if use_cache else None for p in properties]
+        unknown = [p for p, contact_id in zip(properties, known) if not contact_id]
         
-        if existing_contact:
-            contact_id = existing_contact["id"]
-            print(f"Found existing contact by email: {contact_id}")
-            success, updated_id, error = self.update_contact(contact_id, properties)
-            return success, updated_id or contact_id, error
+        by_email, by_phone = {}, {}
+        search_error = None
+        if unknown:
+            contacts, search_error = self.search_contacts(
+                emails=[(p["email"] or "").lower() for p in unknown],
+                phones=[p["phone"] for p in unknown]
+            )
+            for contact in contacts or []:
+                found = contact.get("properties") or {}
+                if found.get("email"):
+                    by_email.setdefault(found["email"].lower(), contact["id"])
+                if found.get("phone"):
+                    by_phone.setdefault(found["phone"], contact["id"])
+                self.remember_contact(contact["id"], found.get("email"), found.get("phone"))
+        
+        # Same contact twice in a batch is rejected by HubSpot: the later lead wins
+        updates: Dict[str, Dict] = {}  # contact id -> properties
+        creates: Dict[str, Dict] = {}  # email (or phone) -> properties
+        targets = []
+        for props, cached_id in zip(properties, known):
+            email = (props["email"] or "").lower()
+            contact_id = cached_id or by_email.get(email) or by_phone.get(props["phone"])
+            if contact_id:
+                updates[contact_id] = props
+                targets.append(("update", contact_id))
+            elif search_error:
+                # Creating blindly could duplicate contacts; let the caller retry
+                targets.append(("search", None))
+            else:
+                key = email or props["phone"]
+                creates[key] = props
+                targets.append(("create", key))
+        
+        results: Dict[Tuple[str, str], Tuple[bool, Optional[str], Optional[str]]] = {}
+        results[("search", None)] = (False, None, f"Contact search failed: {search_error}")
+        # The update request itself failed (429, 5xx, no response)
+        updates_unsent = False
+        if updates:
+            updated, errors, error, status = self.batch_update_contacts(updates)
+            if error and status in self.SPLIT_STATUSES and len(updates) > 1:
+                # The request was rejected for its inputs; find the bad ones
+                # one by one. Anything else fails the whole chunk, which the
+                # outbox retries with backoff
+                for contact_id, props in updates.items():
+                    results[("update", contact_id)] = self.update_contact(contact_id, props)
+            else:
+                updates_unsent = bool(error)
+                done = {contact["id"] for contact in updated}
+                for contact_id in updates:
+                    if contact_id in done:
+                        results[("update", contact_id)] = (True, contact_id, None)
+                    else:
+                        message = error or self._item_error(errors, [contact_id]) or "Contact not updated"
+                        results[("update", contact_id)] = (False, None, message)
+        
+        if creates:
+            created, errors, error, status = self.batch_create_contacts(list(creates.values()))
+            if error and status in self.SPLIT_STATUSES and len(creates) > 1:
+                for key, props in creates.items():
+                    results[("create", key)] = self.create_contact(props)
+            else:
+                ids = {}
+                for contact in created:
+                    found = contact.get("properties") or {}
+                    ids[(found.get("email") or "").lower() or found.get("phone")] = contact["id"]
+                for key, props in creates.items():
+                    if key in ids:
+                        results[("create", key)] = (True, ids[key], None)
+                    else:
+                        message = error or self._item_error(errors, [key, props["email"], props["phone"]]) or "Contact not created"
+                        results[("create", key)] = (False, None, message)
         
-        # Search by phone if not found by email
-        existing_contact = self.search_contact_by_phone(phone)
+        outcomes = [results[target] for target in targets]
         
-        if existing_contact:
-            contact_id = existing_contact["id"]
-            print(f"Found existing contact by phone: {contact_id}")
-            success, updated_id, error = self.update_contact(contact_id, properties)
-            return success, updated_id or contact_id, error
+        # A cached id whose update failed may be a deleted or merged contact:
+        # resolve those leads again from a fresh search (not when HubSpot
+        # failed the whole request; the outbox retries those later)
+        stale = [
+            i for i, (props, cached_id, outcome) in enumerate(zip(properties, known, outcomes))
+            if cached_id and not outcome[0] and not updates_unsent
+        ]
+        if stale:
+            for i in stale:
+                self.forget_contact(properties[i]["email"], properties[i]["phone"])
+            for i, outcome in zip(stale, self._upsert_chunk([leads[i] for i in stale], use_cache=False)):
+                outcomes[i] = outcome
         
-        # Create new contact if not found
-        print("Creating new contact in HubSpot")
-        return self.create_contact(properties)
+        for props, (success, contact_id, _) in zip(properties, outcomes):
+            if success:
+                self.remember_contact(contact_id, props["email"], props["phone"])
+        return outcomes
 
 
 # Initialize global HubSpot client
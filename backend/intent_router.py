@@ -0,0 +1,161 @@
+"""
+Message intent routing
+Decides in one pass over a message whether it needs a web search, which
+product it names and whether it is off-topic, using word-boundary matching
+"""
+import re
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+# Time-sensitive or comparative wording that the model cannot answer from
+# training data or the website alone. Everyday words such as "best", "top",
+# "current" and "update" are left out ("the best way to contact you"); a
+# ranking only counts as "top 10" and the like.
+SEARCH_TERMS = [
+    "latest", "recent", "recently", "news",
+    "today", "this week", "this month", "this year", "nowadays",
+    "price", "pricing", "cost",
+    "compare", "comparison", "vs", "versus",
+    "trending", "trend"
+]
+
+# Every term also matches with an -s, -es, -ed or -ing ending ("platforms",
+# "developing"), so lists hold base forms only.
+#
+# (product id, weight, terms). The highest weight wins, then the order of
+# ConversationState.PRODUCTS; generic words like "app" only decide when
+# nothing more specific was said.
+PRODUCT_TERMS: List[Tuple[str, int, List[str]]] = [
+    ("mobile_app", 3, ["mobile app development", "mobile_app"]),
+    ("web_app", 3, ["web app development", "web_app"]),
+    ("mvp", 3, ["mvp development"]),
+    ("ecommerce", 3, ["e-commerce app"]),
+    ("ai_integration", 3, ["ai integration", "ai_integration"]),
+    ("other", 3, ["other services"]),
+    ("mobile_app", 2, ["mobile", "android", "ios", "iphone", "ipad", "mobile app",
+                       "play store", "app store", "flutter", "react native"]),
+    ("web_app", 2, ["web", "website", "webapp", "web app",
+                    "web application", "web portal", "saas", "dashboard"]),
+    ("mvp", 2, ["mvp", "minimum viable", "minimum viable product", "prototype", "proof of concept"]),
+    ("ecommerce", 2, ["ecommerce", "e-commerce", "e commerce", "shop", "online shop", "online store",
+                      "shopping", "marketplace"]),
+    ("ai_integration", 2, ["ai", "artificial intelligence", "machine learning", "chatbot",
+                           "llm", "genai", "generative ai", "gpt", "computer vision"]),
+    ("mobile_app", 1, ["app", "application"]),
+]
+
+# Topics this assistant has no business answering; only off-topic when no
+# on-topic word appears as well ("a weather app" is a product question)
+OFF_TOPIC_TERMS = [
+    "weather", "forecast", "joke", "riddle", "poem", "song", "lyrics",
+    "movie", "film", "tv show", "netflix", "recipe", "cook",
+    "horoscope", "zodiac", "astrology", "lottery", "gambling", "betting",
+    "cricket", "football", "soccer", "ipl", "match score", "celebrity", "gossip",
+    "girlfriend", "boyfriend", "dating", "politics", "election", "homework"
+]
+
+ON_TOPIC_TERMS = [
+    "absolute", "absolute app labs", "company", "team", "service", "develop",
+    "developer", "development", "build", "software", "product",
+    "project", "startup", "business", "hire", "hiring", "quote", "api", "cloud", "devops",
+    "design", "ui", "ux", "code", "coding", "tech", "technology", "platform", "gis", "battery",
+    "contact", "office", "portfolio", "client"
+]
+
+# First words that make a multi-word message a question rather than an answer
+QUESTION_WORDS = {"what", "how", "why", "when", "where", "which", "who", "whom", "whose"}
+
+_SEARCH = "search"
+_ON_TOPIC = "on_topic"
+_OFF_TOPIC = "off_topic"
+
+
+class Route(NamedTuple):
+    """Where a message should go"""
+    search: bool               # a Q&A answer would benefit from web search
+    product: Optional[str]     # product id from ConversationState.PRODUCTS, if named
+    off_topic: bool            # unrelated to the company and its services
+    question: bool             # phrased as a question
+
+
+def _build() -> Tuple["re.Pattern", Dict[str, List[Tuple[str, object]]]]:
+    """Compile every term into one alternation, longest first, and map each term to its tags"""
+    tags: Dict[str, List[Tuple[str, object]]] = {}
+    for term in SEARCH_TERMS:
+        tags.setdefault(term, []).append((_SEARCH, None))
+    for product_id, weight, terms in PRODUCT_TERMS:
+        for term in terms:
+            tags.setdefault(term, []).append((product_id, weight))
+            tags[term].append((_ON_TOPIC, None))
+    for term in ON_TOPIC_TERMS:
+        tags.setdefault(term, []).append((_ON_TOPIC, None))
+    for term in OFF_TOPIC_TERMS:
+        tags.setdefault(term, []).append((_OFF_TOPIC, None))
+
+    # Phrases match across any run of whitespace; the key is the
+    # single-spaced form
+    alternatives = [
+        r"\s+".join(re.escape(word) for word in term.split())
+        for term in sorted(tags, key=len, reverse=True)
+    ]
+    pattern = re.compile(
+        r"(?<!\w)(?:(?P<year>20[2-9]\d)|(?P<ranking>top\s+\d{1,3})"
+        r"|(?P<term>" + "|".join(alternatives) + r")(?:s|es|ed|ing)?)(?!\w)"
+    )
+    return pattern, tags
+
+
+_PATTERN, _TAGS = _build()
+_PRODUCT_ORDER = {
+    product_id: index
+    for index, product_id in enumerate(
+        ["mobile_app", "web_app", "mvp", "ecommerce", "ai_integration", "other"]
+    )
+}
+
+
+@lru_cache(maxsize=4096)
+def route_message(message: str) -> Route:
+    """
+    Classify a message (memoized: a turn asks about the same message several times)
+
+    Args:
+        message: User message
+
+    Returns:
+        Route for the message
+    """
+    text = message.lower()
+    search = False
+    on_topic = False
+    off_topic = False
+    product = None
+    product_rank = None
+
+    for match in _PATTERN.finditer(text):
+        if match.group("term") is None:
+            # A year or a "top N" ranking
+            search = True
+            continue
+        for tag, weight in _TAGS[" ".join(match.group("term").split())]:
+            if tag == _SEARCH:
+                search = True
+            elif tag == _ON_TOPIC:
+                on_topic = True
+            elif tag == _OFF_TOPIC:
+                off_topic = True
+            else:
+                rank = (-weight, _PRODUCT_ORDER[tag])
+                if product_rank is None or rank < product_rank:
+                    product, product_rank = tag, rank
+
+    off_topic = off_topic and not on_topic
+    words = text.split()
+    question = "?" in text or (len(words) >= 3 and words[0].strip(",.!") in QUESTION_WORDS)
+    return Route(
+        # An off-topic message is answered without Gemini, so never searched for
+        search=search and not off_topic,
+        product=product,
+        off_topic=off_topic,
+        question=question
+    )
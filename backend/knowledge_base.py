@@ -0,0 +1,194 @@
+"""
+Local vector index over the Absolute App Labs site content
+Answers company questions from disk instead of a remote search call
+"""
+import json
+import os
+import re
+import zlib
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from config import RAG_INDEX_DIR, RAG_TOP_K, RAG_MIN_SCORE
+
+VECTORS_FILE = "vectors.npy"
+IDF_FILE = "idf.npy"
+CHUNKS_FILE = "chunks.json"
+META_FILE = "meta.json"
+
+# Words too common on the site (or in questions) to say anything about a passage
+STOPWORDS = frozenset("""
+a an and are as at be by can do does for from has have how i in is it its me
+my of on or our that the their this to us we what when where which who why
+will with you your
+""".split())
+
+
+def _stem(word: str) -> str:
+    """Crude suffix stripping so "services"/"service" and "building"/"build" match"""
+    for suffix in ("ments", "ment", "ings", "ing", "ies", "ers", "ed", "es", "er", "s"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[:-len(suffix)]
+    return word
+
+
+class HashingEmbedder:
+    """
+    Feature-hashed unigram + bigram embedding with IDF weighting
+
+    Runs on CPU with NumPy only and needs no model download. The IDF vector
+    is learned from the indexed chunks and stored alongside the index.
+    """
+
+    name = "hashing"
+
+    def __init__(self, dim: int = 2048, idf: Optional[np.ndarray] = None):
+        self.dim = dim
+        self.idf = idf
+
+    @staticmethod
+    def _features(text: str) -> List[str]:
+        # "e-commerce" and "ecommerce" should be the same word
+        text = re.sub(r"\be-(?=[a-z])", "e", text.lower())
+        words = [_stem(w) for w in re.findall(r"[a-z0-9]+", text) if w not in STOPWORDS]
+        return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+    def _counts(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature in self._features(text):
+            vector[zlib.crc32(feature.encode("utf-8")) % self.dim] += 1.0
+        # Sublinear term frequency
+        np.log1p(vector, out=vector)
+        return vector
+
+    def fit(self, texts: List[str]):
+        """Learn bucket IDF weights from the corpus"""
+        counts = np.stack([self._counts(text) for text in texts])
+        document_frequency = (counts > 0).sum(axis=0)
+        self.idf = (np.log((1 + len(texts)) / (1 + document_frequency)) + 1).astype(np.float32)
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """Return L2-normalized float32 vectors, one row per text"""
+        vectors = np.stack([self._counts(text) for text in texts])
+        if self.idf is not None:
+            vectors *= self.idf
+        return _normalize(vectors)
+
+
+class SentenceTransformerEmbedder:
+    """Dense embeddings from a local sentence-transformers model (optional dependency)"""
+
+    def __init__(self, model_name: str):
+        from sentence_transformers import SentenceTransformer
+
+        self.name = model_name
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.dim = self.model.get_sentence_embedding_dimension()
+
+    def fit(self, texts: List[str]):
+        """Dense models need no corpus statistics"""
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = self.model.encode(texts, convert_to_numpy=True, show_progress_bar=False)
+        return _normalize(vectors.astype(np.float32))
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def get_embedder(name: str, dim: int = 2048, idf: Optional[np.ndarray] = None):
+    """Build the embedder for ``name`` ("hashing" or a sentence-transformers model)"""
+    if name == HashingEmbedder.name:
+        return HashingEmbedder(dim=dim, idf=idf)
+    return SentenceTransformerEmbedder(name)
+
+
+class KnowledgeBase:
+    """
+    Read-only chunk index with vectorized top-k cosine retrieval
+
+    The vector matrix is memory-mapped, so workers share the OS page cache
+    instead of each holding a private copy.
+    """
+
+    def __init__(self, index_dir: str):
+        with open(os.path.join(index_dir, META_FILE)) as f:
+            self.meta = json.load(f)
+        with open(os.path.join(index_dir, CHUNKS_FILE)) as f:
+            self.chunks: List[Dict[str, str]] = json.load(f)
+
+        self.vectors = np.load(os.path.join(index_dir, VECTORS_FILE), mmap_mode="r")
+
+        idf = None
+        idf_path = os.path.join(index_dir, IDF_FILE)
+        if os.path.exists(idf_path):
+            idf = np.load(idf_path)
+        self.embedder = get_embedder(self.meta["embedder"], dim=self.meta["dim"], idf=idf)
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    def search(self, query: str, top_k: int = RAG_TOP_K, min_score: float = RAG_MIN_SCORE) -> List[Dict]:
+        """
+        Return up to ``top_k`` chunks most similar to ``query``
+
+        Returns:
+            List of dicts with keys: text, title, source, score (best first)
+        """
+        if not query.strip() or not self.chunks:
+            return []
+
+        query_vector = self.embedder.embed([query])[0]
+        scores = self.vectors @ query_vector
+
+        k = min(top_k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+
+        return [
+            {**self.chunks[i], "score": float(scores[i])}
+            for i in top
+            if scores[i] >= min_score
+        ]
+
+
+def format_knowledge_context(passages: List[Dict]) -> str:
+    """
+    Format retrieved passages into a grounding context string
+
+    Args:
+        passages: Chunks returned by KnowledgeBase.search
+
+    Returns:
+        Formatted context string
+    """
+    if not passages:
+        return ""
+
+    context_parts = ["Relevant information from the Absolute App Labs website:\n"]
+    for i, passage in enumerate(passages, 1):
+        context_parts.append(f"{i}. {passage['title']}\n   {passage['text']}\n")
+
+    return "\n".join(context_parts)
+
+
+def load_knowledge_base(index_dir: str = RAG_INDEX_DIR) -> Optional[KnowledgeBase]:
+    """Load the index built by build_index.py, or None if it is missing"""
+    if not os.path.exists(os.path.join(index_dir, META_FILE)):
+        print(f"⚠️  Knowledge base not found in {index_dir} (run build_index.py)")
+        return None
+    try:
+        kb = KnowledgeBase(index_dir)
+    except Exception as e:
+        print(f"⚠️  Knowledge base not loaded: {e}")
+        return None
+    print(f"✓ Knowledge base loaded: {len(kb)} chunks ({kb.meta['embedder']})")
+    return kb
+
+
+# Global knowledge base (None when no index has been built)
+knowledge_base = load_knowledge_base()
@@ -1,10 +1,13 @@
 """
 Lead Collection Orchestrator
 Manages the structured lead collection flow with product selection and HubSpot integration
+Completed leads are handed back as a submission for the lead outbox, never sent inline
 """
 from typing import Dict, List, Optional, Tuple
+from config import OFF_TOPIC_REDIRECT_ENABLED
 from conversation_state import ConversationState, ConversationStage
 from hubspot_integration import hubspot_client
+from intent_router import route_message
 import re
 
 
@@ -14,6 +17,8 @@ class LeadCollector:
     def __init__(self, state: ConversationState):
         """Initialize lead collector with conversation state"""
         self.state = state
+        # upsert_lead arguments of a lead completed by this message, for the outbox
+        self.lead_submission: Optional[Dict] = None
     
     def process_message(
         self, 
@@ -66,10 +71,14 @@ class LeadCollector:
         if self.state.should_collect_lead():
             return self._handle_lead_collection(user_message)
         
-        # Lead complete - send to HubSpot
+        # Lead complete - queue for HubSpot
         if self.state.stage == ConversationStage.LEAD_COMPLETE:
             return self._handle_hubspot_submission()
         
+        # Off-topic messages get a redirect instead of a Gemini call
+        if OFF_TOPIC_REDIRECT_ENABLED and route_message(user_message).off_topic:
+            return self.handle_off_topic()
+        
         # Default: allow general Q&A
         return None, quick_replies, actions
     
@@ -83,6 +92,12 @@ class LeadCollector:
         
         # Collecting name
         if self.state.stage == ConversationStage.COLLECTING_NAME:
+            # A question here is not a name; answer it after the lead
+            if OFF_TOPIC_REDIRECT_ENABLED:
+                route = route_message(user_message)
+                if route.question or route.off_topic:
+                    return self.handle_off_topic()
+            
             if self._is_valid_name(user_message):
                 self.state.update(name=user_message.strip())
                 self.state.advance_to_next_stage()
@@ -150,7 +165,14 @@ class LeadCollector:
         return None, quick_replies, actions
     
     def _handle_hubspot_submission(self) -> Tuple[str, List[Dict], List[Dict]]:
-        """Submit lead to HubSpot CRM"""
+        """
+        Queue the lead for HubSpot CRM
+        
+        The submission is saved to the lead outbox in the same transaction as
+        the turn and sent by the outbox worker, so a slow or failing HubSpot
+        never holds up the reply. The widget polls /api/lead/{session_id}
+        for the contact id.
+        """
         actions = []
         quick_replies = []
         
@@ -169,69 +191,32 @@ class LeadCollector:
                    f"💡 Project: {self.state.project_goal}\n\n"
                    "Our team will reach out to you within 24 hours to discuss your project!")
         else:
-            # Submit to HubSpot
-            success, contact_id, error = hubspot_client.upsert_lead(
-                name=self.state.name,
-                email=self.state.email,
-                phone=self.state.whatsapp_number,
-                project_goal=self.state.project_goal,
-                product_type=self.state.product_type
-            )
+            self.lead_submission = {
+                "name": self.state.name,
+                "email": self.state.email,
+                "phone": self.state.whatsapp_number,
+                "project_goal": self.state.project_goal,
+                "product_type": self.state.product_type
+            }
+            actions.append({
+                "type": "hubspot_upsert",
+                "status": "queued"
+            })
             
-            if success:
-                self.state.update(hubspot_contact_id=contact_id)
-                actions.append({
-                    "type": "hubspot_upsert",
-                    "status": "success",
-                    "contact_id": contact_id
-                })
-                
-                text = (f"Thank you, {self.state.name}! 🎉\n\n"
-                       f"We've saved your information and our team will reach out "
-                       f"to you within 24 hours via WhatsApp ({self.state.whatsapp_number}) "
-                       f"or email ({self.state.email}).\n\n"
-                       f"Is there anything else you'd like to know about Absolute App Labs?")
-                
-                # Move to general Q&A mode
-                self.state.stage = ConversationStage.GENERAL_QA
-            else:
-                actions.append({
-                    "type": "hubspot_upsert",
-                    "status": "error",
-                    "message": error
-                })
-                
-                text = (f"Thank you, {self.state.name}! We've received your information. "
-                       f"Our team will reach out shortly. "
-                       f"\n\nIs there anything else you'd like to know?")
-                
-                # Still move to Q&A even if HubSpot fails
-                self.state.stage = ConversationStage.GENERAL_QA
+            text = (f"Thank you, {self.state.name}! 🎉\n\n"
+                   f"We've saved your information and our team will reach out "
+                   f"to you within 24 hours via WhatsApp ({self.state.whatsapp_number}) "
+                   f"or email ({self.state.email}).\n\n"
+                   f"Is there anything else you'd like to know about Absolute App Labs?")
+            
+            # Move to general Q&A mode; the outbox tracks delivery from here
+            self.state.stage = ConversationStage.GENERAL_QA
         
         return text, quick_replies, actions
     
     def _extract_product_selection(self, message: str) -> Optional[str]:
         """Extract product selection from user message"""
-        message_lower = message.lower()
-        
-        # Check for exact bubble matches first
-        for product in ConversationState.PRODUCTS:
-            if product["id"] in message_lower or product["label"].lower() in message_lower:
-                return product["id"]
-        
-        # Check for keywords
-        if any(word in message_lower for word in ["mobile", "android", "ios", "app"]):
-            return "mobile_app"
-        if any(word in message_lower for word in ["web", "website", "webapp"]):
-            return "web_app"
-        if "mvp" in message_lower or "minimum viable" in message_lower:
-            return "mvp"
-        if "ecommerce" in message_lower or "e-commerce" in message_lower or "shop" in message_lower:
-            return "ecommerce"
-        if "ai" in message_lower or "artificial intelligence" in message_lower:
-            return "ai_integration"
-        
-        return None
+        return route_message(message).product
     
     def _get_product_name(self, product_id: str) -> str:
         """Get product display name from ID"""
@@ -252,7 +237,7 @@ class LeadCollector:
         return True
     
     def handle_off_topic(self) -> Tuple[str, List[Dict], List[Dict]]:
-        """Handle off-topic messages during lead collection"""
+        """Handle questions during lead collection and off-topic messages in Q&A"""
         quick_replies = []
         actions = []
         
@@ -272,6 +257,8 @@ class LeadCollector:
                 text = "Let's start with what you're looking to build. Which service interests you?"
                 quick_replies = self.state.get_product_bubbles()
             else:
-                return None, quick_replies, actions
+                text = ("I can only help with questions about Absolute App Labs and building "
+                       "software: mobile and web apps, MVPs, e-commerce and AI. "
+                       "What would you like to know?")
         
         return text, quick_replies, actions
@@ -0,0 +1,270 @@
+"""
+Durable outbox for HubSpot lead submissions
+Completed leads are stored with the turn; a background worker sends them
+"""
+import asyncio
+import json
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import select, update
+
+from config import (
+    LEAD_OUTBOX_POLL_INTERVAL, LEAD_OUTBOX_BATCH_SIZE, LEAD_OUTBOX_MAX_ATTEMPTS,
+    LEAD_OUTBOX_RETRY_BASE_SECONDS, LEAD_OUTBOX_RETRY_MAX_SECONDS, LEAD_OUTBOX_LEASE_SECONDS
+)
+from conversation_state import ConversationState
+from database import AsyncSessionLocal, ChatSession, LeadOutbox
+from hubspot_integration import hubspot_client
+from metrics import lead_batch_seconds, leads_total
+from state_cache import state_cache
+from write_behind import write_queue
+
+# Outbox row statuses (also the lead status reported to the widget)
+STATUS_QUEUED = "queued"
+STATUS_SUCCESS = "success"
+STATUS_FAILED = "failed"
+
+
+def outbox_row(session_id: str, submission: Dict, now: Optional[datetime] = None) -> Dict:
+    """Column values of a new outbox row for ``submission`` (upsert_lead kwargs)"""
+    now = now or datetime.utcnow()
+    return {
+        "session_id": session_id,
+        "payload": json.dumps(submission),
+        "status": STATUS_QUEUED,
+        "attempts": 0,
+        "next_attempt_at": now,
+        "created_at": now,
+        "updated_at": now
+    }
+
+
+class LeadOutboxWorker:
+    """
+    Sends queued lead submissions to HubSpot, retrying failures
+
+    Due rows are claimed with a single UPDATE ... RETURNING that pushes their
+    next attempt one lease into the future, so several worker processes never
+    send the same row at once, and a row whose worker died is retried once
+    the lease runs out. Each claimed batch is sent with one batch upsert; the
+    HubSpot client is blocking and runs in a thread.
+    """
+
+    def __init__(
+        self,
+        client,
+        interval: float,
+        batch_size: int = 100,
+        max_attempts: int = 8,
+        retry_base: float = 30,
+        retry_max: float = 3600,
+        lease: float = 300
+    ):
+        self.client = client
+        self.interval = interval
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.lease = lease
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = asyncio.Event()
+        self._wakeup = asyncio.Event()
+
+        # Metrics
+        self.batches = 0
+        self.attempts = 0
+        self.delivered = 0
+        self.retried = 0
+        self.given_up = 0
+        self.batch_seconds = 0.0
+        self.max_batch_ms = 0.0
+        self.last_error: Optional[str] = None
+
+    def start(self):
+        """Start the delivery loop on the running event loop"""
+        if self._task is None:
+            self._stopping.clear()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop after the send in progress, if any; queued rows stay queued"""
+        if self._task is not None:
+            self._stopping.set()
+            self._wakeup.set()
+            await self._task
+            self._task = None
+
+    def notify(self):
+        """Deliver without waiting for the next poll (a lead was just queued)"""
+        self._wakeup.set()
+
+    async def _run(self):
+        while not self._stopping.is_set():
+            try:
+                await self.drain()
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"Lead outbox delivery failed: {e}")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def drain(self) -> int:
+        """
+        Send every submission that is due
+
+        Returns:
+            Number of submissions delivered
+        """
+        delivered = 0
+        while not self._stopping.is_set():
+            if self.client.breaker.rejects():
+                # Claiming now would only spend attempts; rows wait for the breaker
+                break
+            rows = await self._claim_batch()
+            if rows:
+                delivered += await self._deliver(rows)
+            if len(rows) < self.batch_size:
+                break
+        return delivered
+
+    async def _claim_batch(self) -> List:
+        now = datetime.utcnow()
+        async with AsyncSessionLocal() as db:
+            due = (
+                select(LeadOutbox.id)
+                .where(LeadOutbox.status == STATUS_QUEUED, LeadOutbox.next_attempt_at <= now)
+                .order_by(LeadOutbox.next_attempt_at)
+                .limit(self.batch_size)
+                .scalar_subquery()
+            )
+            result = await db.execute(
+                update(LeadOutbox)
+                .where(LeadOutbox.id.in_(due), LeadOutbox.next_attempt_at <= now)
+                .values(
+                    attempts=LeadOutbox.attempts + 1,
+                    next_attempt_at=now + timedelta(seconds=self.lease),
+                    updated_at=now
+                )
+                .returning(LeadOutbox.id, LeadOutbox.session_id, LeadOutbox.payload, LeadOutbox.attempts)
+            )
+            rows = result.all()
+            await db.commit()
+        return rows
+
+    async def _deliver(self, rows: List) -> int:
+        """Send claimed submissions as one batch and record each outcome"""
+        start = time.monotonic()
+        self.batches += 1
+        self.attempts += len(rows)
+        try:
+            outcomes = await asyncio.to_thread(
+                self.client.batch_upsert_leads, [json.loads(row.payload) for row in rows]
+            )
+        except Exception as e:
+            outcomes = [(False, None, str(e))] * len(rows)
+        elapsed = time.monotonic() - start
+        lead_batch_seconds.observe(elapsed)
+        self.batch_seconds += elapsed
+        self.max_batch_ms = max(self.max_batch_ms, round(elapsed * 1000, 2))
+
+        for row, (success, contact_id, _) in zip(rows, outcomes):
+            if success and contact_id:
+                await self._prepare_contact(row.session_id, contact_id)
+
+        now = datetime.utcnow()
+        delivered = 0
+        async with AsyncSessionLocal() as db:
+            for row, (success, contact_id, error) in zip(rows, outcomes):
+                if success:
+                    values = {"status": STATUS_SUCCESS, "contact_id": contact_id, "last_error": None}
+                    delivered += 1
+                    leads_total.inc(outcome="success")
+                    if contact_id:
+                        await self._store_contact(db, row.session_id, contact_id)
+                elif row.attempts >= self.max_attempts:
+                    values = {"status": STATUS_FAILED, "last_error": error}
+                    self.given_up += 1
+                    leads_total.inc(outcome="failed")
+                    self.last_error = error
+                    print(f"⚠️  Lead for session {row.session_id} not sent after {row.attempts} attempts: {error}")
+                else:
+                    delay = min(self.retry_base * 2 ** (row.attempts - 1), self.retry_max)
+                    values = {"next_attempt_at": now + timedelta(seconds=delay), "last_error": error}
+                    self.retried += 1
+                    leads_total.inc(outcome="retried")
+                    self.last_error = error
+                    print(f"Lead for session {row.session_id} failed (attempt {row.attempts}), retrying in {delay:.0f}s: {error}")
+                await db.execute(
+                    update(LeadOutbox).where(LeadOutbox.id == row.id).values(updated_at=now, **values)
+                )
+            # The contact id is in the state by the time a poll reports success
+            await db.commit()
+
+        self.delivered += delivered
+        return delivered
+
+    async def _prepare_contact(self, session_id: str, contact_id: str):
+        """Put the contact id into the cached state and let queued turns land first"""
+        if state_cache:
+            # The next turn saves the cached state, so it must carry the id too
+            cached = await state_cache.get(session_id)
+            if cached is not None:
+                cached.update(hubspot_contact_id=contact_id)
+                await state_cache.put(session_id, cached)
+        if write_queue:
+            await write_queue.wait_for_session(session_id)
+
+    async def _store_contact(self, db, session_id: str, contact_id: str):
+        """
+        Write the HubSpot contact id back into the session's stored state
+
+        A turn already in flight without the state cache saves the state it
+        loaded and drops the id again; the outbox row keeps it regardless.
+        """
+        session = await db.get(ChatSession, session_id)
+        if session is None:
+            # Deleted or archived meanwhile
+            return
+        state = ConversationState.from_stored(session.conversation_state_bin, session.conversation_state)
+        state.update(hubspot_contact_id=contact_id)
+        # Only the state changes; updated_at stays the last turn's time
+        await db.execute(
+            update(ChatSession)
+            .where(ChatSession.id == session_id)
+            .values(
+                conversation_state_bin=state.to_bytes(),
+                conversation_state=None,
+                updated_at=ChatSession.updated_at
+            )
+        )
+
+    def stats(self) -> Dict:
+        """Snapshot of outbox worker metrics"""
+        return {
+            "batches": self.batches,
+            "attempts": self.attempts,
+            "delivered": self.delivered,
+            "retried": self.retried,
+            "given_up": self.given_up,
+            "avg_batch_ms": round(self.batch_seconds / self.batches * 1000, 2) if self.batches else 0.0,
+            "max_batch_ms": self.max_batch_ms,
+            "last_error": self.last_error
+        }
+
+
+# Global outbox worker (None when HubSpot is not configured)
+lead_worker = LeadOutboxWorker(
+    hubspot_client,
+    interval=LEAD_OUTBOX_POLL_INTERVAL,
+    batch_size=LEAD_OUTBOX_BATCH_SIZE,
+    max_attempts=LEAD_OUTBOX_MAX_ATTEMPTS,
+    retry_base=LEAD_OUTBOX_RETRY_BASE_SECONDS,
+    retry_max=LEAD_OUTBOX_RETRY_MAX_SECONDS,
+    lease=LEAD_OUTBOX_LEASE_SECONDS
+) if hubspot_client else None
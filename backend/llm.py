@@ -2,34 +2,39 @@
 Google Gemini AI integration for chatbot
 Using google-generativeai SDK directly (no LangChain)
 """
+import asyncio
+import hashlib
+import json
+import re
+import time
 import google.generativeai as genai
-from typing import List, Dict, Tuple
-from config import GOOGLE_API_KEY, MAX_HISTORY_LENGTH
-from search import google_search, format_search_context
+from cachetools import TTLCache
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List, Dict, Optional, Tuple
+from config import (
+    GOOGLE_API_KEY, MAX_HISTORY_LENGTH, GEMINI_MAX_CONCURRENCY, GEMINI_TIMEOUT,
+    RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL, RESPONSE_CACHE_MAX_CHARS, RAG_SKIP_SEARCH_SCORE,
+    GEMINI_SLOW_CALL_SECONDS, GEMINI_API_ENDPOINT, SUMMARY_MAX_TOKENS, PROMPT_MAX_MESSAGE_TOKENS
+)
+from circuit_breaker import CircuitOpenError, create_breaker
+from search import google_search
+from knowledge_base import HashingEmbedder, knowledge_base
+from intent_router import route_message
+from prompt_builder import build_prompt, estimate_tokens, prompt_stats, truncate_to_tokens, usage_from_response
 
 # Configure Gemini API
 genai.configure(api_key=GOOGLE_API_KEY)
 
-# Initialize Gemini model with system instructions
-model = genai.GenerativeModel(
-    model_name='gemini-2.0-flash',
-    generation_config={
-        'temperature': 0.7,
-        'top_p': 0.95,
-        'top_k': 40,
-        'max_output_tokens': 2048,
-    },
-    system_instruction="""You are an intelligent AI assistant for Absolute App Labs, a leading AI-powered product development company in Chennai, India.
-
-Company Overview:
+COMPANY_OVERVIEW = """Company Overview:
 - Absolute App Labs specializes in custom mobile & web app development, AI-powered solutions, GIS platforms, and predictive battery management systems
 - Founded in 2020 with 6+ years of experience
 - 50+ expert developers
 - 10M+ active users on built applications
 - Based in Chennai, Tamil Nadu, India
 - Services include: Mobile App Development, Web Applications, AI Integration, Cloud & DevOps, Product Modernization
+"""
 
-Your Role:
+ASSISTANT_ROLE = """Your Role:
 - Provide helpful, accurate information about Absolute App Labs services and capabilities
 - Answer technical questions about software development
 - Guide users on how to engage with the company
@@ -42,32 +47,259 @@ Contact Information:
 - Phone: +91-044 4596 7630
 - Address: AJ Block 4th Street, 35, 9th Main Rd, A J Block, Shanthi Colony, Anna Nagar, Chennai, Tamil Nadu 600040, India
 """
-)
 
 # System prompt for the chatbot
-SYSTEM_PROMPT = """You are an intelligent AI assistant for Absolute App Labs, a leading AI-powered product development company in Chennai, India.
+SYSTEM_PROMPT = f"""You are an intelligent AI assistant for Absolute App Labs, a leading AI-powered product development company in Chennai, India.
 
-Company Overview:
-- Absolute App Labs specializes in custom mobile & web app development, AI-powered solutions, GIS platforms, and predictive battery management systems
-- Founded in 2020 with 6+ years of experience
-- 50+ expert developers
-- 10M+ active users on built applications
-- Based in Chennai, Tamil Nadu, India
-- Services include: Mobile App Development, Web Applications, AI Integration, Cloud & DevOps, Product Modernization
+{COMPANY_OVERVIEW}
+{ASSISTANT_ROLE}"""
 
-Your Role:
-- Provide helpful, accurate information about Absolute App Labs services and capabilities
-- Answer technical questions about software development
-- Guide users on how to engage with the company
-- Be professional, friendly, and knowledgeable
-- When web search results are provided, cite sources appropriately
-- If you don't know something, admit it rather than making up information
+# With the local knowledge base, company facts arrive with each question instead
+GROUNDED_SYSTEM_PROMPT = f"""You are an intelligent AI assistant for Absolute App Labs, a leading AI-powered product development company in Chennai, India.
 
-Contact Information:
-- Website: https://www.absoluteapplabs.com
-- Phone: +91-044 4596 7630
-- Address: AJ Block 4th Street, 35, 9th Main Rd, A J Block, Shanthi Colony, Anna Nagar, Chennai, Tamil Nadu 600040, India
-"""
+Questions may come with excerpts from the Absolute App Labs website; base answers about the company on them.
+
+{ASSISTANT_ROLE}"""
+
+# Initialize Gemini model with system instructions
+model = genai.GenerativeModel(
+    model_name='gemini-2.0-flash',
+    generation_config={
+        'temperature': 0.7,
+        'top_p': 0.95,
+        'top_k': 40,
+        'max_output_tokens': 2048,
+    },
+    system_instruction=GROUNDED_SYSTEM_PROMPT if knowledge_base else SYSTEM_PROMPT
+)
+
+# Instructions for folding old messages into the rolling conversation summary
+SUMMARY_SYSTEM_PROMPT = f"""You keep a running summary of a website chat between a visitor and the Absolute App Labs assistant.
+
+Merge the new messages into the current summary. Keep what the assistant may need later in the conversation: the visitor's goals, requirements and details they shared, the questions asked, and the answers and recommendations given. Drop greetings and small talk.
+
+Write plain third-person prose of at most {SUMMARY_MAX_TOKENS * 3 // 5} words. Reply with the summary only."""
+
+summary_model = genai.GenerativeModel(
+    model_name='gemini-2.0-flash',
+    generation_config={
+        'temperature': 0.2,
+        'max_output_tokens': SUMMARY_MAX_TOKENS,
+    },
+    system_instruction=SUMMARY_SYSTEM_PROMPT
+)
+
+# Sent with every request, so it comes out of each prompt's token budget
+SYSTEM_PROMPT_TOKENS = estimate_tokens(GROUNDED_SYSTEM_PROMPT if knowledge_base else SYSTEM_PROMPT)
+
+# Event loop the GEMINI_API_ENDPOINT client was made for
+_endpoint_loop = None
+
+def _bind_gemini_endpoint():
+    """
+    Send the model's async calls to GEMINI_API_ENDPOINT over plaintext gRPC
+    
+    gRPC channels belong to the event loop that created them, so the client
+    is created on first use in each loop.
+    """
+    global _endpoint_loop
+    loop = asyncio.get_running_loop()
+    if _endpoint_loop is loop:
+        return
+    import grpc
+    from google.ai.generativelanguage_v1beta.services.generative_service import GenerativeServiceAsyncClient
+    from google.ai.generativelanguage_v1beta.services.generative_service.transports import GenerativeServiceGrpcAsyncIOTransport
+    transport = GenerativeServiceGrpcAsyncIOTransport(
+        host=GEMINI_API_ENDPOINT,
+        channel=grpc.aio.insecure_channel(GEMINI_API_ENDPOINT)
+    )
+    client = GenerativeServiceAsyncClient(transport=transport)
+    model._async_client = client
+    summary_model._async_client = client
+    _endpoint_loop = loop
+
+class GeminiPool:
+    """
+    Bounds concurrent Gemini calls on this worker and enforces a deadline
+    
+    Calls beyond the concurrency cap wait for a free slot; the deadline
+    covers both the wait and the call itself.
+    """
+    
+    def __init__(self, max_concurrency: int, timeout: float):
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        
+        # Metrics
+        self.waiting = 0
+        self.in_flight = 0
+        self.max_waiting = 0
+        self.completed = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.total_wait_seconds = 0.0
+    
+    @asynccontextmanager
+    async def slot(self, deadline: float):
+        """Hold one concurrency slot; waiting for it counts against ``deadline``"""
+        queued = self._semaphore.locked()
+        if queued:
+            self.waiting += 1
+            self.max_waiting = max(self.max_waiting, self.waiting)
+        start = time.monotonic()
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), max(deadline - start, 0))
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            if queued:
+                self.waiting -= 1
+            self.total_wait_seconds += time.monotonic() - start
+        
+        self.in_flight += 1
+        try:
+            yield
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise
+        except Exception:
+            self.failed += 1
+            raise
+        else:
+            self.completed += 1
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+    
+    def stats(self) -> Dict:
+        """Snapshot of pool metrics"""
+        finished = self.completed + self.failed + self.timeouts
+        return {
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "queue_depth": self.waiting,
+            "max_queue_depth": self.max_waiting,
+            "completed": self.completed,
+            "failed": self.failed,
+            "timeouts": self.timeouts,
+            "avg_wait_ms": round(self.total_wait_seconds / finished * 1000, 2) if finished else 0.0
+        }
+
+
+gemini_pool = GeminiPool(GEMINI_MAX_CONCURRENCY, GEMINI_TIMEOUT)
+
+# While open, Gemini turns get ERROR_RESPONSE at once instead of waiting out the deadline
+gemini_breaker = create_breaker("gemini", GEMINI_SLOW_CALL_SECONDS)
+
+class ResponseCache(TTLCache):
+    """
+    LRU + TTL cache of Gemini answers keyed by normalized question and history
+    
+    Only answers that depend on nothing but the prompt are stored: turns
+    that trigger a web search and failed calls are never cached.
+    """
+    
+    def __init__(self, maxsize: int, ttl: int, max_chars: int):
+        super().__init__(maxsize=maxsize, ttl=ttl)
+        self.max_chars = max_chars
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.bypasses = 0
+    
+    def popitem(self):
+        # Called by Cache.__setitem__ when full, i.e. an LRU eviction
+        item = super().popitem()
+        self.evictions += 1
+        return item
+    
+    def expire(self, time=None):
+        expired = super().expire(time)
+        self.expirations += len(expired)
+        return expired
+    
+    def lookup(self, key: str) -> Optional[Tuple[str, List[Dict[str, str]]]]:
+        """Cached (answer, sources) for ``key``, counting the hit or miss"""
+        entry = self.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        answer, sources = entry
+        # Callers extend and clear their sources lists
+        return answer, list(sources)
+    
+    def store(self, key: str, answer: str, sources: List[Dict[str, str]]):
+        """Cache ``answer`` with its sources unless it exceeds the per-entry size limit"""
+        if answer and len(answer) <= self.max_chars:
+            self[key] = (answer, list(sources))
+    
+    def stats(self) -> Dict:
+        """Snapshot of cache metrics"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self),
+            "max_entries": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "bypasses": self.bypasses
+        }
+
+
+response_cache = (
+    ResponseCache(RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL, RESPONSE_CACHE_MAX_CHARS)
+    if RESPONSE_CACHE_SIZE > 0 else None
+)
+
+def normalize_message(message: str) -> str:
+    """Case-, whitespace- and trailing-punctuation-insensitive form of a message"""
+    normalized = re.sub(r"\s+", " ", message.lower()).strip()
+    return normalized.strip("?!.,;: ")
+
+def _response_cache_key(
+    user_message: str,
+    chat_history: List[Dict[str, str]],
+    enable_search: bool,
+    summary: Optional[str] = None
+) -> Optional[str]:
+    """
+    Cache key for this turn, or None when it must bypass the cache
+    
+    The key covers the normalized message plus the exact history window
+    and summary that would be sent to Gemini, so follow-ups only match
+    identical context.
+    """
+    if response_cache is None:
+        return None
+    
+    # Search-backed answers depend on live results
+    if enable_search and should_search(user_message):
+        response_cache.bypasses += 1
+        return None
+    
+    normalized = normalize_message(user_message)
+    if not normalized:
+        return None
+    
+    window = [
+        [msg["role"], msg["content"]]
+        for msg in chat_history[-MAX_HISTORY_LENGTH:]
+    ]
+    payload = json.dumps([normalized, window, summary], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def _remaining(deadline: float) -> float:
+    """Seconds left before ``deadline`` (never negative)"""
+    return max(deadline - time.monotonic(), 0)
+
+# Fallback reply when the Gemini call fails
+ERROR_RESPONSE = "I apologize, but I encountered an error processing your request. Please try again."
 
 def format_chat_history(chat_history: List[Dict[str, str]]) -> List[Dict[str, str]]:
     """
@@ -88,10 +320,131 @@ def format_chat_history(chat_history: List[Dict[str, str]]) -> List[Dict[str, st
         })
     return formatted
 
+def _answered_locally(passages: List[Dict]) -> bool:
+    """Whether the best knowledge-base passage is strong enough to skip web search"""
+    return bool(passages) and passages[0]["score"] >= RAG_SKIP_SEARCH_SCORE
+
+async def retrieve_passages(user_message: str) -> List[Dict]:
+    """
+    Look a message up in the local knowledge base
+    
+    The hashing embedder takes well under a millisecond and runs inline; a
+    sentence-transformers model runs in a worker thread so the event loop
+    keeps serving other turns meanwhile.
+    
+    Args:
+        user_message: User's message
+    
+    Returns:
+        Matching passages, best first (empty without a knowledge base)
+    """
+    if not knowledge_base:
+        return []
+    if knowledge_base.embedder.name == HashingEmbedder.name:
+        return knowledge_base.search(user_message)
+    return await asyncio.to_thread(knowledge_base.search, user_message)
+
+# Speculative searches still running
+_speculative_searches = set()
+
+async def start_web_search(user_message: str) -> Tuple[Optional[asyncio.Task], Optional[List[Dict]]]:
+    """
+    Start the web search for a message speculatively, before the turn is routed
+    
+    No task is started when a Gemini turn for this message would not
+    search. The task is never cancelled: if the turn ends up not needing
+    it, its result still warms the search cache. Knowledge-base passages
+    looked up to decide are returned so the turn does not embed the
+    message twice.
+    
+    Args:
+        user_message: User's message
+    
+    Returns:
+        Tuple of (task resolving to the search results or None, passages
+        or None if they were not needed)
+    """
+    if not should_search(user_message):
+        return None, None
+    passages = await retrieve_passages(user_message)
+    if _answered_locally(passages):
+        return None, passages
+    
+    task = asyncio.create_task(google_search(user_message, num_results=3))
+    # The event loop only keeps weak references to tasks
+    _speculative_searches.add(task)
+    task.add_done_callback(_speculative_searches.discard)
+    return task, passages
+
+async def _prepare_prompt(
+    user_message: str,
+    chat_history: List[Dict[str, str]],
+    enable_search: bool,
+    search_task: Optional[asyncio.Task] = None,
+    summary: Optional[str] = None,
+    passages: Optional[List[Dict]] = None
+) -> Tuple[List[Dict[str, str]], str, List[Dict[str, str]]]:
+    """
+    Build the Gemini history and the grounded (and optionally search-augmented) message
+    
+    Website passages from the local knowledge base are always added when
+    relevant; a strong local match also makes the remote search unnecessary.
+    The result is trimmed to the prompt token budget (see build_prompt).
+    
+    Args:
+        user_message: User's message
+        chat_history: Previous conversation history
+        enable_search: Whether to perform web search for augmentation
+        search_task: Search already started by start_web_search, if any
+        summary: Rolling summary of the messages before chat_history
+        passages: Knowledge-base passages start_web_search already looked up
+    
+    Returns:
+        Tuple of (formatted_history, enhanced_message, sources)
+    """
+    search_results = []
+    
+    if passages is None:
+        passages = await retrieve_passages(user_message)
+    
+    # Perform web search if enabled and query seems to need external info
+    if enable_search and not _answered_locally(passages) and should_search(user_message):
+        if search_task is not None:
+            search_results = await search_task
+        else:
+            search_results = await google_search(user_message, num_results=3)
+    
+    prompt = build_prompt(
+        user_message,
+        format_chat_history(chat_history),
+        passages,
+        search_results or [],
+        summary=summary,
+        reserved_tokens=SYSTEM_PROMPT_TOKENS
+    )
+    prompt_stats.record_prompt(prompt)
+    
+    return prompt.history, prompt.message, prompt.sources
+
+def _record_usage(response, usage: Optional[Dict]):
+    """Add the token counts Gemini reported to the aggregate and the caller's ``usage``"""
+    counts = usage_from_response(response)
+    if counts is None:
+        return
+    prompt_tokens, output_tokens = counts
+    prompt_stats.record_usage(prompt_tokens, output_tokens)
+    if usage is not None:
+        usage["prompt_tokens"] = usage.get("prompt_tokens", 0) + prompt_tokens
+        usage["output_tokens"] = usage.get("output_tokens", 0) + output_tokens
+
 async def generate_response(
     user_message: str,
     chat_history: List[Dict[str, str]],
-    enable_search: bool = True
+    enable_search: bool = True,
+    search_task: Optional[asyncio.Task] = None,
+    usage: Optional[Dict[str, int]] = None,
+    summary: Optional[str] = None,
+    passages: Optional[List[Dict]] = None
 ) -> Tuple[str, List[Dict[str, str]]]:
     """
     Generate a response using Google Gemini
@@ -100,46 +453,242 @@ async def generate_response(
         user_message: User's message
         chat_history: Previous conversation history
         enable_search: Whether to perform web search for augmentation
+        search_task: Search already started by start_web_search, if any
+        usage: Output dict that receives prompt_tokens and output_tokens
+        summary: Rolling summary of the messages before chat_history
+        passages: Knowledge-base passages from start_web_search, if any
     
     Returns:
         Tuple of (response_text, sources)
     """
-    sources = []
-    search_context = ""
+    cache_key = _response_cache_key(user_message, chat_history, enable_search, summary)
+    if cache_key:
+        cached = response_cache.lookup(cache_key)
+        if cached is not None:
+            return cached
     
-    # Perform web search if enabled and query seems to need external info
-    if enable_search and should_search(user_message):
-        search_results = google_search(user_message, num_results=3)
-        if search_results:
-            search_context = format_search_context(search_results)
-            sources = search_results
+    if gemini_breaker.rejects():
+        return ERROR_RESPONSE, []
+    
+    formatted_history, enhanced_message, sources = await _prepare_prompt(
+        user_message, chat_history, enable_search, search_task, summary, passages
+    )
     
     try:
-        # Format history for Gemini
-        formatted_history = format_chat_history(chat_history)
-        
-        # Prepare the message with optional search context
-        enhanced_message = user_message
-        if search_context:
-            enhanced_message = f"{search_context}\n\nUser question: {user_message}"
-        
-        # If no history, generate directly; otherwise use chat
-        if not formatted_history:
-            response = model.generate_content(enhanced_message)
-            response_text = response.text
-        else:
-            chat = model.start_chat(history=formatted_history)
-            response = chat.send_message(enhanced_message)
-            response_text = response.text
+        if GEMINI_API_ENDPOINT:
+            _bind_gemini_endpoint()
+        deadline = time.monotonic() + gemini_pool.timeout
+        async with gemini_pool.slot(deadline):
+            with gemini_breaker.guard():
+                # If no history, generate directly; otherwise use chat
+                if not formatted_history:
+                    call = model.generate_content_async(enhanced_message)
+                else:
+                    chat = model.start_chat(history=formatted_history)
+                    call = chat.send_message_async(enhanced_message)
+                response = await asyncio.wait_for(call, _remaining(deadline))
         
+        _record_usage(response, usage)
+        response_text = response.text
+        if cache_key:
+            response_cache.store(cache_key, response_text, sources)
         return response_text, sources
     
+    except asyncio.TimeoutError:
+        print(f"Gemini call exceeded {gemini_pool.timeout}s deadline")
+        return ERROR_RESPONSE, []
+    
+    except CircuitOpenError:
+        return ERROR_RESPONSE, []
+    
     except Exception as e:
         # Print full traceback to aid debugging when the model call fails
         import traceback
         print(f"Error generating response: {e}")
         traceback.print_exc()
-        return "I apologize, but I encountered an error processing your request. Please try again.", []
+        return ERROR_RESPONSE, []
+
+async def _read_stream(
+    formatted_history: List[Dict],
+    enhanced_message: str,
+    sources: List[Dict[str, str]],
+    search_sources: List[Dict[str, str]],
+    chunks: asyncio.Queue
+):
+    """
+    Read a Gemini stream into ``chunks``, ending it with None
+    
+    Runs apart from the client so the pool slot and the breaker's timing
+    cover Gemini alone: both are released once the last chunk has arrived,
+    however slowly the client reads.
+    
+    Returns:
+        The last chunk carrying usage metadata (complete there), if any
+    """
+    usage_chunk = None
+    try:
+        deadline = time.monotonic() + gemini_pool.timeout
+        async with gemini_pool.slot(deadline):
+            with gemini_breaker.guard():
+                # If no history, generate directly; otherwise use chat
+                if not formatted_history:
+                    call = model.generate_content_async(enhanced_message, stream=True)
+                else:
+                    chat = model.start_chat(history=formatted_history)
+                    call = chat.send_message_async(enhanced_message, stream=True)
+                response = await asyncio.wait_for(call, _remaining(deadline))
+                
+                sources.extend(search_sources)
+                stream = response.__aiter__()
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(stream.__anext__(), _remaining(deadline))
+                    except StopAsyncIteration:
+                        break
+                    if getattr(chunk, "usage_metadata", None):
+                        usage_chunk = chunk
+                    if chunk.text:
+                        chunks.put_nowait(chunk.text)
+    finally:
+        chunks.put_nowait(None)
+    return usage_chunk
+
+async def generate_response_stream(
+    user_message: str,
+    chat_history: List[Dict[str, str]],
+    sources: List[Dict[str, str]],
+    enable_search: bool = True,
+    search_task: Optional[asyncio.Task] = None,
+    usage: Optional[Dict[str, int]] = None,
+    summary: Optional[str] = None,
+    passages: Optional[List[Dict]] = None
+) -> AsyncIterator[str]:
+    """
+    Stream a response from Google Gemini chunk by chunk
+    
+    Search sources are appended to the caller-supplied ``sources`` list before
+    the first chunk is yielded, so they are available once the stream ends.
+    
+    Args:
+        user_message: User's message
+        chat_history: Previous conversation history
+        sources: Output list that receives the search sources
+        enable_search: Whether to perform web search for augmentation
+        search_task: Search already started by start_web_search, if any
+        usage: Output dict that receives prompt_tokens and output_tokens
+        summary: Rolling summary of the messages before chat_history
+        passages: Knowledge-base passages from start_web_search, if any
+    
+    Yields:
+        Text chunks as Gemini produces them
+    """
+    cache_key = _response_cache_key(user_message, chat_history, enable_search, summary)
+    if cache_key:
+        cached = response_cache.lookup(cache_key)
+        if cached is not None:
+            answer, cached_sources = cached
+            sources.extend(cached_sources)
+            yield answer
+            return
+    
+    if gemini_breaker.rejects():
+        yield ERROR_RESPONSE
+        return
+    
+    formatted_history, enhanced_message, search_sources = await _prepare_prompt(
+        user_message, chat_history, enable_search, search_task, summary, passages
+    )
+    
+    parts = []
+    emitted = False
+    try:
+        if GEMINI_API_ENDPOINT:
+            _bind_gemini_endpoint()
+        chunks: asyncio.Queue = asyncio.Queue()
+        producer = asyncio.create_task(
+            _read_stream(formatted_history, enhanced_message, sources, search_sources, chunks)
+        )
+        try:
+            while (text := await chunks.get()) is not None:
+                emitted = True
+                parts.append(text)
+                yield text
+            usage_chunk = await producer
+        finally:
+            # The client went away mid-stream: stop reading from Gemini
+            producer.cancel()
+        
+        if usage_chunk is not None:
+            _record_usage(usage_chunk, usage)
+        if cache_key:
+            response_cache.store(cache_key, "".join(parts), sources)
+    
+    except asyncio.TimeoutError:
+        print(f"Gemini stream exceeded {gemini_pool.timeout}s deadline")
+        sources.clear()
+        if not emitted:
+            yield ERROR_RESPONSE
+    
+    except CircuitOpenError:
+        yield ERROR_RESPONSE
+    
+    except Exception as e:
+        import traceback
+        print(f"Error streaming response: {e}")
+        traceback.print_exc()
+        # Sources only make sense alongside a real answer
+        sources.clear()
+        if not emitted:
+            yield ERROR_RESPONSE
+
+async def summarize_messages(
+    summary: Optional[str],
+    messages: List[Dict[str, str]],
+    usage: Optional[Dict[str, int]] = None
+) -> Optional[str]:
+    """
+    Fold messages into the rolling conversation summary
+    
+    Runs on the same pool and breaker as the chat calls, but nothing waits
+    for it: a failure just leaves the summary as it was.
+    
+    Args:
+        summary: Current summary, if any
+        messages: Messages to fold in, oldest first
+        usage: Output dict that receives prompt_tokens and output_tokens
+    
+    Returns:
+        The updated summary, or None if it could not be generated
+    """
+    if gemini_breaker.rejects():
+        return None
+    
+    transcript = "\n".join(
+        f"{'Visitor' if msg['role'] == 'user' else 'Assistant'}: "
+        f"{truncate_to_tokens(msg['content'], PROMPT_MAX_MESSAGE_TOKENS)[0]}"
+        for msg in messages
+    )
+    prompt = f"Current summary:\n{summary or '(none yet)'}\n\nNew messages:\n{transcript}"
+    
+    try:
+        if GEMINI_API_ENDPOINT:
+            _bind_gemini_endpoint()
+        deadline = time.monotonic() + gemini_pool.timeout
+        async with gemini_pool.slot(deadline):
+            with gemini_breaker.guard():
+                response = await asyncio.wait_for(
+                    summary_model.generate_content_async(prompt), _remaining(deadline)
+                )
+        
+        _record_usage(response, usage)
+        return response.text.strip() or None
+    
+    except CircuitOpenError:
+        return None
+    
+    except Exception as e:
+        print(f"⚠️  Conversation summary not updated: {type(e).__name__}: {e}")
+        return None
 
 def should_search(message: str) -> bool:
     """
@@ -151,13 +700,4 @@ def should_search(message: str) -> bool:
     Returns:
         Boolean indicating if search should be performed
     """
-    # Keywords that might indicate need for external search
-    search_keywords = [
-        "latest", "recent", "news", "update", "current",
-        "2024", "2025", "today", "now",
-        "price", "cost", "compare", "vs", "versus",
-        "best", "top", "trending"
-    ]
-    
-    message_lower = message.lower()
-    return any(keyword in message_lower for keyword in search_keywords)
+    return route_message(message).search
@@ -2,24 +2,43 @@
 FastAPI backend for Absolute App Labs chatbot
 Powered by Google Gemini 2.0 Flash
 """
-from fastapi import FastAPI, HTTPException, Depends, Request
+from fastapi import FastAPI, HTTPException, Depends, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse
 from pydantic import BaseModel
 from typing import List, Optional, Dict
+import asyncio
 import uuid
 import json
 from datetime import datetime
-from sqlalchemy.orm import Session
+from sqlalchemy import select, delete, update, inspect
+from sqlalchemy.ext.asyncio import AsyncSession
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 
-from config import API_HOST, API_PORT, CORS_ORIGINS, RATE_LIMIT_PER_MINUTE
-from database import init_db, get_db, ChatSession, ChatMessage
-from llm import generate_response
+from config import API_HOST, API_PORT, CORS_ORIGINS, RATE_LIMIT_PER_MINUTE, MAX_HISTORY_LENGTH, LOG_STAGE_TIMINGS
+from database import init_db, get_async_db, AsyncSessionLocal, async_engine, ChatSession, ChatMessage, ArchivedSession, LeadOutbox
+from llm import generate_response, generate_response_stream, start_web_search, gemini_pool, response_cache
 from conversation_state import ConversationState, ConversationStage
 from lead_collector import LeadCollector
+from history_cache import history_cache
+from state_cache import state_cache
+from search import close_search_client, get_search_stats
+from timing import StageTimer
+from write_behind import write_queue, PendingTurn
+from session_sweeper import session_sweeper
+from session_archive import session_archive, session_archiver
+from lead_outbox import lead_worker, outbox_row
+from hubspot_integration import hubspot_client
+from circuit_breaker import get_breaker_stats
+from prompt_builder import prompt_stats
+from summarizer import summarizer
+from shared_state import (
+    SHARED, check_shared_state, close_shared_state, get_shared_state_stats,
+    limiter_storage_options, limiter_storage_uri
+)
+import metrics
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -28,8 +47,18 @@ app = FastAPI(
     version="1.0.0"
 )
 
-# Initialize rate limiter
-limiter = Limiter(key_func=get_remote_address)
+# Initialize rate limiter (counters are shared by all workers with the redis
+# backend; if that storage fails, each worker falls back to its own counters,
+# and a request that hits the failure is let through rather than failed)
+storage_uri = limiter_storage_uri()
+remote_storage = not storage_uri.startswith("memory://")
+limiter = Limiter(
+    key_func=get_remote_address,
+    storage_uri=storage_uri,
+    storage_options=limiter_storage_options(),
+    in_memory_fallback_enabled=remote_storage,
+    swallow_errors=remote_storage
+)
 app.state.limiter = limiter
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 
@@ -42,18 +71,79 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Count in-flight requests, including streams that are still sending
+app.add_middleware(metrics.MetricsMiddleware)
+
 # Initialize database
 @app.on_event("startup")
 async def startup_event():
     """Initialize database on startup"""
     init_db()
     print("Database initialized")
+    if SHARED:
+        await check_shared_state()
+    if write_queue:
+        write_queue.start()
+        print(f"✓ Write-behind enabled ({write_queue.durability} durability)")
+    if lead_worker:
+        lead_worker.start()
+        print("✓ Lead outbox worker started")
+    if session_archiver:
+        session_archiver.start()
+        print(f"✓ Session archiver enabled (idle {session_archiver.idle_seconds}s, {session_archive.compression})")
+    if session_sweeper:
+        session_sweeper.start()
+        print(f"✓ Session sweeper enabled (timeout {session_sweeper.timeout}s)")
+    if summarizer:
+        summarizer.start()
+        print(f"✓ Conversation summaries enabled ({summarizer.workers} workers)")
     print(f"Server starting on {API_HOST}:{API_PORT}")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop background tasks, flush queued writes and release pooled connections"""
+    if summarizer:
+        await summarizer.stop()
+    if session_sweeper:
+        await session_sweeper.stop()
+    if session_archiver:
+        await session_archiver.stop()
+    if lead_worker:
+        await lead_worker.stop()
+    if write_queue:
+        await write_queue.stop()
+    await close_search_client()
+    await close_shared_state()
+    if hubspot_client:
+        hubspot_client.close()
+    await async_engine.dispose()
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
-    return {"status": "healthy", "service": "absolute-app-labs-chatbot"}
+    return {
+        "status": "healthy",
+        "service": "absolute-app-labs-chatbot",
+        "llm_pool": gemini_pool.stats(),
+        "prompt": prompt_stats.stats(),
+        "history_cache": history_cache.stats() if history_cache else None,
+        "state_cache": state_cache.stats() if state_cache else None,
+        "response_cache": response_cache.stats() if response_cache else None,
+        "search": get_search_stats(),
+        "shared_state": get_shared_state_stats(),
+        "write_behind": write_queue.stats() if write_queue else None,
+        "session_sweeper": session_sweeper.stats() if session_sweeper else None,
+        "session_archiver": session_archiver.stats() if session_archiver else None,
+        "lead_outbox": lead_worker.stats() if lead_worker else None,
+        "summarizer": summarizer.stats() if summarizer else None,
+        "hubspot": hubspot_client.stats() if hubspot_client else None,
+        "circuit_breakers": get_breaker_stats()
+    }
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Stage latency histograms, turn counts and in-flight requests for Prometheus"""
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
 
 # Request/Response models
 class ChatRequest(BaseModel):
@@ -72,6 +162,19 @@ class SessionInfo(BaseModel):
     session_id: str
     created_at: str
     message_count: int
+    last_message_at: Optional[str] = None
+    archived: bool = False
+    # Gemini token usage (not kept in the archive index)
+    prompt_tokens: Optional[int] = None
+    output_tokens: Optional[int] = None
+
+class LeadStatus(BaseModel):
+    session_id: str
+    status: str  # 'queued', 'success' or 'failed'
+    contact_id: Optional[str] = None
+    attempts: int = 0
+    message: Optional[str] = None  # Last delivery error, if any
+    updated_at: Optional[str] = None
 
 # Health check endpoint
 @app.get("/")
@@ -83,17 +186,317 @@ async def root():
         "model": "Google Gemini 2.0 Flash"
     }
 
+async def _get_or_create_session(db: AsyncSession, request: Request, session_id: Optional[str]) -> ChatSession:
+    """Load the chat session, creating it if the ID is new or unknown"""
+    if session_id:
+        if write_queue:
+            # Read-your-writes: the previous turn may still be queued
+            await write_queue.wait_for_session(session_id)
+        session = await db.get(ChatSession, session_id)
+        if session:
+            return session
+        # A returning user of an archived conversation keeps their state
+        session = await session_archive.restore_session(db, session_id, get_remote_address(request))
+        if session:
+            return session
+        # Session doesn't exist (maybe expired or DB was reset)
+        # Create a new session with the provided ID
+    else:
+        session_id = str(uuid.uuid4())
+    
+    session = ChatSession(
+        id=session_id,
+        ip_address=get_remote_address(request)
+    )
+    if write_queue:
+        # Inserted by the writer together with the turn's messages
+        return session
+    db.add(session)
+    await db.commit()
+    return session
+
+async def _load_chat_history(db: AsyncSession, session_id: str) -> List[Dict[str, str]]:
+    """Get the last MAX_HISTORY_LENGTH messages of a session for context"""
+    if history_cache:
+        cached = history_cache.get(session_id)
+        if cached is not None:
+            return cached
+    
+    if write_queue:
+        await write_queue.wait_for_session(session_id)
+    
+    # Newest first so LIMIT bounds the read, then flip back to chronological
+    result = await db.execute(
+        select(ChatMessage.role, ChatMessage.content)
+        .where(ChatMessage.session_id == session_id)
+        .order_by(ChatMessage.timestamp.desc(), ChatMessage.id.desc())
+        .limit(MAX_HISTORY_LENGTH)
+    )
+    messages = result.all()
+    
+    chat_history = [
+        {
+            "role": msg.role,
+            "content": msg.content
+        }
+        for msg in reversed(messages)
+    ]
+    
+    if history_cache:
+        history_cache.fill(session_id, chat_history)
+    return chat_history
+
+async def _save_turn(
+    db: AsyncSession,
+    turn: "TurnContext",
+    user_text: str,
+    response_text: str,
+    sources: List[Dict[str, str]]
+):
+    """Persist both sides of a turn and the updated conversation state"""
+    if write_queue:
+        # Return the pooled connection first: the writer needs one to commit
+        # this turn, and closing keeps the loaded session attributes intact
+        await db.close()
+        await _queue_turn(turn, user_text, response_text, sources)
+    else:
+        for attempt in range(2):
+            if await _write_turn(db, turn, user_text, response_text, sources):
+                break
+            # The session was swept or archived while the turn ran: never
+            # commit the messages without it, bring it back and write again
+            await db.rollback()
+            if history_cache:
+                history_cache.invalidate(turn.session_id)
+            if state_cache:
+                await state_cache.invalidate(turn.session_id)
+            if attempt:
+                raise RuntimeError(f"Session {turn.session_id} disappeared while saving the turn")
+            await _recreate_session(db, turn.session_id)
+        
+        await db.commit()
+    
+    if turn.lead_submission and lead_worker and not write_queue:
+        lead_worker.notify()
+    if history_cache:
+        history_cache.append(turn.session_id, "user", user_text)
+        history_cache.append(turn.session_id, "assistant", response_text)
+    if state_cache:
+        await state_cache.put(turn.session_id, turn.conv_state)
+    # A full window means older messages may be waiting to be summarized
+    if summarizer and not turn.lead_response and len(turn.chat_history) >= MAX_HISTORY_LENGTH:
+        summarizer.schedule(turn.session_id)
+
+async def _write_turn(
+    db: AsyncSession,
+    turn: "TurnContext",
+    user_text: str,
+    response_text: str,
+    sources: List[Dict[str, str]]
+) -> bool:
+    """
+    Add a turn's rows to the transaction, uncommitted
+    
+    Returns:
+        False if the session row no longer exists
+    """
+    # Save user message
+    user_message = ChatMessage(
+        session_id=turn.session_id,
+        role="user",
+        content=user_text
+    )
+    db.add(user_message)
+    
+    # Save assistant response
+    assistant_message = ChatMessage(
+        session_id=turn.session_id,
+        role="assistant",
+        content=response_text,
+        sources=json.dumps(sources) if sources else None
+    )
+    db.add(assistant_message)
+    
+    # A completed lead commits together with the turn that completed it
+    if turn.lead_submission:
+        db.add(LeadOutbox(**outbox_row(turn.session_id, turn.lead_submission)))
+    
+    # Update session state and counters (by key, the row itself is not
+    # loaded when the state came from the cache)
+    now = datetime.utcnow()
+    result = await db.execute(
+        update(ChatSession)
+        .where(ChatSession.id == turn.session_id)
+        .values(
+            conversation_state_bin=turn.conv_state.to_bytes(),
+            conversation_state=None,
+            message_count=ChatSession.message_count + 2,
+            prompt_tokens=ChatSession.prompt_tokens + turn.usage.get("prompt_tokens", 0),
+            output_tokens=ChatSession.output_tokens + turn.usage.get("output_tokens", 0),
+            last_message_at=now,
+            updated_at=now
+        )
+    )
+    return result.rowcount > 0
+
+async def _recreate_session(db: AsyncSession, session_id: str):
+    """Bring back a session that went away mid-turn, from the archive if it was archived"""
+    # The deleted row may still sit in the identity map under the same key
+    db.expunge_all()
+    if await session_archive.restore_session(db, session_id, None) is None:
+        db.add(ChatSession(id=session_id))
+        await db.commit()
+
+async def _queue_turn(
+    turn: "TurnContext",
+    user_text: str,
+    response_text: str,
+    sources: List[Dict[str, str]]
+):
+    """Hand a turn's writes to the write-behind queue"""
+    now = datetime.utcnow()
+    pending = PendingTurn(
+        session_id=turn.session_id,
+        messages=[
+            {"session_id": turn.session_id, "role": "user", "content": user_text,
+             "sources": None, "timestamp": now},
+            {"session_id": turn.session_id, "role": "assistant", "content": response_text,
+             "sources": json.dumps(sources) if sources else None, "timestamp": now}
+        ],
+        state_blob=turn.conv_state.to_bytes(),
+        is_new_session=turn.new_session is not None,
+        ip_address=turn.new_session.ip_address if turn.new_session is not None else None,
+        leads=[outbox_row(turn.session_id, turn.lead_submission, now)] if turn.lead_submission else None,
+        prompt_tokens=turn.usage.get("prompt_tokens", 0),
+        output_tokens=turn.usage.get("output_tokens", 0)
+    )
+    if turn.lead_submission and lead_worker:
+        # The worker can only see the lead once its batch is committed
+        pending.done.add_done_callback(lambda _: lead_worker.notify())
+    await write_queue.submit(pending)
+
+async def _discard_turn_state(session_id: Optional[str]):
+    """Forget cached state a failed turn may have changed but not saved"""
+    if state_cache and session_id:
+        await state_cache.invalidate(session_id)
+
+def _sse_event(event: str, data: Dict) -> str:
+    """Encode a single Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+class TurnContext:
+    """Everything a turn needs before the reply is generated"""
+    
+    def __init__(self, session_id, new_session, conv_state, lead_response, quick_replies, actions, lead_submission, chat_history, search_task, passages=None):
+        self.session_id = session_id
+        # Unsaved ChatSession the write-behind queue must insert, else None
+        self.new_session = new_session
+        self.conv_state = conv_state
+        self.lead_response = lead_response
+        self.quick_replies = quick_replies
+        self.actions = actions
+        # Lead for the outbox, saved with this turn
+        self.lead_submission = lead_submission
+        self.chat_history = chat_history
+        self.search_task = search_task
+        # Knowledge-base passages looked up at the start of the turn, if any
+        self.passages = passages
+        # Gemini token usage, filled in by the llm call
+        self.usage = {}
+
+async def _begin_turn(
+    db: AsyncSession,
+    request: Request,
+    chat_request: ChatRequest,
+    timer: StageTimer
+) -> TurnContext:
+    """
+    Load the session and state, run the lead collector and load history
+    
+    Once the state is known, a web search the message is likely to need is
+    started, so it runs while the history is being read. Only Q&A turns
+    search speculatively: messages during lead capture (names, numbers,
+    project descriptions) are never sent to Google. The result is simply not
+    used when the lead collector answers the turn. Sessions in the state
+    cache skip the session read and the JSON decode.
+    """
+    session_id = chat_request.session_id
+    new_session = None
+    conv_state = await state_cache.get(session_id) if state_cache and session_id else None
+    
+    if conv_state is None:
+        with timer.stage("session_load"):
+            session = await _get_or_create_session(db, request, session_id)
+        session_id = session.id
+        if inspect(session).transient:
+            new_session = session
+        
+        # Load conversation state
+        with timer.stage("state_decode"):
+            conv_state = ConversationState.from_stored(
+                session.conversation_state_bin, session.conversation_state
+            )
+        
+        # A returning visitor's next submission can skip the contact search
+        if hubspot_client and conv_state.hubspot_contact_id:
+            hubspot_client.remember_contact(
+                conv_state.hubspot_contact_id, conv_state.email, conv_state.whatsapp_number
+            )
+    
+    # Counted by the stage the message arrives in
+    metrics.turns_total.inc(stage=ConversationStage(conv_state.stage).value)
+    
+    search_task, passages = None, None
+    if conv_state.stage == ConversationStage.GENERAL_QA:
+        with timer.stage("retrieval"):
+            search_task, passages = await start_web_search(chat_request.message)
+        if search_task is not None:
+            search_task = asyncio.ensure_future(timer.track("search", search_task))
+    
+    # Process message through lead collector first
+    with timer.stage("lead_collector"):
+        lead_collector = LeadCollector(conv_state)
+        lead_response, quick_replies, actions = lead_collector.process_message(
+            chat_request.message
+        )
+    
+    # Get chat history for context (only Gemini turns use it)
+    chat_history = []
+    if not lead_response:
+        with timer.stage("history_load"):
+            chat_history = await _load_chat_history(db, session_id)
+    
+    return TurnContext(
+        session_id, new_session, conv_state, lead_response, quick_replies, actions,
+        lead_collector.lead_submission, chat_history, None if lead_response else search_task, passages
+    )
+
+async def _await_search(turn: TurnContext, timer: StageTimer):
+    """Wait for the speculative search so the llm stage times Gemini alone"""
+    if turn.search_task is not None:
+        with timer.stage("search_wait"):
+            await asyncio.wait({turn.search_task})
+
+def _log_timings(endpoint: str, timer: StageTimer, outcome: str):
+    """Record a turn's timings; called once per turn, whether it succeeded, failed or was cancelled"""
+    metrics.observe_turn(endpoint, timer, outcome)
+    if LOG_STAGE_TIMINGS:
+        print(f"{endpoint} timings (ms, {outcome}): {timer.summary()}")
+
 # Chat endpoint
 @app.post("/api/chat", response_model=ChatResponse)
 @limiter.limit(f"{RATE_LIMIT_PER_MINUTE}/minute")
 async def chat(
     request: Request,
+    response: Response,
     chat_request: ChatRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Process a chat message with lead collection and return structured AI response
     
+    Per-stage timings are returned in the Server-Timing header.
+    
     Args:
         chat_request: Chat request with message and optional session_id
         db: Database session
@@ -101,113 +504,177 @@ async def chat(
     Returns:
         ChatResponse with text, sources, quick_replies, slots, actions, and session_id
     """
+    timer = StageTimer()
+    outcome = "error"
     try:
-        # Get or create session
-        session_id = chat_request.session_id
-        session = None
-        
-        if not session_id:
-            session_id = str(uuid.uuid4())
-            # Create new session
-            session = ChatSession(
-                id=session_id,
-                ip_address=get_remote_address(request),
-                conversation_state="{}"  # Empty state for new session
-            )
-            db.add(session)
-            db.commit()
-        else:
-            # Verify session exists, create if not found
-            session = db.query(ChatSession).filter(ChatSession.id == session_id).first()
-            if not session:
-                # Session doesn't exist (maybe expired or DB was reset)
-                # Create a new session with the provided ID
-                session = ChatSession(
-                    id=session_id,
-                    ip_address=get_remote_address(request),
-                    conversation_state="{}"
-                )
-                db.add(session)
-                db.commit()
-        
-        # Load conversation state
-        state_data = json.loads(session.conversation_state or "{}")
-        conv_state = ConversationState(state_data)
-        
-        # Initialize lead collector
-        lead_collector = LeadCollector(conv_state)
-        
-        # Process message through lead collector first
-        lead_response, quick_replies, actions = lead_collector.process_message(
-            chat_request.message
-        )
-        
-        # Get chat history for context
-        messages = db.query(ChatMessage).filter(
-            ChatMessage.session_id == session_id
-        ).order_by(ChatMessage.timestamp).all()
-        
-        chat_history = [
-            {
-                "role": msg.role,
-                "content": msg.content
-            }
-            for msg in messages
-        ]
+        turn = await _begin_turn(db, request, chat_request, timer)
         
         sources = []
         
         # If lead collector returned a response, use it
-        if lead_response:
-            response_text = lead_response
+        if turn.lead_response:
+            response_text = turn.lead_response
         else:
             # Otherwise, use Gemini for general Q&A
-            response_text, sources = await generate_response(
-                chat_request.message,
-                chat_history,
-                enable_search=True
-            )
-        
-        # Save user message
-        user_message = ChatMessage(
-            session_id=session_id,
-            role="user",
-            content=chat_request.message
-        )
-        db.add(user_message)
-        
-        # Save assistant response
-        assistant_message = ChatMessage(
-            session_id=session_id,
-            role="assistant",
-            content=response_text,
-            sources=json.dumps(sources) if sources else None
-        )
-        db.add(assistant_message)
+            await _await_search(turn, timer)
+            with timer.stage("llm"):
+                response_text, sources = await generate_response(
+                    chat_request.message,
+                    turn.chat_history,
+                    enable_search=True,
+                    search_task=turn.search_task,
+                    usage=turn.usage,
+                    summary=turn.conv_state.summary,
+                    passages=turn.passages
+                )
         
-        # Update session with new conversation state
-        session.conversation_state = json.dumps(conv_state.to_dict())
-        session.updated_at = datetime.utcnow()
+        slots = turn.conv_state.to_slots()
+        with timer.stage("commit"):
+            await _save_turn(
+                db, turn, chat_request.message,
+                response_text, sources
+            )
         
-        db.commit()
+        response.headers["Server-Timing"] = timer.server_timing()
+        outcome = "ok"
         
         return ChatResponse(
             text=response_text,
             sources=sources,
-            session_id=session_id,
-            quick_replies=quick_replies,
-            slots=conv_state.to_dict(),
-            actions=actions
+            session_id=turn.session_id,
+            quick_replies=turn.quick_replies,
+            slots=slots,
+            actions=turn.actions
         )
     
+    except asyncio.CancelledError:
+        outcome = "cancelled"
+        raise
+    
     except Exception as e:
-        db.rollback()
+        await db.rollback()
+        await _discard_turn_state(chat_request.session_id)
         print(f"Error in chat endpoint: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+    
+    finally:
+        _log_timings("/api/chat", timer, outcome)
+
+# Streaming chat endpoint
+@app.post("/api/chat/stream")
+@limiter.limit(f"{RATE_LIMIT_PER_MINUTE}/minute")
+async def chat_stream(
+    request: Request,
+    chat_request: ChatRequest
+):
+    """
+    Process a chat message and stream the reply as Server-Sent Events
+    
+    Emits a ``start`` event with the session_id, one ``token`` event per
+    Gemini chunk, and a final ``done`` event carrying the same fields as
+    ChatResponse. Messages are persisted once the stream has finished.
+    
+    Args:
+        chat_request: Chat request with message and optional session_id
+    
+    Returns:
+        text/event-stream response
+    """
+    timer = StageTimer()
+    # The session outlives this handler, so it is managed by the stream
+    # itself instead of a yield dependency
+    db = AsyncSessionLocal()
+    try:
+        turn = await _begin_turn(db, request, chat_request, timer)
+    except asyncio.CancelledError:
+        _log_timings("/api/chat/stream", timer, "cancelled")
+        await db.close()
+        raise
+    except Exception as e:
+        await db.rollback()
+        await db.close()
+        await _discard_turn_state(chat_request.session_id)
+        print(f"Error in chat stream endpoint: {e}")
+        _log_timings("/api/chat/stream", timer, "error")
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    async def event_stream():
+        saved = False
+        outcome = "error"
+        try:
+            yield _sse_event("start", {"session_id": turn.session_id})
+            
+            sources = []
+            if turn.lead_response:
+                response_text = turn.lead_response
+                yield _sse_event("token", {"text": response_text})
+            else:
+                parts = []
+                await _await_search(turn, timer)
+                with timer.stage("llm"):
+                    async for text in generate_response_stream(
+                        chat_request.message,
+                        turn.chat_history,
+                        sources,
+                        enable_search=True,
+                        search_task=turn.search_task,
+                        usage=turn.usage,
+                        summary=turn.conv_state.summary,
+                        passages=turn.passages
+                    ):
+                        parts.append(text)
+                        yield _sse_event("token", {"text": text})
+                response_text = "".join(parts)
+            
+            slots = turn.conv_state.to_slots()
+            with timer.stage("commit"):
+                await _save_turn(
+                    db, turn, chat_request.message,
+                    response_text, sources
+                )
+            saved = True
+            outcome = "ok"
+            
+            yield _sse_event("done", {
+                "text": response_text,
+                "sources": sources,
+                "session_id": turn.session_id,
+                "quick_replies": turn.quick_replies,
+                "slots": slots,
+                "actions": turn.actions,
+                "timings": timer.summary()
+            })
+        
+        except (asyncio.CancelledError, GeneratorExit):
+            # The client disconnected mid-stream
+            if not saved:
+                outcome = "cancelled"
+            raise
+        
+        except Exception as e:
+            await db.rollback()
+            print(f"Error in chat stream: {e}")
+            yield _sse_event("error", {"detail": str(e)})
+        
+        finally:
+            _log_timings("/api/chat/stream", timer, outcome)
+            # Also reached when the client disconnects mid-stream
+            if not saved:
+                await _discard_turn_state(turn.session_id)
+            await db.close()
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"  # Disable proxy buffering (nginx)
+        }
+    )
 
 # Get session info
 @app.get("/api/session/{session_id}", response_model=SessionInfo)
-async def get_session(session_id: str, db: Session = Depends(get_db)):
+async def get_session(session_id: str, db: AsyncSession = Depends(get_async_db)):
     """
     Get session information
     
@@ -218,23 +685,71 @@ async def get_session(session_id: str, db: Session = Depends(get_db)):
     Returns:
         Session information
     """
-    session = db.query(ChatSession).filter(ChatSession.id == session_id).first()
+    if write_queue:
+        await write_queue.wait_for_session(session_id)
+    session = await db.get(ChatSession, session_id)
     if not session:
-        raise HTTPException(status_code=404, detail="Session not found")
-    
-    message_count = db.query(ChatMessage).filter(
-        ChatMessage.session_id == session_id
-    ).count()
+        # Archived sessions are answered from their index row alone
+        archived = await db.get(ArchivedSession, session_id)
+        if not archived:
+            raise HTTPException(status_code=404, detail="Session not found")
+        return SessionInfo(
+            session_id=archived.session_id,
+            created_at=archived.created_at.isoformat() if archived.created_at else "",
+            message_count=archived.message_count,
+            last_message_at=archived.last_message_at.isoformat() if archived.last_message_at else None,
+            archived=True
+        )
     
     return SessionInfo(
         session_id=session.id,
         created_at=session.created_at.isoformat(),
-        message_count=message_count
+        message_count=session.message_count,
+        last_message_at=session.last_message_at.isoformat() if session.last_message_at else None,
+        prompt_tokens=session.prompt_tokens,
+        output_tokens=session.output_tokens
+    )
+
+# Lead delivery status
+@app.get("/api/lead/{session_id}", response_model=LeadStatus)
+async def get_lead_status(session_id: str, db: AsyncSession = Depends(get_async_db)):
+    """
+    Get the HubSpot delivery status of a session's latest lead
+    
+    The widget polls this after a turn returns a "queued" hubspot_upsert
+    action, until the status is "success" (with the contact id) or "failed".
+    
+    Args:
+        session_id: Session ID
+        db: Database session
+    
+    Returns:
+        Lead delivery status
+    """
+    if write_queue:
+        await write_queue.wait_for_session(session_id)
+    result = await db.execute(
+        select(LeadOutbox)
+        .where(LeadOutbox.session_id == session_id)
+        .order_by(LeadOutbox.id.desc())
+        .limit(1)
+    )
+    lead = result.scalar_one_or_none()
+    if not lead:
+        raise HTTPException(status_code=404, detail="No lead for this session")
+    
+    return LeadStatus(
+        session_id=lead.session_id,
+        status=lead.status,
+        contact_id=lead.contact_id,
+        attempts=lead.attempts,
+        message=lead.last_error,
+        updated_at=lead.updated_at.isoformat() if lead.updated_at else None
     )
 
 # Reset session
 @app.delete("/api/session/{session_id}")
-async def reset_session(session_id: str, db: Session = Depends(get_db)):
+async def reset_session(session_id: str, db: AsyncSession = Depends(get_async_db)):
     """
     Delete a session and all its messages
     
@@ -245,13 +760,25 @@ async def reset_session(session_id: str, db: Session = Depends(get_db)):
     Returns:
         Success message
     """
+    if write_queue:
+        # Queued turns must not recreate the session after it is deleted
+        await write_queue.wait_for_session(session_id)
+    
     # Delete messages
-    db.query(ChatMessage).filter(ChatMessage.session_id == session_id).delete()
+    await db.execute(delete(ChatMessage).where(ChatMessage.session_id == session_id))
     
     # Delete session
-    db.query(ChatSession).filter(ChatSession.id == session_id).delete()
+    await db.execute(delete(ChatSession).where(ChatSession.id == session_id))
+    
+    # Unlink any archived copy (segment files are append-only)
+    await db.execute(delete(ArchivedSession).where(ArchivedSession.session_id == session_id))
+    
+    await db.commit()
     
-    db.commit()
+    if history_cache:
+        history_cache.invalidate(session_id)
+    if state_cache:
+        await state_cache.invalidate(session_id)
     
     return {"message": "Session reset successfully"}
 
@@ -0,0 +1,99 @@
+"""
+Schema migrations for the SQLite chat database
+The applied schema version is kept in PRAGMA user_version
+"""
+import json
+from sqlalchemy import inspect
+from sqlalchemy.engine import Connection, Engine
+from conversation_state import ConversationState
+
+BACKFILL_BATCH_SIZE = 500
+
+
+def _add_column(conn: Connection, table: str, column: str, ddl: str):
+    """Add a column unless create_all already made it (fresh databases)"""
+    existing = {c["name"] for c in inspect(conn).get_columns(table)}
+    if column not in existing:
+        conn.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}")
+
+
+def _migrate_binary_state(conn: Connection):
+    """Store conversation state in the binary format, converting JSON rows"""
+    _add_column(conn, "chat_sessions", "conversation_state_bin", "BLOB")
+
+    # Committed batch by batch: the write lock is not held for the whole
+    # backfill, and an interrupted one resumes where it stopped
+
+    last_id = ""
+    while True:
+        rows = conn.exec_driver_sql(
+            "SELECT id, conversation_state FROM chat_sessions "
+            "WHERE id > ? AND conversation_state_bin IS NULL AND conversation_state IS NOT NULL "
+            "ORDER BY id LIMIT ?",
+            (last_id, BACKFILL_BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        converted = []
+        for session_id, text in rows:
+            try:
+                blob = ConversationState(json.loads(text or "{}")).to_bytes()
+            except (ValueError, TypeError, KeyError) as e:
+                # Left as JSON (KeyError: unknown or missing stage); the
+                # loader still falls back to it
+                print(f"⚠️  Session {session_id} state not converted: {e!r}")
+                continue
+            converted.append((blob, session_id))
+        if converted:
+            conn.exec_driver_sql(
+                "UPDATE chat_sessions SET conversation_state_bin = ?, conversation_state = NULL WHERE id = ?",
+                converted
+            )
+        conn.commit()
+        last_id = rows[-1][0]
+
+
+def _migrate_message_counters(conn: Connection):
+    """Add per-session message counters and drop redundant indexes"""
+    _add_column(conn, "chat_sessions", "message_count", "INTEGER NOT NULL DEFAULT 0")
+    _add_column(conn, "chat_sessions", "last_message_at", "DATETIME")
+
+    # Each correlated lookup is a range scan of ix_chat_messages_session_timestamp
+    conn.exec_driver_sql(
+        "UPDATE chat_sessions SET "
+        "message_count = (SELECT COUNT(*) FROM chat_messages m WHERE m.session_id = chat_sessions.id), "
+        "last_message_at = (SELECT MAX(m.timestamp) FROM chat_messages m WHERE m.session_id = chat_sessions.id)"
+    )
+
+    # A prefix of the composite index, and two copies of primary keys; each
+    # only added work to every insert
+    for index in ("ix_chat_messages_session_id", "ix_chat_messages_id", "ix_chat_sessions_id"):
+        conn.exec_driver_sql(f"DROP INDEX IF EXISTS {index}")
+
+
+def _migrate_token_usage(conn: Connection):
+    """Add per-session Gemini token usage counters"""
+    _add_column(conn, "chat_sessions", "prompt_tokens", "INTEGER NOT NULL DEFAULT 0")
+    _add_column(conn, "chat_sessions", "output_tokens", "INTEGER NOT NULL DEFAULT 0")
+
+
+# (version, migration) in the order they must be applied
+MIGRATIONS = [
+    (1, _migrate_binary_state),
+    (2, _migrate_message_counters),
+    (3, _migrate_token_usage),
+]
+
+
+def run_migrations(engine: Engine):
+    """Apply every migration newer than the database's schema version"""
+    with engine.connect() as conn:
+        current = conn.exec_driver_sql("PRAGMA user_version").scalar()
+        for version, migrate in MIGRATIONS:
+            if version <= current:
+                continue
+            migrate(conn)
+            # The version moves only once the whole migration is committed
+            conn.exec_driver_sql(f"PRAGMA user_version = {version}")
+            conn.commit()
+            print(f"✓ Applied migration {version}: {migrate.__doc__}")
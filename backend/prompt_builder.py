@@ -0,0 +1,270 @@
+"""
+Token-budgeted prompt assembly for Gemini
+Fits history, website passages and search results into PROMPT_TOKEN_BUDGET
+by priority, and keeps the token usage Gemini reports
+"""
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from config import PROMPT_TOKEN_BUDGET, PROMPT_MAX_MESSAGE_TOKENS
+from knowledge_base import format_knowledge_context
+from metrics import Counter, Histogram, registry
+from search import format_search_context
+
+# Gemini averages about four characters per token for English text; an
+# estimate is enough to bound the prompt without a countTokens round trip
+CHARS_PER_TOKEN = 4
+# Role and turn markers around each history message
+MESSAGE_OVERHEAD_TOKENS = 4
+# Context headings and the "User question:" line
+CONTEXT_OVERHEAD_TOKENS = 16
+# Newest history messages placed ahead of context (the last exchange,
+# which follow-up questions refer to)
+RECENT_MESSAGES = 2
+
+TRUNCATION_MARK = " [...]"
+
+prompt_tokens_estimated = registry.register(Histogram(
+    "gemini_prompt_estimated_tokens",
+    "Estimated input tokens of each assembled prompt",
+    buckets=(250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+))
+gemini_tokens_total = registry.register(Counter(
+    "gemini_tokens_total",
+    "Tokens reported by Gemini usage metadata",
+    ["kind"]
+))
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate token count of ``text``"""
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> Tuple[str, bool]:
+    """Cut ``text`` to about ``max_tokens`` tokens at a word boundary; (text, truncated)"""
+    if max_tokens <= 0 or estimate_tokens(text) <= max_tokens:
+        return text, False
+    limit = max_tokens * CHARS_PER_TOKEN - len(TRUNCATION_MARK)
+    cut = text[:limit]
+    space = cut.rfind(" ")
+    if space > limit // 2:
+        cut = cut[:space]
+    return cut + TRUNCATION_MARK, True
+
+
+def _history_tokens(message: Dict) -> int:
+    return estimate_tokens(message["parts"][0]) + MESSAGE_OVERHEAD_TOKENS
+
+
+def _passage_tokens(passage: Dict) -> int:
+    return estimate_tokens(passage["title"]) + estimate_tokens(passage["text"]) + MESSAGE_OVERHEAD_TOKENS
+
+
+def _result_tokens(result: Dict) -> int:
+    return (
+        estimate_tokens(result["title"]) + estimate_tokens(result["snippet"])
+        + estimate_tokens(result["link"]) + MESSAGE_OVERHEAD_TOKENS
+    )
+
+
+class Prompt:
+    """An assembled Gemini request and what was left out of it"""
+
+    __slots__ = ("history", "message", "sources", "estimated_tokens",
+                 "history_dropped", "context_dropped", "message_truncated")
+
+    def __init__(self, history, message, sources, estimated_tokens,
+                 history_dropped=0, context_dropped=0, message_truncated=False):
+        self.history = history
+        self.message = message
+        # Search results that made it into the prompt
+        self.sources = sources
+        self.estimated_tokens = estimated_tokens
+        self.history_dropped = history_dropped
+        self.context_dropped = context_dropped
+        self.message_truncated = message_truncated
+
+    @property
+    def trimmed(self) -> bool:
+        return bool(self.history_dropped or self.context_dropped or self.message_truncated)
+
+
+def build_prompt(
+    user_message: str,
+    history: List[Dict],
+    passages: List[Dict],
+    search_results: List[Dict],
+    summary: Optional[str] = None,
+    reserved_tokens: int = 0,
+    budget: int = PROMPT_TOKEN_BUDGET,
+    max_message_tokens: int = PROMPT_MAX_MESSAGE_TOKENS
+) -> Prompt:
+    """
+    Fit a turn into the input-token budget
+
+    The question always goes in, cut to ``max_message_tokens`` and to the
+    room the budget leaves. The rest is added while it fits, in priority
+    order: the last exchange, the summary of earlier messages, website
+    passages and search results by rank, then older history newest first.
+    History is only ever dropped from the oldest end.
+
+    Args:
+        user_message: User's message
+        history: Gemini-formatted history (format_chat_history), oldest first
+        passages: Knowledge-base passages, best first
+        search_results: Web search results, best first
+        summary: Rolling summary of the messages before ``history``
+        reserved_tokens: Tokens already taken (the system instruction)
+        budget: Input-token budget, 0 for unlimited
+        max_message_tokens: Longest user message kept, 0 for unlimited
+
+    Returns:
+        Prompt with the history and message to send
+    """
+    used = reserved_tokens + MESSAGE_OVERHEAD_TOKENS
+    if summary or passages or search_results:
+        used += CONTEXT_OVERHEAD_TOKENS
+    if budget:
+        # Whatever room the budget leaves also bounds the question
+        room = max(budget - used, 1)
+        max_message_tokens = min(max_message_tokens, room) if max_message_tokens else room
+    message, truncated = truncate_to_tokens(user_message, max_message_tokens)
+    used += estimate_tokens(message)
+
+    def fits(tokens: int) -> bool:
+        return not budget or used + tokens <= budget
+
+    # Newest first, so a message that does not fit ends the history
+    kept_history = 0
+    history_open = True
+    newest = list(reversed(history))
+
+    def take_history(limit: int):
+        nonlocal used, kept_history, history_open
+        while history_open and kept_history < min(limit, len(newest)):
+            tokens = _history_tokens(newest[kept_history])
+            if not fits(tokens):
+                history_open = False
+                break
+            used += tokens
+            kept_history += 1
+
+    take_history(RECENT_MESSAGES)
+
+    kept_summary = None
+    if summary:
+        tokens = estimate_tokens(summary) + MESSAGE_OVERHEAD_TOKENS
+        if fits(tokens):
+            used += tokens
+            kept_summary = summary
+
+    kept_passages = []
+    for passage in passages:
+        tokens = _passage_tokens(passage)
+        if fits(tokens):
+            used += tokens
+            kept_passages.append(passage)
+
+    kept_results = []
+    for result in search_results:
+        tokens = _result_tokens(result)
+        if fits(tokens):
+            used += tokens
+            kept_results.append(result)
+
+    take_history(len(newest))
+
+    context_parts = []
+    if kept_summary:
+        context_parts.append(f"Summary of the earlier conversation:\n{kept_summary}\n")
+    if kept_passages:
+        context_parts.append(format_knowledge_context(kept_passages))
+    if kept_results:
+        context_parts.append(format_search_context(kept_results))
+    if context_parts:
+        context = "\n".join(context_parts)
+        message = f"{context}\n\nUser question: {message}"
+
+    return Prompt(
+        history=history[len(history) - kept_history:],
+        message=message,
+        sources=kept_results,
+        estimated_tokens=used,
+        history_dropped=len(history) - kept_history,
+        context_dropped=(
+            len(passages) + len(search_results) - len(kept_passages) - len(kept_results)
+            + bool(summary and not kept_summary)
+        ),
+        message_truncated=truncated
+    )
+
+
+def usage_from_response(response) -> Optional[Tuple[int, int]]:
+    """(prompt_tokens, output_tokens) from a Gemini response or final stream chunk, if reported"""
+    usage = getattr(response, "usage_metadata", None)
+    if not usage or not getattr(usage, "prompt_token_count", 0):
+        return None
+    return usage.prompt_token_count, getattr(usage, "candidates_token_count", 0)
+
+
+class PromptStats:
+    """Prompt sizes and trimming, and the token usage Gemini reported, in aggregate"""
+
+    def __init__(self, budget: int = PROMPT_TOKEN_BUDGET):
+        self.budget = budget
+        self._lock = threading.Lock()
+        self.prompts = 0
+        self.trimmed_prompts = 0
+        self.history_dropped = 0
+        self.context_dropped = 0
+        self.messages_truncated = 0
+        self.estimated_tokens = 0
+        self.max_estimated_tokens = 0
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.output_tokens = 0
+
+    def record_prompt(self, prompt: Prompt):
+        prompt_tokens_estimated.observe(prompt.estimated_tokens)
+        with self._lock:
+            self.prompts += 1
+            self.trimmed_prompts += prompt.trimmed
+            self.history_dropped += prompt.history_dropped
+            self.context_dropped += prompt.context_dropped
+            self.messages_truncated += prompt.message_truncated
+            self.estimated_tokens += prompt.estimated_tokens
+            self.max_estimated_tokens = max(self.max_estimated_tokens, prompt.estimated_tokens)
+
+    def record_usage(self, prompt_tokens: int, output_tokens: int):
+        gemini_tokens_total.inc(prompt_tokens, kind="prompt")
+        gemini_tokens_total.inc(output_tokens, kind="output")
+        with self._lock:
+            self.calls += 1
+            self.prompt_tokens += prompt_tokens
+            self.output_tokens += output_tokens
+
+    def stats(self) -> Dict:
+        """Snapshot of prompt and usage metrics"""
+        with self._lock:
+            return {
+                "budget": self.budget,
+                "prompts": self.prompts,
+                "trimmed_prompts": self.trimmed_prompts,
+                "history_dropped": self.history_dropped,
+                "context_dropped": self.context_dropped,
+                "messages_truncated": self.messages_truncated,
+                "avg_estimated_tokens": round(self.estimated_tokens / self.prompts, 1) if self.prompts else 0.0,
+                "max_estimated_tokens": self.max_estimated_tokens,
+                "usage": {
+                    "calls": self.calls,
+                    "prompt_tokens": self.prompt_tokens,
+                    "output_tokens": self.output_tokens,
+                    "avg_prompt_tokens": round(self.prompt_tokens / self.calls, 1) if self.calls else 0.0,
+                    "avg_output_tokens": round(self.output_tokens / self.calls, 1) if self.calls else 0.0
+                }
+            }
+
+
+# Global prompt and token usage metrics
+prompt_stats = PromptStats()
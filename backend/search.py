@@ -1,18 +1,96 @@
 """
 Google Custom Search integration for query augmentation
 """
-import requests
-from typing import List, Dict, Optional
-from cachetools import TTLCache
-from config import GOOGLE_API_KEY, GOOGLE_CSE_ID
+import asyncio
+import httpx
+from typing import Dict, List, Optional
+from config import (
+    GOOGLE_API_KEY, GOOGLE_CSE_ID,
+    SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL, SEARCH_NEGATIVE_CACHE_TTL,
+    SEARCH_TIMEOUT, SEARCH_MAX_CONNECTIONS, SEARCH_SLOW_CALL_SECONDS, GOOGLE_SEARCH_URL
+)
+from circuit_breaker import CircuitOpenError, create_breaker
+from shared_state import shared_cache
 
-# Cache search results for 30 minutes
-search_cache = TTLCache(maxsize=100, ttl=1800)
+SEARCH_URL = GOOGLE_SEARCH_URL
 
-def google_search(query: str, num_results: int = 5) -> List[Dict[str, str]]:
+# Cache search results (30 minutes by default), shared by all workers with
+# the redis backend
+search_cache = shared_cache("search", SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL)
+
+# Remember failed queries briefly so an outage isn't hammered by retries
+failed_cache = shared_cache("search_failed", SEARCH_CACHE_SIZE, SEARCH_NEGATIVE_CACHE_TTL)
+
+# Queries with an upstream call in progress in this process; identical
+# queries await it
+_in_flight: Dict[str, asyncio.Future] = {}
+
+# Created lazily so it binds to the running event loop
+_client: Optional[httpx.AsyncClient] = None
+
+# Skips the API while it keeps failing or timing out
+search_breaker = create_breaker("google_search", SEARCH_SLOW_CALL_SECONDS)
+
+search_stats = {
+    "cache_hits": 0,
+    "negative_hits": 0,
+    "coalesced": 0,
+    "upstream_calls": 0,
+    "upstream_errors": 0,
+    "breaker_rejections": 0
+}
+
+def _get_client() -> httpx.AsyncClient:
+    """Shared keep-alive client for all search calls"""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=SEARCH_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=SEARCH_MAX_CONNECTIONS,
+                max_keepalive_connections=SEARCH_MAX_CONNECTIONS
+            )
+        )
+    return _client
+
+async def close_search_client():
+    """Close pooled connections (called on application shutdown)"""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+async def _fetch(query: str, num_results: int) -> List[Dict[str, str]]:
+    """Call the Custom Search API; raises on any failure"""
+    params = {
+        "q": query,
+        "key": GOOGLE_API_KEY,
+        "cx": GOOGLE_CSE_ID,
+        "num": min(num_results, 10)
+    }
+    
+    search_stats["upstream_calls"] += 1
+    response = await _get_client().get(SEARCH_URL, params=params)
+    response.raise_for_status()
+    data = response.json()
+    
+    results = []
+    for item in data.get("items", []):
+        results.append({
+            "title": item.get("title", ""),
+            "snippet": item.get("snippet", ""),
+            "link": item.get("link", "")
+        })
+    return results
+
+async def google_search(query: str, num_results: int = 5) -> List[Dict[str, str]]:
     """
     Perform Google Custom Search and return top results
     
+    Concurrent calls for the same query share a single upstream request,
+    and failures are cached briefly so they return immediately. While the
+    circuit breaker is open no request is made and no results are returned.
+    
     Args:
         query: Search query string
         num_results: Number of results to return (max 10)
@@ -22,41 +100,67 @@ def google_search(query: str, num_results: int = 5) -> List[Dict[str, str]]:
     """
     # Check cache first
     cache_key = f"{query}:{num_results}"
-    if cache_key in search_cache:
-        return search_cache[cache_key]
+    cached = await search_cache.get(cache_key)
+    if cached is not None:
+        search_stats["cache_hits"] += 1
+        return cached
+    
+    if await failed_cache.get(cache_key):
+        search_stats["negative_hits"] += 1
+        return []
     
     if not GOOGLE_CSE_ID:
         # Return empty if CSE not configured
         return []
     
+    if search_breaker.rejects():
+        search_stats["breaker_rejections"] += 1
+        return []
+    
+    # Single flight: join an identical request that is already running
+    pending = _in_flight.get(cache_key)
+    if pending is not None:
+        search_stats["coalesced"] += 1
+        return await asyncio.shield(pending)
+    
+    future = asyncio.get_running_loop().create_future()
+    _in_flight[cache_key] = future
+    results = []
+    error = None
     try:
-        url = "https://www.googleapis.com/customsearch/v1"
-        params = {
-            "q": query,
-            "key": GOOGLE_API_KEY,
-            "cx": GOOGLE_CSE_ID,
-            "num": min(num_results, 10)
-        }
-        
-        response = requests.get(url, params=params, timeout=5)
-        response.raise_for_status()
-        data = response.json()
-        
-        results = []
-        for item in data.get("items", []):
-            results.append({
-                "title": item.get("title", ""),
-                "snippet": item.get("snippet", ""),
-                "link": item.get("link", "")
-            })
-        
-        # Cache results
-        search_cache[cache_key] = results
-        return results
+        with search_breaker.guard() as call:
+            try:
+                results = await _fetch(query, num_results)
+            except Exception as e:
+                # Status errors embed the request URL, which carries the API key
+                error = f"HTTP {e.response.status_code}" if isinstance(e, httpx.HTTPStatusError) else str(e) or type(e).__name__
+                call.fail(error)
+        if error:
+            print(f"Error performing Google search: {error}")
+            search_stats["upstream_errors"] += 1
+            await failed_cache.set(cache_key, True)
+        else:
+            # Cache results
+            await search_cache.set(cache_key, results)
+    except CircuitOpenError:
+        # Another caller took the half-open probe; not the query's fault
+        search_stats["breaker_rejections"] += 1
+    finally:
+        # Release waiters even if this request was cancelled
+        del _in_flight[cache_key]
+        future.set_result(results)
     
-    except Exception as e:
-        print(f"Error performing Google search: {e}")
-        return []
+    return results
+
+def get_search_stats() -> Dict:
+    """Snapshot of search client metrics"""
+    return {
+        **search_stats,
+        "cached_queries": search_cache.size(),
+        "failed_queries": failed_cache.size(),
+        "in_flight": len(_in_flight),
+        "breaker": search_breaker.state
+    }
 
 def format_search_context(results: List[Dict[str, str]]) -> str:
     """
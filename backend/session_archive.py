@@ -0,0 +1,441 @@
+"""
+Cold storage for finished conversations
+Moves idle sessions and their messages into compressed NDJSON segment files
+"""
+import asyncio
+import gzip
+import json
+import os
+import re
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import select, delete
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import (
+    ARCHIVE_ENABLED, ARCHIVE_DIR, ARCHIVE_IDLE_SECONDS, ARCHIVE_INTERVAL,
+    ARCHIVE_BATCH_SIZE, ARCHIVE_COMPRESSION, ARCHIVE_SEGMENT_MAX_MB
+)
+from conversation_state import ConversationState, ConversationStage
+from database import AsyncSessionLocal, ChatSession, ChatMessage, ArchivedSession, LeadOutbox
+from history_cache import history_cache
+from lead_outbox import STATUS_QUEUED
+from state_cache import state_cache
+from write_behind import write_queue
+
+# Stages after which a conversation needs nothing more from the hot tables
+FINISHED_STAGES = (ConversationStage.LEAD_COMPLETE, ConversationStage.GENERAL_QA)
+
+# Compression name -> segment file extension
+EXTENSIONS = {"gzip": ".ndjson.gz", "zstd": ".ndjson.zst"}
+SEGMENT_PATTERN = re.compile(r"^segment-(\d+)\.ndjson\.(gz|zst)$")
+
+
+def _compress(compression: str, data: bytes) -> bytes:
+    if compression == "zstd":
+        import zstandard
+        return zstandard.ZstdCompressor(level=6).compress(data)
+    return gzip.compress(data, compresslevel=6)
+
+
+def _decompress(segment: str, data: bytes) -> bytes:
+    if segment.endswith(EXTENSIONS["zstd"]):
+        import zstandard
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+def _isoformat(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value else None
+
+
+def _parse_datetime(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if value else None
+
+
+class SessionArchive:
+    """
+    Append-only segment files plus the archived_sessions offset index
+
+    Every archiving batch is written as one compressed member (a gzip member
+    or zstd frame) holding one NDJSON line per session, appended to the
+    current segment. The index row of a session records the segment, byte
+    offset and length of its member, so reading one session decompresses a
+    single batch. Segments roll over at ``segment_max_bytes``.
+    """
+
+    def __init__(self, directory: str, compression: str = "gzip", segment_max_bytes: int = 64 * 1024 * 1024):
+        if compression not in EXTENSIONS:
+            raise ValueError(f"Unknown ARCHIVE_COMPRESSION: {compression}")
+        if compression == "zstd":
+            try:
+                import zstandard  # noqa: F401
+            except ImportError:
+                print("⚠️  zstandard not installed, archiving with gzip")
+                compression = "gzip"
+        self.directory = directory
+        self.compression = compression
+        self.segment_max_bytes = segment_max_bytes
+
+    def segments(self) -> List[str]:
+        """Segment file names, oldest first"""
+        if not os.path.isdir(self.directory):
+            return []
+        names = [name for name in os.listdir(self.directory) if SEGMENT_PATTERN.match(name)]
+        return sorted(names, key=lambda name: int(SEGMENT_PATTERN.match(name).group(1)))
+
+    def _current_segment(self) -> str:
+        segments = self.segments()
+        if segments:
+            last = segments[-1]
+            path = os.path.join(self.directory, last)
+            if last.endswith(EXTENSIONS[self.compression]) and os.path.getsize(path) < self.segment_max_bytes:
+                return last
+            number = int(SEGMENT_PATTERN.match(last).group(1)) + 1
+        else:
+            number = 1
+        return f"segment-{number:06d}{EXTENSIONS[self.compression]}"
+
+    def _append(self, payload: bytes) -> Tuple[str, int]:
+        os.makedirs(self.directory, exist_ok=True)
+        segment = self._current_segment()
+        with open(os.path.join(self.directory, segment), "ab") as f:
+            f.seek(0, os.SEEK_END)
+            offset = f.tell()
+            f.write(payload)
+            f.flush()
+            # On disk before the hot rows are deleted
+            os.fsync(f.fileno())
+        return segment, offset
+
+    def _read(self, segment: str, offset: int, length: int) -> bytes:
+        with open(os.path.join(self.directory, segment), "rb") as f:
+            f.seek(offset)
+            return _decompress(segment, f.read(length))
+
+    async def write(self, records: List[Dict]) -> Tuple[str, int, int, int]:
+        """
+        Append session records as one compressed member
+
+        Returns:
+            (segment, offset, compressed length, uncompressed length)
+        """
+        raw = b"".join(json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n" for record in records)
+        payload = await asyncio.to_thread(_compress, self.compression, raw)
+        segment, offset = await asyncio.to_thread(self._append, payload)
+        return segment, offset, len(payload), len(raw)
+
+    async def load(self, db: AsyncSession, session_id: str) -> Optional[Dict]:
+        """Return the archived record of a session, or None if it was never archived"""
+        entry = await db.get(ArchivedSession, session_id)
+        if entry is None:
+            return None
+        data = await asyncio.to_thread(self._read, entry.segment, entry.offset, entry.length)
+        for line in data.splitlines():
+            record = json.loads(line)
+            if record["session_id"] == session_id:
+                return record
+        return None
+
+    async def restore_session(self, db: AsyncSession, session_id: str, ip_address: Optional[str]) -> Optional[ChatSession]:
+        """
+        Bring an archived session back into the hot tables when its user returns
+
+        The session row and its whole transcript are restored and the index
+        row is dropped, so archiving the session again writes a complete
+        record (its old copy in the segment is simply unindexed).
+
+        Returns:
+            The hot session, or None if it was never archived
+        """
+        record = await self.load(db, session_id)
+        if record is None:
+            # A concurrent restore may have just moved it back
+            return await db.get(ChatSession, session_id)
+        state = ConversationState(record["state"])
+        messages = [
+            ChatMessage(
+                session_id=session_id,
+                role=message["role"],
+                content=message["content"],
+                sources=json.dumps(message["sources"]) if message["sources"] else None,
+                timestamp=_parse_datetime(message["timestamp"])
+            )
+            for message in record["messages"]
+        ]
+        try:
+            db.add_all(messages)
+            await db.flush()
+            if state.summarized_through:
+                # Restored messages get new ids; point the summary at the new
+                # id of the last message it covers. Records archived before
+                # message ids were kept have their summary rebuilt instead
+                folded = [
+                    restored.id for restored, message in zip(messages, record["messages"])
+                    if message.get("id") is not None and message["id"] <= state.summarized_through
+                ]
+                state.update(
+                    summary=state.summary if folded else None,
+                    summarized_through=folded[-1] if folded else 0
+                )
+            session = ChatSession(
+                id=session_id,
+                ip_address=ip_address,
+                created_at=_parse_datetime(record["created_at"]),
+                conversation_state_bin=state.to_bytes(),
+                message_count=record["message_count"],
+                last_message_at=_parse_datetime(record["last_message_at"]),
+                # Absent from records archived before usage was counted
+                prompt_tokens=record.get("prompt_tokens", 0),
+                output_tokens=record.get("output_tokens", 0)
+            )
+            db.add(session)
+            await db.execute(delete(ArchivedSession).where(ArchivedSession.session_id == session_id))
+            await db.commit()
+        except IntegrityError:
+            # Another request restored the same session first
+            await db.rollback()
+            return await db.get(ChatSession, session_id)
+        return session
+
+
+class SessionArchiver:
+    """
+    Periodically moves finished, idle sessions into the archive
+
+    Works in batches like the session sweeper: select idle sessions, write
+    the finished ones to a segment, then delete their hot rows and index
+    them in one short transaction. Sessions that received a turn after they
+    were picked stay hot (their copy in the segment is simply unindexed).
+    """
+
+    def __init__(self, archive: SessionArchive, idle_seconds: int, interval: float, batch_size: int = 100):
+        self.archive = archive
+        self.idle_seconds = idle_seconds
+        self.interval = interval
+        self.batch_size = batch_size
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = asyncio.Event()
+        # The sweeper also triggers runs; one at a time
+        self._lock = asyncio.Lock()
+
+        # Metrics
+        self.runs = 0
+        self.batches = 0
+        self.sessions_archived = 0
+        self.messages_archived = 0
+        self.skipped = 0
+        self.bytes_written = 0
+        self.raw_bytes = 0
+        self.last_run_at: Optional[datetime] = None
+        self.last_run_ms = 0.0
+        self.last_error: Optional[str] = None
+
+    def start(self):
+        """Start the archive loop on the running event loop"""
+        if self._task is None:
+            self._stopping.clear()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop after the batch in progress, if any"""
+        if self._task is not None:
+            self._stopping.set()
+            await self._task
+            self._task = None
+
+    async def _run(self):
+        while not self._stopping.is_set():
+            try:
+                await self.run()
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"Session archiving failed: {e}")
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def run(self) -> int:
+        """
+        Archive every finished session idle for longer than idle_seconds
+
+        Returns:
+            Number of sessions archived
+        """
+        async with self._lock:
+            start = time.monotonic()
+            cutoff = datetime.utcnow() - timedelta(seconds=self.idle_seconds)
+            archived = 0
+            # Unfinished or busy sessions seen this run, so the scan moves past them
+            skipped: List[str] = []
+
+            while not self._stopping.is_set():
+                batch_archived, batch_skipped, more = await self._archive_batch(cutoff, skipped)
+                archived += batch_archived
+                skipped.extend(batch_skipped)
+                if not more:
+                    break
+
+            self.runs += 1
+            self.last_run_at = datetime.utcnow()
+            self.last_run_ms = round((time.monotonic() - start) * 1000, 2)
+            self.last_error = None
+            if archived:
+                print(f"✓ Archived {archived} sessions in {self.last_run_ms} ms")
+            return archived
+
+    async def _archive_batch(self, cutoff: datetime, skipped: List[str]):
+        """Archive one batch; returns (archived, newly skipped, more to do)"""
+        async with AsyncSessionLocal() as db:
+            query = (
+                select(ChatSession)
+                .where(ChatSession.updated_at < cutoff)
+                .order_by(ChatSession.updated_at)
+                .limit(self.batch_size)
+            )
+            if skipped:
+                query = query.where(ChatSession.id.notin_(skipped))
+            candidates = (await db.execute(query)).scalars().all()
+            if not candidates:
+                return 0, [], False
+
+            finished = {}
+            passed = []
+            for session in candidates:
+                state = ConversationState.from_stored(session.conversation_state_bin, session.conversation_state)
+                if state.stage in FINISHED_STAGES and not (write_queue and write_queue.is_pending(session.id)):
+                    finished[session.id] = (session, state)
+                else:
+                    passed.append(session.id)
+            if finished:
+                # A lead still queued for HubSpot writes its contact id back
+                # into the hot session once delivered
+                queued = await db.execute(
+                    select(LeadOutbox.session_id)
+                    .where(LeadOutbox.session_id.in_(list(finished)), LeadOutbox.status == STATUS_QUEUED)
+                )
+                for session_id in set(queued.scalars()):
+                    del finished[session_id]
+                    passed.append(session_id)
+            self.skipped += len(passed)
+            more = len(candidates) == self.batch_size
+            if not finished:
+                return 0, passed, more
+
+            messages: Dict[str, List[Dict]] = {session_id: [] for session_id in finished}
+            rows = await db.execute(
+                select(ChatMessage)
+                .where(ChatMessage.session_id.in_(list(finished)))
+                .order_by(ChatMessage.session_id, ChatMessage.timestamp, ChatMessage.id)
+            )
+            for message in rows.scalars():
+                messages[message.session_id].append({
+                    # Lets a restore map summarized_through to the new ids
+                    "id": message.id,
+                    "role": message.role,
+                    "content": message.content,
+                    "sources": json.loads(message.sources) if message.sources else [],
+                    "timestamp": _isoformat(message.timestamp)
+                })
+
+            archived_at = datetime.utcnow()
+            records = [
+                {
+                    "session_id": session.id,
+                    "created_at": _isoformat(session.created_at),
+                    "updated_at": _isoformat(session.updated_at),
+                    "last_message_at": _isoformat(session.last_message_at),
+                    "archived_at": archived_at.isoformat(),
+                    "ip_address": session.ip_address,
+                    "message_count": session.message_count,
+                    "prompt_tokens": session.prompt_tokens,
+                    "output_tokens": session.output_tokens,
+                    "state": state.to_dict(),
+                    "messages": messages[session.id]
+                }
+                for session, state in finished.values()
+            ]
+            segment, offset, length, raw_length = await self.archive.write(records)
+
+            # Move only what is still idle, in one transaction
+            result = await db.execute(
+                delete(ChatSession)
+                .where(ChatSession.id.in_(list(finished)), ChatSession.updated_at < cutoff)
+                .returning(ChatSession.id)
+            )
+            moved = result.scalars().all()
+            if moved:
+                await db.execute(delete(ChatMessage).where(ChatMessage.session_id.in_(moved)))
+                index = sqlite_insert(ArchivedSession.__table__)
+                await db.execute(
+                    index.on_conflict_do_update(
+                        index_elements=["session_id"],
+                        set_={
+                            column: index.excluded[column]
+                            for column in ("segment", "offset", "length", "created_at",
+                                           "last_message_at", "message_count", "archived_at")
+                        }
+                    ),
+                    [
+                        {
+                            "session_id": session_id,
+                            "segment": segment,
+                            "offset": offset,
+                            "length": length,
+                            "created_at": finished[session_id][0].created_at,
+                            "last_message_at": finished[session_id][0].last_message_at,
+                            "message_count": finished[session_id][0].message_count,
+                            "archived_at": archived_at
+                        }
+                        for session_id in moved
+                    ]
+                )
+            await db.commit()
+
+        for session_id in moved:
+            if history_cache:
+                history_cache.invalidate(session_id)
+            if state_cache:
+                await state_cache.invalidate(session_id)
+
+        self.batches += 1
+        self.sessions_archived += len(moved)
+        self.messages_archived += sum(len(messages[session_id]) for session_id in moved)
+        self.bytes_written += length
+        self.raw_bytes += raw_length
+        return len(moved), passed, more
+
+    def stats(self) -> Dict:
+        """Snapshot of archiver metrics"""
+        return {
+            "idle_seconds": self.idle_seconds,
+            "compression": self.archive.compression,
+            "segments": len(self.archive.segments()),
+            "runs": self.runs,
+            "batches": self.batches,
+            "sessions_archived": self.sessions_archived,
+            "messages_archived": self.messages_archived,
+            "skipped": self.skipped,
+            "bytes_written": self.bytes_written,
+            "compression_ratio": round(self.raw_bytes / self.bytes_written, 2) if self.bytes_written else 0.0,
+            "last_run_at": self.last_run_at.isoformat() if self.last_run_at else None,
+            "last_run_ms": self.last_run_ms,
+            "last_error": self.last_error
+        }
+
+
+# Archived sessions stay readable even when archiving is switched off
+session_archive = SessionArchive(ARCHIVE_DIR, ARCHIVE_COMPRESSION, ARCHIVE_SEGMENT_MAX_MB * 1024 * 1024)
+
+# Global archiver (None unless enabled)
+session_archiver = SessionArchiver(
+    session_archive,
+    idle_seconds=ARCHIVE_IDLE_SECONDS,
+    interval=ARCHIVE_INTERVAL,
+    batch_size=ARCHIVE_BATCH_SIZE
+) if ARCHIVE_ENABLED else None
@@ -0,0 +1,252 @@
+"""
+Background expiry of idle chat sessions
+Deletes sessions idle for longer than SESSION_TIMEOUT, with their messages
+"""
+import asyncio
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import select, delete
+
+from config import (
+    SESSION_TIMEOUT, SESSION_SWEEP_ENABLED, SESSION_SWEEP_INTERVAL,
+    SESSION_SWEEP_BATCH_SIZE, SESSION_SWEEP_BATCH_PAUSE_MS,
+    SESSION_SWEEP_VACUUM, SESSION_SWEEP_VACUUM_PAGES
+)
+from conversation_state import ConversationState
+from database import AsyncSessionLocal, ChatSession, ChatMessage, LeadOutbox, async_engine, SQLITE_FILE_DB
+from history_cache import history_cache
+from lead_outbox import STATUS_QUEUED
+from session_archive import FINISHED_STAGES, SessionArchiver, session_archiver
+from state_cache import state_cache
+from write_behind import write_queue
+
+VACUUM_MODES = ("none", "incremental", "full")
+
+
+class SessionSweeper:
+    """
+    Periodically deletes expired sessions in small batches
+
+    Each batch is one short transaction, followed by a pause, so live turns
+    never wait long for the SQLite writer lock. A session updated after it
+    was picked is left alone, and so is one with turns still queued in the
+    write-behind queue. When archiving is enabled, an archive pass runs
+    first so finished conversations are kept, and the sessions that pass
+    left behind for now (finished ones, or with a lead still queued for
+    HubSpot) are not deleted either: the archiver takes them later.
+    """
+
+    def __init__(
+        self,
+        timeout: int,
+        interval: float,
+        batch_size: int = 200,
+        batch_pause: float = 0.05,
+        vacuum: str = "none",
+        vacuum_pages: int = 1000,
+        archiver: Optional[SessionArchiver] = None
+    ):
+        if vacuum not in VACUUM_MODES:
+            raise ValueError(f"Unknown SESSION_SWEEP_VACUUM mode: {vacuum}")
+        self.timeout = timeout
+        self.interval = interval
+        self.batch_size = batch_size
+        self.batch_pause = batch_pause
+        self.vacuum = vacuum if SQLITE_FILE_DB else "none"
+        self.vacuum_pages = vacuum_pages
+        self.archiver = archiver
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = asyncio.Event()
+
+        # Metrics
+        self.runs = 0
+        self.batches = 0
+        self.sessions_deleted = 0
+        self.messages_deleted = 0
+        self.skipped_pending = 0
+        self.skipped_archivable = 0
+        self.vacuum_runs = 0
+        self.max_batch_ms = 0.0
+        self.last_run_at: Optional[datetime] = None
+        self.last_run_ms = 0.0
+        self.last_error: Optional[str] = None
+
+    def start(self):
+        """Start the sweep loop on the running event loop"""
+        if self._task is None:
+            self._stopping.clear()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop after the batch in progress, if any"""
+        if self._task is not None:
+            self._stopping.set()
+            await self._task
+            self._task = None
+
+    async def _run(self):
+        while not self._stopping.is_set():
+            try:
+                await self.sweep()
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"Session sweep failed: {e}")
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def sweep(self) -> int:
+        """
+        Delete every session idle for longer than the timeout
+
+        Returns:
+            Number of sessions deleted
+        """
+        if self.archiver:
+            # Finished conversations go to cold storage instead of being deleted
+            await self.archiver.run()
+
+        start = time.monotonic()
+        cutoff = datetime.utcnow() - timedelta(seconds=self.timeout)
+        deleted = 0
+        # Sessions already skipped this run, so the scan moves past them
+        skipped: List[str] = []
+
+        while not self._stopping.is_set():
+            batch_deleted, batch_skipped, more = await self._sweep_batch(cutoff, skipped)
+            deleted += batch_deleted
+            skipped.extend(batch_skipped)
+            if not more:
+                break
+            await asyncio.sleep(self.batch_pause)
+
+        if deleted and self.vacuum != "none":
+            await self._vacuum()
+
+        self.runs += 1
+        self.last_run_at = datetime.utcnow()
+        self.last_run_ms = round((time.monotonic() - start) * 1000, 2)
+        self.last_error = None
+        if deleted:
+            print(f"✓ Swept {deleted} expired sessions in {self.last_run_ms} ms")
+        return deleted
+
+    async def _sweep_batch(self, cutoff: datetime, skipped: List[str]):
+        """Delete one batch; returns (deleted, newly skipped, more to do)"""
+        batch_start = time.monotonic()
+        async with AsyncSessionLocal() as db:
+            query = (
+                select(ChatSession.id, ChatSession.conversation_state_bin, ChatSession.conversation_state)
+                .where(ChatSession.updated_at < cutoff)
+                .order_by(ChatSession.updated_at)
+                .limit(self.batch_size)
+            )
+            if skipped:
+                query = query.where(ChatSession.id.notin_(skipped))
+            candidates = (await db.execute(query)).all()
+            if not candidates:
+                return 0, [], False
+
+            pending = [row.id for row in candidates if write_queue and write_queue.is_pending(row.id)]
+            self.skipped_pending += len(pending)
+            if self.archiver:
+                # Left for the archiver: finished conversations, and leads still
+                # waiting to reach HubSpot (their transcript must be archived)
+                queued = set((await db.execute(
+                    select(LeadOutbox.session_id)
+                    .where(
+                        LeadOutbox.session_id.in_([row.id for row in candidates]),
+                        LeadOutbox.status == STATUS_QUEUED
+                    )
+                )).scalars())
+                archivable = [
+                    row.id for row in candidates
+                    if row.id not in pending and (
+                        row.id in queued
+                        or ConversationState.from_stored(
+                            row.conversation_state_bin, row.conversation_state
+                        ).stage in FINISHED_STAGES
+                    )
+                ]
+                self.skipped_archivable += len(archivable)
+                pending.extend(archivable)
+            ids = [row.id for row in candidates if row.id not in pending]
+
+            deleted_ids = []
+            if ids:
+                # Re-checking the cutoff inside the transaction spares sessions
+                # that received a turn since they were selected
+                result = await db.execute(
+                    delete(ChatSession)
+                    .where(ChatSession.id.in_(ids), ChatSession.updated_at < cutoff)
+                    .returning(ChatSession.id)
+                )
+                deleted_ids = result.scalars().all()
+                if deleted_ids:
+                    result = await db.execute(
+                        delete(ChatMessage).where(ChatMessage.session_id.in_(deleted_ids))
+                    )
+                    self.messages_deleted += result.rowcount
+                await db.commit()
+
+        for session_id in deleted_ids:
+            if history_cache:
+                history_cache.invalidate(session_id)
+            if state_cache:
+                await state_cache.invalidate(session_id)
+
+        self.batches += 1
+        self.sessions_deleted += len(deleted_ids)
+        self.max_batch_ms = max(self.max_batch_ms, round((time.monotonic() - batch_start) * 1000, 2))
+        return len(deleted_ids), pending, len(candidates) == self.batch_size
+
+    async def _vacuum(self):
+        """Return freed pages to the filesystem"""
+        async with async_engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            if self.vacuum == "incremental":
+                mode = (await conn.exec_driver_sql("PRAGMA auto_vacuum")).scalar()
+                if mode != 2:
+                    # Switching an existing database needs one full VACUUM
+                    print("Enabling incremental auto-vacuum (one-time full VACUUM)")
+                    await conn.exec_driver_sql("PRAGMA auto_vacuum = INCREMENTAL")
+                    await conn.exec_driver_sql("VACUUM")
+                else:
+                    pages = f"({self.vacuum_pages})" if self.vacuum_pages > 0 else ""
+                    await conn.exec_driver_sql(f"PRAGMA incremental_vacuum{pages}")
+            else:
+                await conn.exec_driver_sql("VACUUM")
+        self.vacuum_runs += 1
+
+    def stats(self) -> Dict:
+        """Snapshot of sweeper metrics"""
+        return {
+            "timeout_seconds": self.timeout,
+            "vacuum": self.vacuum,
+            "runs": self.runs,
+            "batches": self.batches,
+            "sessions_deleted": self.sessions_deleted,
+            "messages_deleted": self.messages_deleted,
+            "skipped_pending": self.skipped_pending,
+            "skipped_archivable": self.skipped_archivable,
+            "vacuum_runs": self.vacuum_runs,
+            "max_batch_ms": self.max_batch_ms,
+            "last_run_at": self.last_run_at.isoformat() if self.last_run_at else None,
+            "last_run_ms": self.last_run_ms,
+            "last_error": self.last_error
+        }
+
+
+# Global sweeper (None unless enabled)
+session_sweeper = SessionSweeper(
+    timeout=SESSION_TIMEOUT,
+    interval=SESSION_SWEEP_INTERVAL,
+    batch_size=SESSION_SWEEP_BATCH_SIZE,
+    batch_pause=SESSION_SWEEP_BATCH_PAUSE_MS / 1000,
+    vacuum=SESSION_SWEEP_VACUUM,
+    vacuum_pages=SESSION_SWEEP_VACUUM_PAGES,
+    archiver=session_archiver
+) if SESSION_SWEEP_ENABLED else None
@@ -0,0 +1,273 @@
+"""
+State shared across worker processes
+Rate limit counters, the search cache and the conversation state cache live
+in process memory by default, or in Redis with SHARED_STATE_BACKEND=redis so
+that ``uvicorn --workers N`` and several nodes behave like one process
+"""
+import itertools
+import json
+import time
+from typing import Any, Callable, Dict, Optional
+
+import redis.asyncio as aioredis
+from cachetools import LRUCache, TTLCache
+from redis.exceptions import RedisError
+
+from circuit_breaker import CircuitOpenError, create_breaker
+from config import (
+    SHARED_STATE_BACKEND, SHARED_STATE_URL, SHARED_STATE_PREFIX, SHARED_STATE_TIMEOUT,
+    SHARED_STATE_POOL_SIZE, SHARED_STATE_SLOW_CALL_SECONDS, RATE_LIMIT_STORAGE_URI
+)
+from metrics import dependency_seconds
+
+SHARED = SHARED_STATE_BACKEND == "redis"
+
+# Created lazily so it binds to the running event loop
+_client: Optional[aioredis.Redis] = None
+
+# While open, cache commands fail at once instead of waiting for timeouts
+shared_state_breaker = create_breaker("shared_state", SHARED_STATE_SLOW_CALL_SECONDS) if SHARED else None
+
+# Keys whose write or delete did not reach Redis, oldest first, so their old
+# entries are neither served by this worker nor left behind once Redis is back
+LOST_WRITES_MAX = 100_000
+_lost_writes: Dict[str, int] = {}
+_lost_write_ids = itertools.count()
+_forgetting = False
+
+# Failures a cache command is treated as a miss for
+_FAILURES = (RedisError, OSError, CircuitOpenError)
+
+shared_state_stats = {
+    "commands": 0,
+    "errors": 0,
+    "breaker_rejections": 0,
+    "last_error": None
+}
+
+
+def _get_client() -> aioredis.Redis:
+    """Shared connection pool for all cache namespaces"""
+    global _client
+    if _client is None:
+        # Waits for a free connection instead of failing when all are busy
+        pool = aioredis.BlockingConnectionPool.from_url(
+            SHARED_STATE_URL,
+            max_connections=SHARED_STATE_POOL_SIZE,
+            timeout=SHARED_STATE_TIMEOUT,
+            socket_timeout=SHARED_STATE_TIMEOUT,
+            socket_connect_timeout=SHARED_STATE_TIMEOUT
+        )
+        _client = aioredis.Redis(connection_pool=pool)
+    return _client
+
+
+async def close_shared_state():
+    """Close pooled connections (called on application shutdown)"""
+    global _client
+    if _client is not None:
+        await _client.aclose(close_connection_pool=True)
+        _client = None
+
+
+async def check_shared_state() -> bool:
+    """Ping the shared backend, reporting the result (called on startup)"""
+    if not SHARED:
+        return True
+    try:
+        await _get_client().ping()
+    except (RedisError, OSError) as e:
+        print(f"⚠️  Shared state at {SHARED_STATE_URL} unreachable, caches will miss: {e}")
+        return False
+    print(f"✓ Shared state on {SHARED_STATE_URL}")
+    return True
+
+
+def limiter_storage_uri() -> str:
+    """slowapi storage URI: the explicit setting, else the shared backend"""
+    if RATE_LIMIT_STORAGE_URI:
+        return RATE_LIMIT_STORAGE_URI
+    return SHARED_STATE_URL if SHARED else "memory://"
+
+
+def limiter_storage_options() -> Dict:
+    """slowapi storage options: Redis commands give up after SHARED_STATE_TIMEOUT"""
+    if not limiter_storage_uri().startswith(("redis://", "rediss://", "redis+")):
+        return {}
+    return {"socket_timeout": SHARED_STATE_TIMEOUT, "socket_connect_timeout": SHARED_STATE_TIMEOUT}
+
+
+def _lose_write(key: str):
+    _lost_writes.pop(key, None)
+    _lost_writes[key] = next(_lost_write_ids)
+    if len(_lost_writes) > LOST_WRITES_MAX:
+        # The oldest are forgotten; their entries still expire after their TTL
+        del _lost_writes[next(iter(_lost_writes))]
+
+
+async def _forget_lost_writes():
+    """Delete the entries of lost writes once Redis answers again"""
+    global _forgetting
+    if _forgetting:
+        return
+    _forgetting = True
+    # Oldest first, a bounded batch per successful command
+    lost = dict(itertools.islice(_lost_writes.items(), 1000))
+    try:
+        with shared_state_breaker.guard():
+            await _get_client().delete(*lost)
+    except _FAILURES:
+        return
+    else:
+        for key, lost_id in lost.items():
+            # Unless it was lost again meanwhile
+            if _lost_writes.get(key) == lost_id:
+                del _lost_writes[key]
+    finally:
+        _forgetting = False
+
+
+def _json_encode(value: Any) -> bytes:
+    return json.dumps(value, separators=(",", ":")).encode("utf-8")
+
+
+def _json_decode(raw: bytes) -> Any:
+    return json.loads(raw)
+
+
+class MemoryCache:
+    """A cache namespace held in this process; values are kept as they are"""
+
+    def __init__(self, name: str, maxsize: int, ttl: Optional[float]):
+        self.name = name
+        self._entries = TTLCache(maxsize=maxsize, ttl=ttl) if ttl else LRUCache(maxsize=maxsize)
+
+    async def get(self, key: str) -> Optional[Any]:
+        return self._entries.get(key)
+
+    async def set(self, key: str, value: Any):
+        self._entries[key] = value
+
+    async def delete(self, key: str):
+        self._entries.pop(key, None)
+
+    def size(self) -> Optional[int]:
+        return len(self._entries)
+
+
+class RedisCache:
+    """
+    A cache namespace on the shared Redis server
+
+    Keys are ``SHARED_STATE_PREFIX + name + ":" + key`` and expire after
+    ``ttl`` seconds. The server's eviction policy, not ``maxsize``, bounds
+    memory. A failed command is counted and treated as a miss, so turns
+    carry on against the database and upstream APIs while Redis is away.
+    Commands go through the ``shared_state`` circuit breaker. A key whose
+    write failed or was skipped reads as a miss in this worker until its old
+    entry has been deleted; other workers may read that entry until then.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        ttl: Optional[float],
+        encode: Callable[[Any], bytes] = _json_encode,
+        decode: Callable[[bytes], Any] = _json_decode
+    ):
+        self.name = name
+        self.ttl_ms = int(ttl * 1000) if ttl else None
+        self._prefix = f"{SHARED_STATE_PREFIX}{name}:"
+        self._encode = encode
+        self._decode = decode
+
+    async def _call(self, command: str, *args, **kwargs):
+        start = time.monotonic()
+        try:
+            with shared_state_breaker.guard():
+                shared_state_stats["commands"] += 1
+                result = await getattr(_get_client(), command)(*args, **kwargs)
+        except CircuitOpenError:
+            shared_state_stats["breaker_rejections"] += 1
+            raise
+        except (RedisError, OSError) as e:
+            dependency_seconds.observe(time.monotonic() - start, dependency="shared_state", outcome="error")
+            if shared_state_stats["last_error"] is None:
+                # Reported once per outage; later failures are only counted
+                print(f"⚠️  Shared state {command} failed: {e}")
+            shared_state_stats["errors"] += 1
+            shared_state_stats["last_error"] = str(e) or type(e).__name__
+            raise
+        dependency_seconds.observe(time.monotonic() - start, dependency="shared_state", outcome="ok")
+        if shared_state_stats["last_error"] is not None:
+            print("✓ Shared state reachable again")
+            shared_state_stats["last_error"] = None
+        if _lost_writes:
+            await _forget_lost_writes()
+        return result
+
+    async def get(self, key: str) -> Optional[Any]:
+        key = self._prefix + key
+        if key in _lost_writes:
+            return None
+        try:
+            raw = await self._call("get", key)
+        except _FAILURES:
+            return None
+        return None if raw is None else self._decode(raw)
+
+    async def set(self, key: str, value: Any):
+        key = self._prefix + key
+        try:
+            await self._call("set", key, self._encode(value), px=self.ttl_ms)
+        except _FAILURES:
+            _lose_write(key)
+        else:
+            _lost_writes.pop(key, None)
+
+    async def delete(self, key: str):
+        key = self._prefix + key
+        try:
+            await self._call("delete", key)
+        except _FAILURES:
+            _lose_write(key)
+        else:
+            _lost_writes.pop(key, None)
+
+    def size(self) -> Optional[int]:
+        # Not tracked: the keys belong to every worker
+        return None
+
+
+def shared_cache(
+    name: str,
+    maxsize: int,
+    ttl: Optional[float],
+    encode: Callable[[Any], bytes] = _json_encode,
+    decode: Callable[[bytes], Any] = _json_decode
+):
+    """
+    Cache namespace on the configured backend
+
+    Args:
+        name: Namespace, part of every Redis key
+        maxsize: Most entries kept in memory (the memory backend only)
+        ttl: Seconds an entry lives, None for no expiry
+        encode: Value to bytes, for Redis (JSON by default)
+        decode: Bytes back to a value
+
+    Returns:
+        MemoryCache or RedisCache, both with async get/set/delete
+    """
+    if SHARED:
+        return RedisCache(name, ttl, encode, decode)
+    return MemoryCache(name, maxsize, ttl)
+
+
+def get_shared_state_stats() -> Dict:
+    """Snapshot of shared backend metrics"""
+    return {
+        "backend": SHARED_STATE_BACKEND,
+        "rate_limit_storage": limiter_storage_uri().split("://", 1)[0],
+        **({**shared_state_stats, "lost_writes": len(_lost_writes)} if SHARED else {})
+    }
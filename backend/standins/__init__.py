@@ -0,0 +1,7 @@
+"""
+Local stand-ins for the external APIs the backend calls
+Gemini (gRPC), Google Custom Search and HubSpot, with injectable latency,
+errors and 429 bursts, so benchmarks and load tests run offline and never
+touch paid services, plus a Redis server for the shared state backend.
+``python -m standins`` runs all four.
+"""
@@ -0,0 +1,66 @@
+"""
+Run every stand-in locally
+
+Usage (from backend/):
+    python -m standins --gemini "latency=lognormal:350:1500,errors=0.01" --hubspot "burst=60:5"
+
+Fault specs are described in standins/faults.py. The backend settings that
+point at the stand-ins are printed on startup.
+"""
+import argparse
+import asyncio
+
+import uvicorn
+
+from standins import cse, gemini, hubspot, resp
+from standins.faults import FaultProfile
+
+
+async def _serve(args):
+    standin = gemini.GeminiStandin(
+        FaultProfile.parse(args.gemini), chunks=args.gemini_chunks, chunk_delay=args.gemini_chunk_ms / 1000
+    )
+    endpoint = await standin.start(args.host, args.gemini_port)
+    redis_standin = resp.RespStandin(FaultProfile.parse(args.redis))
+    redis_url = await redis_standin.start(args.host, args.redis_port)
+    servers = [
+        uvicorn.Server(uvicorn.Config(
+            cse.create_app(FaultProfile.parse(args.cse)), host=args.host, port=args.cse_port, log_level="warning"
+        )),
+        uvicorn.Server(uvicorn.Config(
+            hubspot.create_app(faults=FaultProfile.parse(args.hubspot)), host=args.host, port=args.hubspot_port, log_level="warning"
+        ))
+    ]
+    print("Stand-ins running; point the backend at them with:")
+    print(f"  GEMINI_API_ENDPOINT={endpoint}")
+    print(f"  GOOGLE_SEARCH_URL=http://{args.host}:{args.cse_port}{cse.SEARCH_PATH}")
+    print("  GOOGLE_CSE_ID=standin")
+    print(f"  HUBSPOT_BASE_URL=http://{args.host}:{args.hubspot_port}")
+    print("  HUBSPOT_API_KEY=standin")
+    print("  SHARED_STATE_BACKEND=redis")
+    print(f"  SHARED_STATE_URL={redis_url}")
+    try:
+        await asyncio.gather(*(server.serve() for server in servers))
+    finally:
+        await standin.stop()
+        await redis_standin.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--gemini-port", type=int, default=8101)
+    parser.add_argument("--cse-port", type=int, default=8102)
+    parser.add_argument("--hubspot-port", type=int, default=8100)
+    parser.add_argument("--redis-port", type=int, default=8103)
+    parser.add_argument("--gemini", default="latency=lognormal:350:1500", help="Fault spec for time to first chunk")
+    parser.add_argument("--gemini-chunks", type=int, default=20)
+    parser.add_argument("--gemini-chunk-ms", type=float, default=40)
+    parser.add_argument("--cse", default="latency=lognormal:250:900", help="Fault spec for Custom Search")
+    parser.add_argument("--hubspot", default="latency=lognormal:120:600", help="Fault spec for HubSpot")
+    parser.add_argument("--redis", default="", help="Fault spec for the Redis stand-in")
+    asyncio.run(_serve(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Google Custom Search JSON API stand-in
+Serves GET /customsearch/v1 with results made up from the query
+"""
+import asyncio
+import hashlib
+from collections import Counter
+from typing import Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+from standins.faults import FaultProfile, RATE_LIMITED, SERVER_ERROR
+
+SEARCH_PATH = "/customsearch/v1"
+
+
+def _error(status: int, reason: str, message: str) -> JSONResponse:
+    """Google API error body"""
+    return JSONResponse(status_code=status, content={
+        "error": {
+            "code": status,
+            "message": message,
+            "errors": [{"message": message, "domain": "global", "reason": reason}],
+            "status": {400: "INVALID_ARGUMENT", 429: "RESOURCE_EXHAUSTED", 503: "UNAVAILABLE"}.get(status, "UNKNOWN")
+        }
+    })
+
+
+def _items(query: str, start: int, num: int):
+    # Stable per query, so cached and fresh answers look alike
+    slug = hashlib.sha1(query.encode("utf-8")).hexdigest()[:8]
+    items = []
+    for rank in range(start, start + num):
+        link = f"https://example.com/{slug}/{rank}"
+        items.append({
+            "kind": "customsearch#result",
+            "title": f"{query} - result {rank}",
+            "htmlTitle": f"<b>{query}</b> - result {rank}",
+            "link": link,
+            "displayLink": "example.com",
+            "snippet": f"Result {rank} for {query}: a short summary of the page, as Google would show it.",
+            "formattedUrl": link
+        })
+    return items
+
+
+def create_app(faults: Optional[FaultProfile] = None) -> FastAPI:
+    """
+    Build a stand-in app (``app.state.faults``, ``app.state.requests``)
+
+    Like the real API, a request without ``key`` or ``cx`` or with ``num``
+    outside 1-10 is rejected with 400.
+    """
+    app = FastAPI(title="Custom Search stand-in")
+    faults = faults or FaultProfile()
+    app.state.faults = faults
+    app.state.requests = Counter()
+
+    @app.get(SEARCH_PATH)
+    async def search(request: Request, q: str = "", key: str = "", cx: str = "", num: int = 10, start: int = 1):
+        app.state.requests[q] += 1
+        fault = faults.fault()
+        delay = faults.delay()
+        if delay:
+            await asyncio.sleep(delay)
+        if fault == RATE_LIMITED:
+            return _error(429, "rateLimitExceeded", "Quota exceeded for quota metric 'Queries' and limit 'Queries per minute'")
+        if fault == SERVER_ERROR:
+            return _error(503, "backendError", "The service is currently unavailable.")
+        if not key:
+            return _error(400, "keyInvalid", "API key not valid. Please pass a valid API key.")
+        if not cx:
+            return _error(400, "invalid", "Request contains an invalid argument.")
+        if not 1 <= num <= 10:
+            return _error(400, "invalid", "Invalid value for num: must be between 1 and 10.")
+
+        items = _items(q, start, num)
+        return {
+            "kind": "customsearch#search",
+            "url": {"type": "application/json", "template": "https://www.googleapis.com/customsearch/v1?q={searchTerms}"},
+            "queries": {
+                "request": [{"title": f"Google Custom Search - {q}", "searchTerms": q, "count": num, "startIndex": start, "cx": cx}],
+                "nextPage": [{"title": f"Google Custom Search - {q}", "searchTerms": q, "count": num, "startIndex": start + num, "cx": cx}]
+            },
+            "searchInformation": {
+                "searchTime": round(delay, 3),
+                "formattedSearchTime": f"{delay:.2f}",
+                "totalResults": "1000",
+                "formattedTotalResults": "1,000"
+            },
+            "items": items
+        }
+
+    return app
+
+
+# Run standalone: uvicorn standins.cse:app --port 8102 (from backend/)
+app = create_app()
@@ -0,0 +1,111 @@
+"""
+Latency and failure injection shared by the stand-ins
+
+A profile is written as a comma-separated spec, e.g.
+
+    latency=lognormal:300:1200,errors=0.02,burst=60:5
+
+    latency=fixed:MS | uniform:LO:HI | exp:MEAN | lognormal:P50:P99   (milliseconds)
+    errors=RATE        share of requests answered with a server error
+    burst=EVERY:FOR    the first FOR seconds of every EVERY seconds answer 429
+    seed=N             fixed random seed, for repeatable runs
+"""
+import math
+import random
+import time
+from collections import Counter
+from typing import Optional
+
+# Outcomes of FaultProfile.fault()
+RATE_LIMITED = "rate_limited"
+SERVER_ERROR = "server_error"
+
+# z-score of the 99th percentile of a standard normal distribution
+_Z99 = 2.3263
+
+
+class FaultProfile:
+    """Per-request latency distribution, error rate and 429 bursts"""
+
+    def __init__(
+        self,
+        latency: str = "fixed:0",
+        error_rate: float = 0.0,
+        burst_every: float = 0.0,
+        burst_seconds: float = 0.0,
+        seed: Optional[int] = None
+    ):
+        kind, *params = latency.split(":")
+        params = [float(p) / 1000 for p in params]
+        expected = {"fixed": 1, "uniform": 2, "exp": 1, "lognormal": 2}
+        if kind not in expected or len(params) != expected[kind]:
+            raise ValueError(f"Invalid latency distribution: {latency}")
+        if kind == "lognormal" and not 0 < params[0] <= params[1]:
+            raise ValueError(f"lognormal needs 0 < P50 <= P99: {latency}")
+        if not 0 <= error_rate <= 1:
+            raise ValueError(f"Invalid error rate: {error_rate}")
+        self.latency = latency
+        self._kind = kind
+        self._params = params
+        self.error_rate = error_rate
+        self.burst_every = burst_every
+        self.burst_seconds = burst_seconds
+        self._random = random.Random(seed)
+        self._started = time.monotonic()
+        self.counts: Counter = Counter()
+
+    @classmethod
+    def parse(cls, spec: Optional[str]) -> "FaultProfile":
+        """Build a profile from a spec string (empty means no faults)"""
+        options = {}
+        for part in filter(None, (p.strip() for p in (spec or "").split(","))):
+            key, _, value = part.partition("=")
+            if key == "latency":
+                options["latency"] = value
+            elif key == "errors":
+                options["error_rate"] = float(value)
+            elif key == "burst":
+                every, _, seconds = value.partition(":")
+                options["burst_every"] = float(every)
+                options["burst_seconds"] = float(seconds or 0)
+            elif key == "seed":
+                options["seed"] = int(value)
+            else:
+                raise ValueError(f"Unknown fault option: {key}")
+        return cls(**options)
+
+    def delay(self) -> float:
+        """Seconds to wait before answering this request"""
+        if self._kind == "fixed":
+            return self._params[0]
+        if self._kind == "uniform":
+            return self._random.uniform(*self._params)
+        if self._kind == "exp":
+            return self._random.expovariate(1 / self._params[0]) if self._params[0] else 0.0
+        p50, p99 = self._params
+        sigma = math.log(p99 / p50) / _Z99
+        return self._random.lognormvariate(math.log(p50), sigma)
+
+    def in_burst(self) -> bool:
+        if not self.burst_every or not self.burst_seconds:
+            return False
+        return (time.monotonic() - self._started) % self.burst_every < self.burst_seconds
+
+    def fault(self) -> Optional[str]:
+        """RATE_LIMITED, SERVER_ERROR or None for this request; counted"""
+        self.counts["requests"] += 1
+        if self.in_burst():
+            self.counts[RATE_LIMITED] += 1
+            return RATE_LIMITED
+        if self.error_rate and self._random.random() < self.error_rate:
+            self.counts[SERVER_ERROR] += 1
+            return SERVER_ERROR
+        return None
+
+    def describe(self) -> str:
+        parts = [f"latency={self.latency}"]
+        if self.error_rate:
+            parts.append(f"errors={self.error_rate:g}")
+        if self.burst_every and self.burst_seconds:
+            parts.append(f"burst={self.burst_every:g}:{self.burst_seconds:g}")
+        return ",".join(parts)
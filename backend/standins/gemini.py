@@ -0,0 +1,135 @@
+"""
+Gemini API stand-in
+Serves GenerateContent and StreamGenerateContent over plaintext gRPC, the
+transport google-generativeai uses for its async calls
+"""
+import asyncio
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from typing import Optional
+
+import grpc
+from google.ai import generativelanguage_v1beta as glm
+
+from standins.faults import FaultProfile, RATE_LIMITED, SERVER_ERROR
+
+SERVICE = "google.ai.generativelanguage.v1beta.GenerativeService"
+
+FILLER = (
+    "Absolute App Labs builds mobile and web products end to end, from discovery "
+    "and design through development, testing, launch and ongoing support. "
+)
+
+
+class GeminiStandin:
+    """
+    gRPC server answering like gemini-2.0-flash
+
+    ``faults`` sets the time to the first chunk (for GenerateContent, the
+    whole answer also waits for the remaining chunks), the share of
+    UNAVAILABLE errors and RESOURCE_EXHAUSTED (429) bursts.
+    """
+
+    def __init__(
+        self,
+        faults: Optional[FaultProfile] = None,
+        chunks: int = 20,
+        chunk_delay: float = 0.04
+    ):
+        self.faults = faults or FaultProfile()
+        self.chunks = chunks
+        self.chunk_delay = chunk_delay
+        self.requests: Counter = Counter()
+        self._server: Optional[grpc.aio.Server] = None
+
+    def _chunk_texts(self, request: glm.GenerateContentRequest):
+        question = ""
+        if request.contents and request.contents[-1].parts:
+            question = request.contents[-1].parts[-1].text.split("User question:")[-1].strip()
+        words = (f'Stand-in answer to "{question[:80]}". ' + FILLER * 4).split(" ")
+        size = max(len(words) // self.chunks, 1)
+        return [" ".join(words[i * size:(i + 1) * size]) + " " for i in range(self.chunks)]
+
+    @staticmethod
+    def _response(text: str, request: glm.GenerateContentRequest, finished: bool, output_tokens: int):
+        prompt_tokens = sum(len(part.text.split()) for content in request.contents for part in content.parts)
+        return glm.GenerateContentResponse(
+            candidates=[glm.Candidate(
+                content=glm.Content(parts=[glm.Part(text=text)], role="model"),
+                finish_reason=glm.Candidate.FinishReason.STOP if finished else glm.Candidate.FinishReason.FINISH_REASON_UNSPECIFIED,
+                index=0
+            )],
+            usage_metadata=glm.GenerateContentResponse.UsageMetadata(
+                prompt_token_count=prompt_tokens,
+                candidates_token_count=output_tokens,
+                total_token_count=prompt_tokens + output_tokens
+            )
+        )
+
+    async def _admit(self, method: str, request: glm.GenerateContentRequest, context):
+        """Count the call, wait the first-chunk latency and inject faults"""
+        self.requests[method] += 1
+        fault = self.faults.fault()
+        await asyncio.sleep(self.faults.delay())
+        if fault == RATE_LIMITED:
+            await context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, "Resource has been exhausted (e.g. check quota).")
+        if fault == SERVER_ERROR:
+            await context.abort(grpc.StatusCode.UNAVAILABLE, "The model is overloaded. Please try again later.")
+        if not request.contents:
+            await context.abort(grpc.StatusCode.INVALID_ARGUMENT, "* GenerateContentRequest.contents: contents is not specified")
+
+    async def generate_content(self, request: glm.GenerateContentRequest, context):
+        await self._admit("GenerateContent", request, context)
+        texts = self._chunk_texts(request)
+        await asyncio.sleep(self.chunk_delay * (len(texts) - 1))
+        text = "".join(texts)
+        return self._response(text, request, True, len(text.split()))
+
+    async def stream_generate_content(self, request: glm.GenerateContentRequest, context):
+        await self._admit("StreamGenerateContent", request, context)
+        texts = self._chunk_texts(request)
+        output_tokens = 0
+        for i, text in enumerate(texts):
+            if i:
+                await asyncio.sleep(self.chunk_delay)
+            # Like Gemini, each chunk reports the output so far
+            output_tokens += len(text.split())
+            yield self._response(text, request, i == len(texts) - 1, output_tokens)
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Start serving on the running event loop; returns the host:port endpoint"""
+        rpc = dict(
+            request_deserializer=glm.GenerateContentRequest.deserialize,
+            response_serializer=glm.GenerateContentResponse.serialize
+        )
+        handler = grpc.method_handlers_generic_handler(SERVICE, {
+            "GenerateContent": grpc.unary_unary_rpc_method_handler(self.generate_content, **rpc),
+            "StreamGenerateContent": grpc.unary_stream_rpc_method_handler(self.stream_generate_content, **rpc)
+        })
+        self._server = grpc.aio.server()
+        self._server.add_generic_rpc_handlers((handler,))
+        port = self._server.add_insecure_port(f"{host}:{port}")
+        await self._server.start()
+        return f"{host}:{port}"
+
+    async def stop(self):
+        if self._server is not None:
+            await self._server.stop(grace=1)
+            self._server = None
+
+
+@contextmanager
+def serve(standin: GeminiStandin, host: str = "127.0.0.1"):
+    """Run the stand-in on its own event loop in a background thread, yielding its endpoint"""
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    endpoint = asyncio.run_coroutine_threadsafe(standin.start(host), loop).result(timeout=10)
+    try:
+        yield endpoint
+    finally:
+        asyncio.run_coroutine_threadsafe(standin.stop(), loop).result(timeout=10)
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout=10)
+        loop.close()
@@ -0,0 +1,246 @@
+"""
+HubSpot CRM stand-in
+Serves the contacts search, create, update and batch endpoints from memory
+"""
+import asyncio
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional, Set
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+from standins.faults import FaultProfile, RATE_LIMITED, SERVER_ERROR
+
+# HubSpot's batch input limit
+BATCH_LIMIT = 100
+SEARCH_MAX_LIMIT = 200
+
+
+class ContactStore:
+    """In-memory contacts plus a count of requests per endpoint and of client connections"""
+
+    def __init__(self):
+        self.contacts: Dict[str, Dict] = {}
+        self.requests: Counter = Counter()
+        self.connections: Set = set()
+        self._next_id = 1
+
+    def reset(self, contacts: Optional[List[Dict]] = None):
+        """Drop every contact and request count, then add ``contacts`` (properties)"""
+        self.contacts.clear()
+        self.requests.clear()
+        self.connections.clear()
+        self._next_id = 1
+        for properties in contacts or []:
+            self.create(properties)
+
+    def find_by_email(self, email: Optional[str]) -> Optional[str]:
+        if not email:
+            return None
+        email = email.lower()
+        for contact_id, properties in self.contacts.items():
+            if (properties.get("email") or "").lower() == email:
+                return contact_id
+        return None
+
+    def create(self, properties: Dict) -> Dict:
+        contact_id = str(self._next_id)
+        self._next_id += 1
+        now = datetime.utcnow().isoformat() + "Z"
+        self.contacts[contact_id] = {**properties, "hs_object_id": contact_id, "createdate": now, "lastmodifieddate": now}
+        return self.view(contact_id)
+
+    def update(self, contact_id: str, properties: Dict) -> Dict:
+        self.contacts[contact_id].update(properties, lastmodifieddate=datetime.utcnow().isoformat() + "Z")
+        return self.view(contact_id)
+
+    def view(self, contact_id: str, names: Optional[List[str]] = None) -> Dict:
+        properties = self.contacts[contact_id]
+        if names:
+            properties = {name: properties.get(name) for name in names}
+        return {
+            "id": contact_id,
+            "properties": properties,
+            "createdAt": self.contacts[contact_id]["createdate"],
+            "updatedAt": self.contacts[contact_id]["lastmodifieddate"],
+            "archived": False
+        }
+
+
+def _error(status: int, category: str, message: str, **context) -> JSONResponse:
+    return JSONResponse(
+        status_code=status,
+        content={"status": "error", "category": category, "message": message, "context": context}
+    )
+
+
+def _matches(properties: Dict, flt: Dict) -> bool:
+    value = str(properties.get(flt.get("propertyName")) or "").lower()
+    operator = flt.get("operator")
+    if operator == "EQ":
+        return value == str(flt.get("value", "")).lower()
+    if operator == "IN":
+        return value in {str(v).lower() for v in flt.get("values", [])}
+    if operator == "HAS_PROPERTY":
+        return bool(value)
+    raise ValueError(f"Unsupported operator {operator}")
+
+
+def _invalid_email(properties: Dict) -> bool:
+    email = properties.get("email")
+    return email is not None and "@" not in email
+
+
+def create_app(latency: float = 0.0, faults: Optional[FaultProfile] = None) -> FastAPI:
+    """
+    Build a stand-in app; every request waits ``latency`` seconds first
+
+    The store is ``app.state.store``. Batch create rejects the whole batch
+    on an invalid email (400), like HubSpot's property validation, while
+    duplicate emails and unknown ids are reported per item (207). A fault
+    profile, when given, replaces the fixed latency and adds 503s and
+    429 bursts (``app.state.faults``).
+    """
+    app = FastAPI(title="HubSpot stand-in")
+    store = ContactStore()
+    faults = faults or FaultProfile(latency=f"fixed:{latency * 1000:g}")
+    app.state.store = store
+    app.state.faults = faults
+
+    @app.middleware("http")
+    async def count_and_delay(request: Request, call_next):
+        if not request.headers.get("authorization", "").startswith("Bearer "):
+            return _error(401, "INVALID_AUTHENTICATION", "Authentication credentials not found")
+        route = request.url.path
+        if route.startswith("/crm/v3/objects/contacts/") and request.method == "PATCH":
+            route = "/crm/v3/objects/contacts/{id}"
+        store.requests[f"{request.method} {route}"] += 1
+        if request.client:
+            # Each new client port is a new TCP connection
+            store.connections.add((request.client.host, request.client.port))
+        fault = faults.fault()
+        delay = faults.delay()
+        if delay:
+            await asyncio.sleep(delay)
+        if fault == RATE_LIMITED:
+            return JSONResponse(status_code=429, content={
+                "status": "error",
+                "message": "You have reached your secondly limit.",
+                "errorType": "RATE_LIMIT",
+                "policyName": "SECONDLY"
+            })
+        if fault == SERVER_ERROR:
+            return _error(503, "SERVICE_UNAVAILABLE", "The service is temporarily unavailable")
+        return await call_next(request)
+
+    @app.post("/crm/v3/objects/contacts/search")
+    async def search(request: Request):
+        body = await request.json()
+        groups = body.get("filterGroups") or []
+        limit = min(int(body.get("limit", 10)), SEARCH_MAX_LIMIT)
+        after = int(body.get("after", 0))
+        try:
+            # Filter groups are OR'd, the filters inside a group AND'd
+            ids = [
+                contact_id for contact_id, properties in store.contacts.items()
+                if any(all(_matches(properties, flt) for flt in group.get("filters", [])) for group in groups)
+            ]
+        except ValueError as e:
+            return _error(400, "VALIDATION_ERROR", str(e))
+        page = ids[after:after + limit]
+        data = {
+            "total": len(ids),
+            "results": [store.view(contact_id, body.get("properties")) for contact_id in page]
+        }
+        if after + limit < len(ids):
+            data["paging"] = {"next": {"after": str(after + limit)}}
+        return data
+
+    @app.post("/crm/v3/objects/contacts", status_code=201)
+    async def create(request: Request):
+        properties = (await request.json()).get("properties", {})
+        if _invalid_email(properties):
+            return _error(400, "VALIDATION_ERROR", f"Property values were not valid: email {properties['email']}")
+        existing = store.find_by_email(properties.get("email"))
+        if existing:
+            return _error(409, "CONFLICT", f"Contact already exists. Existing ID: {existing}")
+        return store.create(properties)
+
+    @app.patch("/crm/v3/objects/contacts/{contact_id}")
+    async def update(contact_id: str, request: Request):
+        if contact_id not in store.contacts:
+            return _error(404, "OBJECT_NOT_FOUND", "resource not found")
+        properties = (await request.json()).get("properties", {})
+        if _invalid_email(properties):
+            return _error(400, "VALIDATION_ERROR", f"Property values were not valid: email {properties['email']}")
+        return store.update(contact_id, properties)
+
+    def _batch_response(results: List[Dict], errors: List[Dict], started: str) -> JSONResponse:
+        content = {
+            "status": "COMPLETE",
+            "results": results,
+            "startedAt": started,
+            "completedAt": datetime.utcnow().isoformat() + "Z"
+        }
+        if errors:
+            content["errors"] = errors
+            content["numErrors"] = len(errors)
+        return JSONResponse(status_code=207 if errors else 201, content=content)
+
+    @app.post("/crm/v3/objects/contacts/batch/create")
+    async def batch_create(request: Request):
+        started = datetime.utcnow().isoformat() + "Z"
+        inputs = (await request.json()).get("inputs", [])
+        if len(inputs) > BATCH_LIMIT:
+            return _error(400, "VALIDATION_ERROR", f"Batch size {len(inputs)} exceeds {BATCH_LIMIT}")
+        invalid = [item["properties"]["email"] for item in inputs if _invalid_email(item.get("properties", {}))]
+        if invalid:
+            return _error(400, "VALIDATION_ERROR", f"Property values were not valid: email {invalid[0]}", email=invalid)
+
+        results, errors = [], []
+        for item in inputs:
+            properties = item.get("properties", {})
+            existing = store.find_by_email(properties.get("email"))
+            if existing:
+                errors.append({
+                    "status": "error",
+                    "category": "CONFLICT",
+                    "message": f"Contact already exists. Existing ID: {existing}",
+                    "context": {"email": [properties.get("email")]}
+                })
+            else:
+                results.append(store.create(properties))
+        return _batch_response(results, errors, started)
+
+    @app.post("/crm/v3/objects/contacts/batch/update")
+    async def batch_update(request: Request):
+        started = datetime.utcnow().isoformat() + "Z"
+        inputs = (await request.json()).get("inputs", [])
+        if len(inputs) > BATCH_LIMIT:
+            return _error(400, "VALIDATION_ERROR", f"Batch size {len(inputs)} exceeds {BATCH_LIMIT}")
+        ids = [str(item.get("id")) for item in inputs]
+        if len(set(ids)) != len(ids):
+            return _error(400, "VALIDATION_ERROR", "Duplicate IDs found in batch input")
+        invalid = [item["properties"]["email"] for item in inputs if _invalid_email(item.get("properties", {}))]
+        if invalid:
+            return _error(400, "VALIDATION_ERROR", f"Property values were not valid: email {invalid[0]}", email=invalid)
+
+        results, errors = [], []
+        for contact_id, item in zip(ids, inputs):
+            if contact_id in store.contacts:
+                results.append(store.update(contact_id, item.get("properties", {})))
+            else:
+                errors.append({
+                    "status": "error",
+                    "category": "OBJECT_NOT_FOUND",
+                    "message": "Could not get some CONTACT objects, they may be deleted or not exist",
+                    "context": {"ids": [contact_id]}
+                })
+        return _batch_response(results, errors, started)
+
+    return app
+
+
+# Run standalone: uvicorn standins.hubspot:app --port 8100 (from backend/)
+app = create_app()
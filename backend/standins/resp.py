@@ -0,0 +1,286 @@
+"""
+Redis stand-in
+Speaks enough of the Redis protocol (RESP2) for the shared state caches and
+the rate limiter's fixed-window counters, with keys and expiry in memory
+"""
+import asyncio
+import hashlib
+import time
+from collections import Counter
+from importlib import resources
+from typing import Dict, List, Optional, Tuple
+
+from standins.faults import FaultProfile
+
+# The Lua script limits runs for fixed-window counters; scripts are not
+# interpreted, so this one is executed natively and any other is refused
+_INCR_EXPIRE = "incr_expire"
+
+
+def _script_sha(name: str) -> Optional[str]:
+    try:
+        source = resources.files("limits").joinpath(f"resources/redis/lua_scripts/{name}.lua").read_bytes()
+    except (ModuleNotFoundError, FileNotFoundError):
+        return None
+    return hashlib.sha1(source).hexdigest()
+
+
+class ProtocolError(Exception):
+    pass
+
+
+class CommandError(Exception):
+    """Answered to the client as an error reply"""
+
+
+class RespStandin:
+    """
+    Single-node Redis over TCP
+
+    ``faults`` delays every command and answers some with an error reply
+    (errors and 429 bursts alike), which clients see as a failed command.
+    Expired keys are dropped when they are next touched.
+    """
+
+    def __init__(self, faults: Optional[FaultProfile] = None):
+        self.faults = faults or FaultProfile()
+        self.commands: Counter = Counter()
+        self._data: Dict[bytes, Tuple[bytes, Optional[float]]] = {}
+        self._scripts: Dict[str, bytes] = {}
+        self._native_scripts = {sha: name for name, sha in ((_INCR_EXPIRE, _script_sha(_INCR_EXPIRE)),) if sha}
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._handlers = {
+            b"PING": self._ping, b"ECHO": self._echo, b"SELECT": self._ok, b"CLIENT": self._ok,
+            b"GET": self._get, b"SET": self._set, b"DEL": self._del, b"EXISTS": self._exists,
+            b"INCR": self._incr, b"INCRBY": self._incrby, b"EXPIRE": self._expire, b"PEXPIRE": self._pexpire,
+            b"TTL": self._ttl, b"PTTL": self._pttl, b"DBSIZE": self._dbsize, b"FLUSHDB": self._flushdb,
+            b"FLUSHALL": self._flushdb, b"SCRIPT": self._script, b"EVALSHA": self._evalsha, b"EVAL": self._eval
+        }
+
+    # Keyspace
+
+    def _live(self, key: bytes) -> Optional[Tuple[bytes, Optional[float]]]:
+        entry = self._data.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.monotonic():
+            del self._data[key]
+            return None
+        return entry
+
+    def _integer(self, key: bytes) -> int:
+        entry = self._live(key)
+        if entry is None:
+            return 0
+        try:
+            return int(entry[0])
+        except ValueError:
+            raise CommandError("ERR value is not an integer or out of range")
+
+    def _add(self, key: bytes, amount: int) -> int:
+        value = self._integer(key) + amount
+        entry = self._live(key)
+        self._data[key] = (str(value).encode(), entry[1] if entry else None)
+        return value
+
+    def _set_expiry(self, key: bytes, seconds: float) -> int:
+        entry = self._live(key)
+        if entry is None:
+            return 0
+        self._data[key] = (entry[0], time.monotonic() + seconds)
+        return 1
+
+    def _remaining(self, key: bytes, scale: int) -> int:
+        entry = self._live(key)
+        if entry is None:
+            return -2
+        if entry[1] is None:
+            return -1
+        return max(int((entry[1] - time.monotonic()) * scale), 0)
+
+    # Commands
+
+    def _ping(self, args):
+        return args[0] if args else "PONG"
+
+    def _echo(self, args):
+        return args[0]
+
+    def _ok(self, args):
+        return "OK"
+
+    def _get(self, args):
+        entry = self._live(args[0])
+        return None if entry is None else entry[0]
+
+    def _set(self, args):
+        key, value, *options = args
+        expires = None
+        only_if = None
+        i = 0
+        while i < len(options):
+            option = options[i].upper()
+            if option in (b"EX", b"PX"):
+                amount = int(options[i + 1])
+                expires = time.monotonic() + (amount if option == b"EX" else amount / 1000)
+                i += 2
+                continue
+            if option in (b"NX", b"XX"):
+                only_if = option
+            else:
+                raise CommandError("ERR syntax error")
+            i += 1
+        exists = self._live(key) is not None
+        if (only_if == b"NX" and exists) or (only_if == b"XX" and not exists):
+            return None
+        self._data[key] = (value, expires)
+        return "OK"
+
+    def _del(self, args):
+        deleted = 0
+        for key in args:
+            if self._live(key) is not None:
+                del self._data[key]
+                deleted += 1
+        return deleted
+
+    def _exists(self, args):
+        return sum(self._live(key) is not None for key in args)
+
+    def _incr(self, args):
+        return self._add(args[0], 1)
+
+    def _incrby(self, args):
+        return self._add(args[0], int(args[1]))
+
+    def _expire(self, args):
+        return self._set_expiry(args[0], int(args[1]))
+
+    def _pexpire(self, args):
+        return self._set_expiry(args[0], int(args[1]) / 1000)
+
+    def _ttl(self, args):
+        return self._remaining(args[0], 1)
+
+    def _pttl(self, args):
+        return self._remaining(args[0], 1000)
+
+    def _dbsize(self, args):
+        return sum(self._live(key) is not None for key in list(self._data))
+
+    def _flushdb(self, args):
+        self._data.clear()
+        return "OK"
+
+    def _script(self, args):
+        subcommand = args[0].upper()
+        if subcommand == b"LOAD":
+            sha = hashlib.sha1(args[1]).hexdigest()
+            self._scripts[sha] = args[1]
+            return sha.encode()
+        if subcommand == b"EXISTS":
+            return [int(sha.decode() in self._scripts) for sha in args[1:]]
+        if subcommand == b"FLUSH":
+            self._scripts.clear()
+            return "OK"
+        raise CommandError(f"ERR unknown SCRIPT subcommand '{subcommand.decode()}'")
+
+    def _run_script(self, sha: str, args):
+        count = int(args[0])
+        keys, argv = args[1:1 + count], args[1 + count:]
+        name = self._native_scripts.get(sha)
+        if name == _INCR_EXPIRE:
+            amount = int(argv[1])
+            current = self._add(keys[0], amount)
+            if current == amount:
+                self._set_expiry(keys[0], int(argv[0]))
+            return current
+        raise CommandError("ERR the stand-in does not run this script")
+
+    def _evalsha(self, args):
+        sha = args[0].decode().lower()
+        if sha not in self._scripts:
+            raise CommandError("NOSCRIPT No matching script. Please use EVAL.")
+        return self._run_script(sha, args[1:])
+
+    def _eval(self, args):
+        sha = hashlib.sha1(args[0]).hexdigest()
+        self._scripts[sha] = args[0]
+        return self._run_script(sha, args[1:])
+
+    # Protocol
+
+    @staticmethod
+    async def _read_command(reader: asyncio.StreamReader) -> Optional[List[bytes]]:
+        line = await reader.readline()
+        if not line:
+            return None
+        if not line.startswith(b"*"):
+            # Inline command, as typed into telnet
+            return line.split()
+        args = []
+        for _ in range(int(line[1:])):
+            header = await reader.readline()
+            if not header.startswith(b"$"):
+                raise ProtocolError("expected a bulk string")
+            length = int(header[1:])
+            args.append((await reader.readexactly(length + 2))[:-2])
+        return args
+
+    @classmethod
+    def _encode(cls, value) -> bytes:
+        if value is None:
+            return b"$-1\r\n"
+        if isinstance(value, str):
+            return b"+" + value.encode() + b"\r\n"
+        if isinstance(value, int):
+            return b":" + str(int(value)).encode() + b"\r\n"
+        if isinstance(value, bytes):
+            return b"$" + str(len(value)).encode() + b"\r\n" + value + b"\r\n"
+        if isinstance(value, list):
+            return b"*" + str(len(value)).encode() + b"\r\n" + b"".join(cls._encode(item) for item in value)
+        raise TypeError(f"Cannot encode {type(value).__name__}")
+
+    async def _execute(self, command: List[bytes]) -> bytes:
+        name = command[0].upper()
+        self.commands[name.decode(errors="replace")] += 1
+        delay = self.faults.delay()
+        if delay:
+            await asyncio.sleep(delay)
+        if self.faults.fault():
+            return b"-ERR stand-in fault\r\n"
+        handler = self._handlers.get(name)
+        if handler is None:
+            return f"-ERR unknown command '{name.decode(errors='replace')}'\r\n".encode()
+        try:
+            return self._encode(handler(command[1:]))
+        except CommandError as e:
+            return f"-{e}\r\n".encode()
+        except (IndexError, ValueError):
+            return f"-ERR wrong arguments for '{name.decode(errors='replace')}' command\r\n".encode()
+
+    async def _serve_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                command = await self._read_command(reader)
+                if command is None:
+                    break
+                if not command:
+                    continue
+                # Pipelined commands are answered in order
+                writer.write(await self._execute(command))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, ProtocolError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Start serving on the running event loop; returns a redis:// URL"""
+        self._server = await asyncio.start_server(self._serve_client, host, port)
+        port = self._server.sockets[0].getsockname()[1]
+        return f"redis://{host}:{port}/0"
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
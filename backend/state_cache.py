@@ -0,0 +1,139 @@
+"""
+Cache of live conversation states per session
+Lets an active conversation skip the session SELECT and the JSON decode
+"""
+import sys
+from collections import OrderedDict
+from typing import Dict, Optional
+from config import STATE_CACHE_ENABLED, STATE_CACHE_SESSIONS, SESSION_TIMEOUT
+from conversation_state import ConversationState
+from shared_state import SHARED, shared_cache
+
+
+def _deep_sizeof(obj) -> int:
+    """Approximate memory held by plain containers, strings and numbers"""
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(_deep_sizeof(k) + _deep_sizeof(v) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set)):
+        size += sum(_deep_sizeof(item) for item in obj)
+    return size
+
+
+class StateCache:
+    """
+    Keeps the ConversationState of up to ``max_sessions`` sessions
+    
+    Entries are written through: a turn stores its state here only after
+    the database write succeeded, and a turn that fails drops the entry so
+    the next one reloads from the database. Only valid while a single
+    process serves a session.
+    """
+    
+    def __init__(self, max_sessions: int):
+        self.max_sessions = max_sessions
+        self._states: "OrderedDict[str, ConversationState]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    async def get(self, session_id: str) -> Optional[ConversationState]:
+        """Return the live state object or None on a miss"""
+        state = self._states.get(session_id)
+        if state is None:
+            self.misses += 1
+            return None
+        self._states.move_to_end(session_id)
+        self.hits += 1
+        return state
+    
+    async def put(self, session_id: str, state: ConversationState):
+        """Record the state a turn just persisted"""
+        self._states[session_id] = state
+        self._states.move_to_end(session_id)
+        while len(self._states) > self.max_sessions:
+            self._states.popitem(last=False)
+            self.evictions += 1
+    
+    async def invalidate(self, session_id: str):
+        """Drop a session, e.g. after it was deleted or a turn failed"""
+        self._states.pop(session_id, None)
+    
+    def memory_bytes(self) -> int:
+        """Approximate memory held by cached states (walks every entry)"""
+        return sum(
+            _deep_sizeof(session_id) + sys.getsizeof(state)
+            + sum(_deep_sizeof(getattr(state, name)) for name in state.__slots__)
+            for session_id, state in self._states.items()
+        )
+    
+    def stats(self) -> Dict:
+        """Snapshot of cache metrics"""
+        lookups = self.hits + self.misses
+        return {
+            "sessions": len(self._states),
+            "max_sessions": self.max_sessions,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "memory_bytes": self.memory_bytes()
+        }
+
+
+class SharedStateCache:
+    """
+    Conversation states on the shared backend, for several worker processes
+    
+    Same write-through contract as StateCache, but every worker sees the
+    same entry, so a session may move between workers. States are stored in
+    the binary state format and expire after ``ttl`` seconds. ``get``
+    returns a decoded copy: a change to it only takes effect once ``put``.
+    If Redis fails both the write and the delete that follows it, the old
+    entry can be served until it expires.
+    """
+    
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._states = shared_cache(
+            "state", 0, ttl, encode=ConversationState.to_bytes, decode=ConversationState.from_bytes
+        )
+        self.hits = 0
+        self.misses = 0
+    
+    async def get(self, session_id: str) -> Optional[ConversationState]:
+        """Return the session's state or None on a miss"""
+        state = await self._states.get(session_id)
+        if state is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return state
+    
+    async def put(self, session_id: str, state: ConversationState):
+        """Record the state a turn just persisted"""
+        await self._states.set(session_id, state)
+    
+    async def invalidate(self, session_id: str):
+        """Drop a session, e.g. after it was deleted or a turn failed"""
+        await self._states.delete(session_id)
+    
+    def stats(self) -> Dict:
+        """Snapshot of this worker's cache metrics"""
+        lookups = self.hits + self.misses
+        return {
+            "shared": True,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+
+# Global cache instance (None when disabled)
+if not STATE_CACHE_ENABLED:
+    state_cache = None
+elif SHARED:
+    state_cache = SharedStateCache(SESSION_TIMEOUT)
+else:
+    state_cache = StateCache(STATE_CACHE_SESSIONS)
@@ -0,0 +1,255 @@
+"""
+Rolling conversation summary
+Folds messages that fell out of the MAX_HISTORY_LENGTH window into a short
+summary kept in the conversation state, off the request path
+"""
+import asyncio
+import time
+from typing import Dict, List, Optional, Set
+
+from sqlalchemy import select, update
+
+from config import (
+    MAX_HISTORY_LENGTH, SUMMARY_ENABLED, SUMMARY_MIN_MESSAGES, SUMMARY_MAX_FOLD_MESSAGES,
+    SUMMARY_WORKERS, SUMMARY_MAX_PENDING
+)
+from conversation_state import ConversationState
+from database import AsyncSessionLocal, ChatSession, ChatMessage
+from llm import summarize_messages
+from state_cache import state_cache
+from write_behind import write_queue
+
+_STOP = None
+
+# Tries to write a summary while turns keep changing the stored state
+STORE_ATTEMPTS = 3
+
+
+def _unchanged(column, value):
+    """Condition that ``column`` still holds ``value`` (NULL included)"""
+    return column.is_(None) if value is None else column == value
+
+
+class ConversationSummarizer:
+    """
+    Background workers that keep each long session's summary current
+
+    A turn that filled its history window schedules its session. A worker
+    reads the session's messages after ``summarized_through``; when at least
+    ``min_messages`` of them are older than the window, up to ``max_fold`` of
+    the oldest are folded into the summary with one Gemini call. A session
+    is queued at most once at a time; when the queue is full the session is
+    simply picked up on a later turn.
+    """
+
+    def __init__(
+        self,
+        window: int,
+        min_messages: int = 4,
+        max_fold: int = 20,
+        workers: int = 4,
+        max_pending: int = 1000
+    ):
+        self.window = window
+        self.min_messages = max(min_messages, 1)
+        self.max_fold = max(max_fold, self.min_messages)
+        self.workers = workers
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+        self._queued: Set[str] = set()
+        self._tasks: List[asyncio.Task] = []
+
+        # Metrics
+        self.scheduled = 0
+        self.dropped = 0
+        self.updates = 0
+        self.skipped = 0
+        self.failures = 0
+        self.conflicts = 0
+        self.messages_folded = 0
+        self.update_seconds = 0.0
+        self.last_error: Optional[str] = None
+
+    def start(self):
+        """Start the workers on the running event loop"""
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._run()) for _ in range(self.workers)]
+
+    async def stop(self):
+        """Finish the summaries in progress and drop the rest"""
+        if self._tasks:
+            while not self._queue.empty():
+                self._queue.get_nowait()
+            self._queued.clear()
+            for _ in self._tasks:
+                await self._queue.put(_STOP)
+            await asyncio.gather(*self._tasks)
+            self._tasks = []
+
+    def schedule(self, session_id: str):
+        """Queue a session for a summary check; never blocks"""
+        if session_id in self._queued:
+            return
+        try:
+            self._queue.put_nowait(session_id)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return
+        self._queued.add(session_id)
+        self.scheduled += 1
+
+    async def _run(self):
+        while True:
+            session_id = await self._queue.get()
+            if session_id is _STOP:
+                return
+            self._queued.discard(session_id)
+            try:
+                await self.update_session(session_id)
+            except Exception as e:
+                self.failures += 1
+                self.last_error = str(e)
+                print(f"⚠️  Summary of session {session_id} failed: {e}")
+
+    async def update_session(self, session_id: str) -> bool:
+        """
+        Fold a session's messages older than the window into its summary
+
+        Args:
+            session_id: Session ID
+
+        Returns:
+            True if the summary was updated
+        """
+        if write_queue:
+            # The turn that scheduled this may still be queued
+            await write_queue.wait_for_session(session_id)
+
+        async with AsyncSessionLocal() as db:
+            session = await db.get(ChatSession, session_id)
+            if session is None:
+                return False
+            state = ConversationState.from_stored(session.conversation_state_bin, session.conversation_state)
+            # Oldest first, and only as many as one fold (plus enough to know
+            # whether another one is due) and the window can use
+            result = await db.execute(
+                select(ChatMessage.id, ChatMessage.role, ChatMessage.content)
+                .where(ChatMessage.session_id == session_id, ChatMessage.id > state.summarized_through)
+                .order_by(ChatMessage.timestamp, ChatMessage.id)
+                .limit(self.window + self.max_fold + self.min_messages)
+            )
+            rows = result.all()
+
+        outside_window = rows[:max(len(rows) - self.window, 0)]
+        if len(outside_window) < self.min_messages:
+            self.skipped += 1
+            return False
+        fold = outside_window[:self.max_fold]
+
+        start = time.monotonic()
+        usage = {}
+        summary = await summarize_messages(
+            state.summary,
+            [{"role": row.role, "content": row.content} for row in fold],
+            usage
+        )
+        if summary is None:
+            self.failures += 1
+            return False
+        self.update_seconds += time.monotonic() - start
+
+        await self._store(session_id, summary, fold[-1].id, usage)
+        self.updates += 1
+        self.messages_folded += len(fold)
+        if len(outside_window) - len(fold) >= self.min_messages:
+            # A long backlog (e.g. after enabling summaries) folds in steps
+            self.schedule(session_id)
+        return True
+
+    async def _store(self, session_id: str, summary: str, through: int, usage: Dict):
+        """
+        Put the summary into the cached and the stored state
+
+        Like the lead outbox's contact id, it goes into the cached state
+        first, since the next turn saves that. The stored state is replaced
+        only if it is still the one the summary was merged into, so a turn or
+        contact id written meanwhile is never overwritten; after a few lost
+        races the summary is dropped and the messages are folded again later.
+        """
+        if state_cache:
+            cached = await state_cache.get(session_id)
+            if cached is not None and cached.summarized_through < through:
+                cached.update(summary=summary, summarized_through=through)
+                await state_cache.put(session_id, cached)
+        if write_queue:
+            await write_queue.wait_for_session(session_id)
+
+        async with AsyncSessionLocal() as db:
+            for _ in range(STORE_ATTEMPTS):
+                row = (await db.execute(
+                    select(ChatSession.conversation_state_bin, ChatSession.conversation_state)
+                    .where(ChatSession.id == session_id)
+                )).first()
+                if row is None:
+                    # Deleted or archived meanwhile
+                    return
+                state = ConversationState.from_stored(row.conversation_state_bin, row.conversation_state)
+                if state.summarized_through >= through:
+                    return
+                state.update(summary=summary, summarized_through=through)
+                # Only the state and usage change; updated_at stays the last turn's time
+                result = await db.execute(
+                    update(ChatSession)
+                    .where(
+                        ChatSession.id == session_id,
+                        _unchanged(ChatSession.conversation_state_bin, row.conversation_state_bin),
+                        _unchanged(ChatSession.conversation_state, row.conversation_state)
+                    )
+                    .values(
+                        conversation_state_bin=state.to_bytes(),
+                        conversation_state=None,
+                        prompt_tokens=ChatSession.prompt_tokens + usage.get("prompt_tokens", 0),
+                        output_tokens=ChatSession.output_tokens + usage.get("output_tokens", 0),
+                        updated_at=ChatSession.updated_at
+                    )
+                )
+                await db.commit()
+                if result.rowcount:
+                    return
+                self.conflicts += 1
+
+            # The tokens were spent all the same
+            await db.execute(
+                update(ChatSession)
+                .where(ChatSession.id == session_id)
+                .values(
+                    prompt_tokens=ChatSession.prompt_tokens + usage.get("prompt_tokens", 0),
+                    output_tokens=ChatSession.output_tokens + usage.get("output_tokens", 0),
+                    updated_at=ChatSession.updated_at
+                )
+            )
+            await db.commit()
+
+    def stats(self) -> Dict:
+        """Snapshot of summarizer metrics"""
+        return {
+            "queue_depth": self._queue.qsize(),
+            "scheduled": self.scheduled,
+            "dropped": self.dropped,
+            "updates": self.updates,
+            "skipped": self.skipped,
+            "failures": self.failures,
+            "conflicts": self.conflicts,
+            "messages_folded": self.messages_folded,
+            "avg_update_ms": round(self.update_seconds / self.updates * 1000, 2) if self.updates else 0.0,
+            "last_error": self.last_error
+        }
+
+
+# Global summarizer (None when summaries are disabled)
+summarizer = ConversationSummarizer(
+    window=MAX_HISTORY_LENGTH,
+    min_messages=SUMMARY_MIN_MESSAGES,
+    max_fold=SUMMARY_MAX_FOLD_MESSAGES,
+    workers=SUMMARY_WORKERS,
+    max_pending=SUMMARY_MAX_PENDING
+) if SUMMARY_ENABLED else None
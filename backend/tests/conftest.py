@@ -0,0 +1,21 @@
+"""
+Test environment: a throwaway SQLite database and no real API keys
+
+Set before any backend module is imported, since config.py reads the
+environment once at import time.
+"""
+import os
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+WORK_DIR = tempfile.mkdtemp(prefix="aal-tests-")
+
+os.environ["GOOGLE_API_KEY"] = "test-not-a-real-key"
+os.environ["GOOGLE_CSE_ID"] = ""
+os.environ["HUBSPOT_API_KEY"] = ""
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(WORK_DIR, 'test.db')}"
+os.environ["ARCHIVE_DIR"] = os.path.join(WORK_DIR, "archive")
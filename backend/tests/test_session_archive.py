@@ -0,0 +1,126 @@
+"""
+Archiving and restoring sessions (session_archive.py)
+"""
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select
+
+from conversation_state import ConversationState, ConversationStage
+from database import AsyncSessionLocal, ArchivedSession, ChatMessage, ChatSession, init_db
+from session_archive import SessionArchiver, session_archive
+
+init_db()
+
+
+async def _add_turns(session_id: str, turns: int, summarized: int = 0):
+    """Add turns to a finished session, creating it if needed; returns the summarized message id"""
+    async with AsyncSessionLocal() as db:
+        session = await db.get(ChatSession, session_id)
+        if session is None:
+            session = ChatSession(id=session_id, message_count=0)
+            db.add(session)
+        state = ConversationState.from_stored(session.conversation_state_bin, session.conversation_state)
+        state.update(stage=ConversationStage.GENERAL_QA.value, product_type="other")
+        messages = []
+        for i in range(turns):
+            messages.append(ChatMessage(session_id=session_id, role="user", content=f"question {i}"))
+            messages.append(ChatMessage(session_id=session_id, role="assistant", content=f"answer {i}"))
+        db.add_all(messages)
+        await db.flush()
+        if summarized:
+            state.update(summary="Asked about apps", summarized_through=messages[summarized - 1].id)
+        session.conversation_state_bin = state.to_bytes()
+        session.message_count += len(messages)
+        # Idle long enough to be archived
+        session.updated_at = datetime.utcnow() - timedelta(hours=1)
+        await db.commit()
+        return state.summarized_through
+
+
+async def _archive() -> int:
+    archiver = SessionArchiver(session_archive, idle_seconds=60, interval=60)
+    return await archiver.run()
+
+
+async def _transcript(session_id: str):
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(ChatMessage.content)
+            .where(ChatMessage.session_id == session_id)
+            .order_by(ChatMessage.timestamp, ChatMessage.id)
+        )
+        return result.scalars().all()
+
+
+async def _restore(session_id: str):
+    async with AsyncSessionLocal() as db:
+        return await session_archive.restore_session(db, session_id, "127.0.0.1")
+
+
+def test_archive_restore_archive_keeps_the_whole_transcript():
+    async def scenario():
+        session_id = str(uuid.uuid4())
+        await _add_turns(session_id, 6)
+        assert await _archive() >= 1
+
+        restored = await _restore(session_id)
+        assert restored.message_count == 12
+        assert len(await _transcript(session_id)) == 12
+        async with AsyncSessionLocal() as db:
+            assert await db.get(ArchivedSession, session_id) is None
+
+        # The returning visitor chats on, then goes idle again
+        await _add_turns(session_id, 1)
+        assert await _archive() >= 1
+        async with AsyncSessionLocal() as db:
+            record = await session_archive.load(db, session_id)
+            entry = await db.get(ArchivedSession, session_id)
+        assert record["message_count"] == entry.message_count == 14
+        assert [m["content"] for m in record["messages"]][:2] == ["question 0", "answer 0"]
+        assert len(record["messages"]) == 14
+
+        restored = await _restore(session_id)
+        assert restored.message_count == 14
+        assert len(await _transcript(session_id)) == 14
+
+    asyncio.run(scenario())
+
+
+def test_restore_moves_the_summary_pointer_to_the_new_ids():
+    async def scenario():
+        session_id = str(uuid.uuid4())
+        await _add_turns(session_id, 4, summarized=4)
+        await _archive()
+
+        restored = await _restore(session_id)
+        state = ConversationState.from_stored(restored.conversation_state_bin, restored.conversation_state)
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(ChatMessage.id)
+                .where(ChatMessage.session_id == session_id)
+                .order_by(ChatMessage.timestamp, ChatMessage.id)
+            )
+            ids = result.scalars().all()
+        assert state.summary == "Asked about apps"
+        assert state.summarized_through == ids[3]
+
+    asyncio.run(scenario())
+
+
+def test_concurrent_restores_return_the_same_session():
+    async def scenario():
+        session_id = str(uuid.uuid4())
+        await _add_turns(session_id, 3)
+        await _archive()
+
+        first, second = await asyncio.gather(_restore(session_id), _restore(session_id))
+        assert first is not None and second is not None
+        assert first.id == second.id == session_id
+        assert len(await _transcript(session_id)) == 6
+        async with AsyncSessionLocal() as db:
+            count = await db.scalar(select(func.count()).select_from(ChatSession).where(ChatSession.id == session_id))
+        assert count == 1
+
+    asyncio.run(scenario())
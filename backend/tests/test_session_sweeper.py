@@ -0,0 +1,54 @@
+"""
+Sweeping idle sessions (session_sweeper.py)
+"""
+import asyncio
+import json
+import uuid
+from datetime import datetime, timedelta
+
+from conversation_state import ConversationState, ConversationStage
+from database import AsyncSessionLocal, ChatMessage, ChatSession, LeadOutbox, init_db
+from lead_outbox import STATUS_QUEUED
+from session_archive import SessionArchiver, session_archive
+from session_sweeper import SessionSweeper
+
+init_db()
+
+
+async def _add_idle_session(stage: ConversationStage) -> str:
+    session_id = str(uuid.uuid4())
+    state = ConversationState()
+    state.update(stage=stage.value)
+    async with AsyncSessionLocal() as db:
+        db.add(ChatSession(
+            id=session_id,
+            message_count=2,
+            conversation_state_bin=state.to_bytes(),
+            updated_at=datetime.utcnow() - timedelta(hours=2)
+        ))
+        db.add_all([
+            ChatMessage(session_id=session_id, role="user", content="my email is jane@example.com"),
+            ChatMessage(session_id=session_id, role="assistant", content="Thanks, we'll be in touch"),
+        ])
+        await db.commit()
+    return session_id
+
+
+def test_sweep_keeps_sessions_with_a_queued_lead_for_the_archiver():
+    async def scenario():
+        queued_id = await _add_idle_session(ConversationStage.LEAD_COMPLETE)
+        abandoned_id = await _add_idle_session(ConversationStage.COLLECTING_EMAIL)
+        async with AsyncSessionLocal() as db:
+            db.add(LeadOutbox(session_id=queued_id, payload=json.dumps({"email": "jane@example.com"}), status=STATUS_QUEUED))
+            await db.commit()
+
+        archiver = SessionArchiver(session_archive, idle_seconds=60, interval=60)
+        sweeper = SessionSweeper(timeout=60, interval=60, archiver=archiver)
+        await sweeper.sweep()
+
+        async with AsyncSessionLocal() as db:
+            assert await db.get(ChatSession, queued_id) is not None
+            assert await db.get(ChatSession, abandoned_id) is None
+        assert sweeper.stats()["skipped_archivable"] >= 1
+
+    asyncio.run(scenario())
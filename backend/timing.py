@@ -0,0 +1,65 @@
+"""
+Per-stage latency tracking for a single chat turn
+"""
+import time
+from contextlib import contextmanager
+from typing import Awaitable, Dict, TypeVar
+
+T = TypeVar("T")
+
+
+class StageTimer:
+    """
+    Records how long each stage of a turn took
+    
+    Stages timed with ``track`` run in the background (e.g. a speculative
+    search during DB reads). Time the turn spends blocked on one is timed as
+    "<name>_wait". ``overlap_saved`` is how much faster the turn was than
+    running every stage back to back.
+    """
+    
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self.background = set()
+    
+    def _record(self, name: str, seconds: float):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+    
+    @contextmanager
+    def stage(self, name: str):
+        """Time a synchronous or awaited block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._record(name, time.perf_counter() - start)
+    
+    async def track(self, name: str, awaitable: Awaitable[T]) -> T:
+        """Time an awaitable, typically wrapped in a background task"""
+        self.background.add(name)
+        start = time.perf_counter()
+        try:
+            return await awaitable
+        finally:
+            self._record(name, time.perf_counter() - start)
+    
+    def wall(self) -> float:
+        """Seconds since the timer was created"""
+        return time.perf_counter() - self.started
+    
+    def summary(self) -> Dict[str, float]:
+        """Stage times, wall time and time saved by overlap, in milliseconds"""
+        wall = self.wall()
+        waits = {f"{name}_wait" for name in self.background}
+        sequential = sum(
+            seconds for name, seconds in self.stages.items() if name not in waits
+        )
+        summary = {name: round(seconds * 1000, 2) for name, seconds in self.stages.items()}
+        summary["wall"] = round(wall * 1000, 2)
+        summary["overlap_saved"] = round(max(sequential - wall, 0.0) * 1000, 2)
+        return summary
+    
+    def server_timing(self) -> str:
+        """Value for the Server-Timing response header"""
+        return ", ".join(f"{name};dur={ms}" for name, ms in self.summary().items())
@@ -0,0 +1,263 @@
+"""
+Write-behind queue for chat turn persistence
+Batches many turns into one transaction (group commit) on a single writer task
+"""
+import asyncio
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import insert, update, bindparam
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from config import (
+    WRITE_BEHIND_ENABLED, WRITE_BEHIND_BATCH_SIZE, WRITE_BEHIND_FLUSH_MS,
+    WRITE_BEHIND_MAX_PENDING, WRITE_BEHIND_DURABILITY
+)
+from database import AsyncSessionLocal, ChatSession, ChatMessage, LeadOutbox
+
+# Durability modes
+DURABILITY_COMMIT = "commit"  # a turn returns once its batch is committed
+DURABILITY_ASYNC = "async"    # a turn returns once its writes are queued
+
+_STOP = object()
+
+
+class PendingTurn:
+    """Everything one turn writes, as plain data owned by the writer"""
+
+    __slots__ = ("session_id", "ip_address", "is_new_session", "messages",
+                 "state_blob", "leads", "prompt_tokens", "output_tokens", "updated_at", "done")
+
+    def __init__(
+        self,
+        session_id: str,
+        messages: List[Dict],
+        state_blob: bytes,
+        is_new_session: bool = False,
+        ip_address: Optional[str] = None,
+        leads: Optional[List[Dict]] = None,
+        prompt_tokens: int = 0,
+        output_tokens: int = 0
+    ):
+        self.session_id = session_id
+        self.ip_address = ip_address
+        self.is_new_session = is_new_session
+        self.messages = messages
+        self.state_blob = state_blob
+        # lead_outbox rows completed by this turn
+        self.leads = leads or []
+        # Gemini token usage to add to the session's counters
+        self.prompt_tokens = prompt_tokens
+        self.output_tokens = output_tokens
+        self.updated_at = datetime.utcnow()
+        self.done: asyncio.Future = asyncio.get_running_loop().create_future()
+
+
+class WriteBehindQueue:
+    """
+    Group-commit writer for chat messages and session state
+
+    A batch is flushed when it reaches ``batch_size`` turns or
+    ``flush_interval`` seconds after its first turn arrived, whichever
+    comes first. ``stop()`` drains everything still queued.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = 64,
+        flush_interval: float = 0.01,
+        max_pending: int = 10000,
+        durability: str = DURABILITY_COMMIT
+    ):
+        if durability not in (DURABILITY_COMMIT, DURABILITY_ASYNC):
+            raise ValueError(f"Unknown write-behind durability: {durability}")
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.durability = durability
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+        self._task: Optional[asyncio.Task] = None
+        # Latest queued turn per session, for read-your-writes
+        self._pending: Dict[str, PendingTurn] = {}
+
+        # Metrics
+        self.batches = 0
+        self.turns_written = 0
+        self.max_batch = 0
+        self.failures = 0
+        self.commit_seconds = 0.0
+
+    def start(self):
+        """Start the writer task on the running event loop"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Flush everything queued, then stop the writer"""
+        if self._task is not None:
+            await self._queue.put(_STOP)
+            await self._task
+            self._task = None
+
+    async def submit(self, turn: PendingTurn):
+        """
+        Queue a turn's writes
+
+        In commit mode this waits until the batch holding the turn is
+        committed and re-raises a failed commit.
+        """
+        self._pending[turn.session_id] = turn
+        await self._queue.put(turn)
+        if self.durability == DURABILITY_COMMIT:
+            await asyncio.shield(turn.done)
+
+    def is_pending(self, session_id: str) -> bool:
+        """Whether ``session_id`` has writes that are not committed yet"""
+        return session_id in self._pending
+
+    async def wait_for_session(self, session_id: str):
+        """Wait until every queued write for ``session_id`` is committed"""
+        turn = self._pending.get(session_id)
+        if turn is not None:
+            # A failure was already reported by the writer
+            await asyncio.wait({turn.done})
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = loop.time() + self.flush_interval
+
+            while len(batch) < self.batch_size:
+                # Take whatever is already queued without waiting
+                try:
+                    item = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), remaining)
+                    except asyncio.TimeoutError:
+                        break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            await self._flush(batch)
+
+    async def _flush(self, batch: List[PendingTurn]):
+        start = time.monotonic()
+        try:
+            await self._commit(batch)
+            results: List[Tuple[PendingTurn, Optional[BaseException]]] = [(turn, None) for turn in batch]
+        except Exception as e:
+            print(f"Write-behind batch of {len(batch)} failed, retrying turn by turn: {e}")
+            # One bad turn must not take the rest of the batch with it
+            results = []
+            for turn in batch:
+                try:
+                    await self._commit([turn])
+                    results.append((turn, None))
+                except Exception as turn_error:
+                    print(f"Write-behind turn for session {turn.session_id} failed: {turn_error}")
+                    self.failures += 1
+                    results.append((turn, turn_error))
+
+        self.commit_seconds += time.monotonic() - start
+        self.batches += 1
+        self.max_batch = max(self.max_batch, len(batch))
+
+        for turn, error in results:
+            if error is None:
+                self.turns_written += 1
+                turn.done.set_result(True)
+            else:
+                turn.done.set_exception(error)
+                # Nobody awaits async-mode turns; avoid "exception never retrieved"
+                turn.done.exception()
+            if self._pending.get(turn.session_id) is turn:
+                del self._pending[turn.session_id]
+
+    async def _commit(self, batch: List[PendingTurn]):
+        """Write a batch in a single transaction"""
+        new_sessions = [
+            {
+                "id": turn.session_id,
+                "ip_address": turn.ip_address,
+                "created_at": turn.updated_at,
+                "updated_at": turn.updated_at
+            }
+            for turn in batch if turn.is_new_session
+        ]
+        messages = [message for turn in batch for message in turn.messages]
+        leads = [lead for turn in batch for lead in turn.leads]
+
+        # Only the last state written per session matters; counters add up
+        states = {}
+        for turn in batch:
+            previous = states.get(turn.session_id)
+            states[turn.session_id] = {
+                "b_id": turn.session_id,
+                "conversation_state_bin": turn.state_blob,
+                "b_added": len(turn.messages) + (previous["b_added"] if previous else 0),
+                "b_prompt_tokens": turn.prompt_tokens + (previous["b_prompt_tokens"] if previous else 0),
+                "b_output_tokens": turn.output_tokens + (previous["b_output_tokens"] if previous else 0),
+                "updated_at": turn.updated_at
+            }
+
+        async with AsyncSessionLocal() as db:
+            if new_sessions:
+                await db.execute(
+                    sqlite_insert(ChatSession.__table__).on_conflict_do_nothing(index_elements=["id"]),
+                    new_sessions
+                )
+            if messages:
+                await db.execute(insert(ChatMessage.__table__), messages)
+            if leads:
+                await db.execute(insert(LeadOutbox.__table__), leads)
+            # Core statements: executemany without the ORM's bulk-by-PK mode
+            sessions = ChatSession.__table__
+            await db.execute(
+                update(sessions)
+                .where(sessions.c.id == bindparam("b_id"))
+                .values(
+                    conversation_state_bin=bindparam("conversation_state_bin"),
+                    conversation_state=None,
+                    message_count=sessions.c.message_count + bindparam("b_added"),
+                    prompt_tokens=sessions.c.prompt_tokens + bindparam("b_prompt_tokens"),
+                    output_tokens=sessions.c.output_tokens + bindparam("b_output_tokens"),
+                    last_message_at=bindparam("updated_at"),
+                    updated_at=bindparam("updated_at")
+                ),
+                list(states.values())
+            )
+            await db.commit()
+
+    def stats(self) -> Dict:
+        """Snapshot of writer metrics"""
+        return {
+            "durability": self.durability,
+            "queue_depth": self._queue.qsize(),
+            "pending_sessions": len(self._pending),
+            "batches": self.batches,
+            "turns_written": self.turns_written,
+            "avg_batch": round(self.turns_written / self.batches, 2) if self.batches else 0.0,
+            "max_batch": self.max_batch,
+            "failures": self.failures,
+            "avg_commit_ms": round(self.commit_seconds / self.batches * 1000, 2) if self.batches else 0.0
+        }
+
+
+# Global write-behind queue (None when every turn commits on its own)
+write_queue = WriteBehindQueue(
+    batch_size=WRITE_BEHIND_BATCH_SIZE,
+    flush_interval=WRITE_BEHIND_FLUSH_MS / 1000,
+    max_pending=WRITE_BEHIND_MAX_PENDING,
+    durability=WRITE_BEHIND_DURABILITY
+) if WRITE_BEHIND_ENABLED else None
@@ -7,6 +7,8 @@ class ChatWidget {
     constructor(config = {}) {
         this.config = {
             apiUrl: config.apiUrl || 'http://localhost:8000',
+            streaming: config.streaming || false,  // Use /api/chat/stream (SSE)
+            leadPollAttempts: config.leadPollAttempts || 8,  // Polls of /api/lead after a lead is queued
             position: config.position || 'bottom-right',
             welcomeMessage: config.welcomeMessage || 'Hi! How can I help you today?',
             quickQuestions: config.quickQuestions || [
@@ -251,6 +253,11 @@ class ChatWidget {
         this.showTypingIndicator();
         
         try {
+            if (this.config.streaming) {
+                await this.streamMessage(message);
+                return;
+            }
+            
             const response = await fetch(`${this.config.apiUrl}/api/chat`, {
                 method: 'POST',
                 headers: {
@@ -297,6 +304,8 @@ class ChatWidget {
                 this.addQuickReplies(data.quick_replies);
             }
             
+            this.handleActions(data.actions);
+            
         } catch (error) {
             console.error('Error sending message:', error);
             console.error('Error details:', {
@@ -343,6 +352,118 @@ class ChatWidget {
         }
     }
     
+    async streamMessage(message) {
+        const response = await fetch(`${this.config.apiUrl}/api/chat/stream`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify({
+                session_id: this.sessionId,
+                message: message
+            })
+        });
+        
+        if (!response.ok || !response.body) {
+            throw new Error(`HTTP error! status: ${response.status}`);
+        }
+        
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let text = '';
+        let bubble = null;
+        let final = null;
+        
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            
+            // Events are separated by a blank line
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const raw = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+                
+                const eventLine = raw.split('\n').find(line => line.startsWith('event: '));
+                const dataLine = raw.split('\n').find(line => line.startsWith('data: '));
+                if (!eventLine || !dataLine) continue;
+                
+                const event = eventLine.slice(7);
+                const data = JSON.parse(dataLine.slice(6));
+                
+                if (event === 'start') {
+                    this.sessionId = data.session_id;
+                    this.saveSession(data.session_id);
+                } else if (event === 'token') {
+                    if (!bubble) {
+                        this.hideTypingIndicator();
+                        const messageDiv = document.createElement('div');
+                        messageDiv.className = 'chat-message bot streaming';
+                        bubble = document.createElement('div');
+                        bubble.className = 'message-bubble';
+                        messageDiv.appendChild(bubble);
+                        this.messages.appendChild(messageDiv);
+                    }
+                    text += data.text;
+                    bubble.innerHTML = this.escapeHtml(text).replace(/\n/g, '<br>');
+                    this.scrollToBottom();
+                } else if (event === 'done') {
+                    final = data;
+                } else if (event === 'error') {
+                    throw new Error(`Stream error: ${data.detail}`);
+                }
+            }
+        }
+        
+        // Replace the live bubble with a regular message (sources, feedback, timestamp)
+        if (bubble) bubble.parentElement.remove();
+        this.hideTypingIndicator();
+        
+        if (!final) {
+            throw new Error('Stream ended before completion');
+        }
+        
+        this.addMessage(final.text || text, 'bot', final.sources);
+        if (final.quick_replies && final.quick_replies.length > 0) {
+            this.addQuickReplies(final.quick_replies);
+        }
+        this.handleActions(final.actions);
+    }
+    
+    handleActions(actions = []) {
+        // Leads are sent to HubSpot in the background; follow up on the result
+        const queued = (actions || []).some(action => action.type === 'hubspot_upsert' && action.status === 'queued');
+        if (queued) {
+            this.pollLeadStatus(this.sessionId);
+        }
+    }
+    
+    async pollLeadStatus(sessionId, attempt = 0) {
+        try {
+            const response = await fetch(`${this.config.apiUrl}/api/lead/${sessionId}`);
+            if (response.ok) {
+                const lead = await response.json();
+                if (lead.status !== 'queued') {
+                    console.log('Lead status:', lead.status, lead.contact_id || lead.message);
+                    this.leadContactId = lead.contact_id;
+                    // Lets the host page react (analytics, CRM deep links)
+                    window.dispatchEvent(new CustomEvent('chatwidget:lead', { detail: lead }));
+                    return;
+                }
+            }
+        } catch (error) {
+            console.warn('Error polling lead status:', error);
+        }
+        
+        if (attempt + 1 < this.config.leadPollAttempts) {
+            // 2s, 4s, 8s ... capped at 30s
+            const delay = Math.min(2000 * 2 ** attempt, 30000);
+            setTimeout(() => this.pollLeadStatus(sessionId, attempt + 1), delay);
+        }
+    }
+    
     addMessage(text, role, sources = []) {
         // Safety check for empty or undefined text
         if (!text || typeof text !== 'string') {
@@ -47,6 +47,9 @@ source venv/bin/activate
 echo "Installing dependencies..."
 pip install -q -r requirements.txt
 
+echo "Building local knowledge base..."
+python build_index.py
+
 echo "✓ Backend setup complete"
 
 # Start backend in background